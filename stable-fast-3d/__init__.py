@@ -8,9 +8,7 @@ import comfy.model_management
 import folder_paths
 import numpy as np
 import torch
-import trimesh
 from PIL import Image
-from trimesh.exchange import gltf
 
 sys.path.append(os.path.dirname(__file__))
 from sf3d.system import SF3D
@@ -56,8 +54,7 @@ class StableFast3DPreview:
     def preview(self, mesh):
         glbs = []
         for m in mesh:
-            scene = trimesh.Scene(m)
-            glb_data = gltf.export_glb(scene, include_normals=True)
+            glb_data = m.export(file_type="glb", include_normals=True)
             glb_base64 = base64.b64encode(glb_data).decode("utf-8")
             glbs.append(glb_base64)
         return {"ui": {"glbs": glbs}}
@@ -137,6 +134,7 @@ class StableFast3DSampler:
                     bake_resolution=texture_resolution,
                     remesh=remesh,
                     vertex_count=vertex_count,
+                    output_format="glb",
                 )
 
         if mesh.vertices.shape[0] == 0:
@@ -167,8 +165,7 @@ class StableFast3DSave:
         output_dir = folder_paths.get_output_directory()
         glbs = []
         for idx, m in enumerate(mesh):
-            scene = trimesh.Scene(m)
-            glb_data = gltf.export_glb(scene, include_normals=True)
+            glb_data = m.export(file_type="glb", include_normals=True)
             logging.info(f"Generated GLB model with {len(glb_data)} bytes")
 
             full_output_folder, filename, counter, subfolder, filename_prefix = (
@@ -0,0 +1,271 @@
+"""Benchmarks of the individual SF3D stages on synthetic inputs.
+
+All models are randomly initialised and all inputs are generated, so the suite
+runs on a CPU-only machine without network access:
+
+    python -m benchmarks.run --sizes small base
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+With --baseline the exit code is 1 if any case got slower or uses more memory
+than the baseline allows.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if sys.platform == "darwin":
+        return max_rss / 1024 / 1024
+    return max_rss / 1024
+
+
+def run_case(
+    name: str, size: str, warmup: int, repeat: int, threads: int, seed: int
+) -> Dict[str, Any]:
+    import torch
+
+    from benchmarks.stages import BENCHMARKS
+
+    torch.manual_seed(seed)
+    torch.set_num_threads(threads)
+
+    try:
+        with torch.no_grad():
+            case = BENCHMARKS[name](size)
+    except ImportError as e:
+        # Optional dependencies and compiled extensions
+        return {"status": "skipped", "reason": str(e)}
+
+    setup_peak = _peak_rss_mb()
+    times = []
+    with torch.no_grad():
+        for i in range(warmup + repeat):
+            start = time.perf_counter()
+            case.fn()
+            elapsed = time.perf_counter() - start
+            if i >= warmup:
+                times.append(elapsed * 1000)
+    peak = _peak_rss_mb()
+
+    median_ms = statistics.median(times)
+    return {
+        "status": "ok",
+        "median_ms": median_ms,
+        "min_ms": min(times),
+        "max_ms": max(times),
+        "throughput": case.units / (median_ms / 1000),
+        "unit": f"{case.unit}/s",
+        "peak_rss_mb": peak,
+        # Additional memory of the timed iterations beyond the setup
+        "run_peak_delta_mb": None if peak is None else peak - setup_peak,
+    }
+
+
+def _run_case_in_queue(result_queue, *args):
+    try:
+        result_queue.put(run_case(*args))
+    except Exception:
+        result_queue.put({"status": "error", "reason": traceback.format_exc()})
+
+
+def run_isolated(*args) -> Dict[str, Any]:
+    """Run a case in a fresh process so peak memory is not shared between cases."""
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=_run_case_in_queue, args=(result_queue, *args))
+    process.start()
+    process.join()
+    if result_queue.empty():
+        return {
+            "status": "error",
+            "reason": f"Benchmark process exited with code {process.exitcode}",
+        }
+    return result_queue.get()
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    time_threshold: float,
+    memory_threshold: float,
+) -> List[str]:
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if (
+            result.get("status") != "ok"
+            or reference is None
+            or reference.get("status") != "ok"
+        ):
+            continue
+        limit = reference["median_ms"] * (1 + time_threshold)
+        if result["median_ms"] > limit:
+            regressions.append(
+                f"{key}: {result['median_ms']:.1f} ms > {limit:.1f} ms "
+                f"(baseline {reference['median_ms']:.1f} ms)"
+            )
+        if result.get("peak_rss_mb") is not None and reference.get("peak_rss_mb"):
+            limit = reference["peak_rss_mb"] * (1 + memory_threshold)
+            if result["peak_rss_mb"] > limit:
+                regressions.append(
+                    f"{key}: peak memory {result['peak_rss_mb']:.0f} MB > {limit:.0f} MB "
+                    f"(baseline {reference['peak_rss_mb']:.0f} MB)"
+                )
+    return regressions
+
+
+def format_result(key: str, result: Dict[str, Any]) -> str:
+    if result["status"] != "ok":
+        reason = result["reason"].strip().splitlines()[-1]
+        return f"{key:<24} {result['status']}: {reason}"
+    peak = result["peak_rss_mb"]
+    return (
+        f"{key:<24} {result['median_ms']:>10.1f} ms {result['throughput']:>14.1f} "
+        f"{result['unit']:<12} {'' if peak is None else f'{peak:>8.0f} MB peak'}"
+    )
+
+
+def main():
+    from benchmarks.stages import BENCHMARKS, SIZES
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=list(BENCHMARKS.keys()),
+        default=list(BENCHMARKS.keys()),
+        help="Stages to benchmark. Default: all",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=SIZES,
+        default=["small", "base"],
+        help="Input sizes. 'sf3d' matches the released model and is slow on CPU. Default: small base",
+    )
+    parser.add_argument("--warmup", default=1, type=int, help="Default: 1")
+    parser.add_argument("--repeat", default=5, type=int, help="Default: 5")
+    parser.add_argument(
+        "--threads",
+        default=4,
+        type=int,
+        help="Torch intra-op threads. Keep it fixed when comparing runs. Default: 4",
+    )
+    parser.add_argument("--seed", default=0, type=int, help="Default: 0")
+    parser.add_argument(
+        "--no-isolate",
+        action="store_true",
+        help="Run all cases in this process. Faster, but the peak memory is shared between cases",
+    )
+    parser.add_argument(
+        "--output", default=None, type=str, help="Write the results as JSON"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        default=None,
+        type=str,
+        help="Write the results as the new baseline",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        type=str,
+        help="Compare against this baseline and fail on regressions",
+    )
+    parser.add_argument(
+        "--time-threshold",
+        default=0.15,
+        type=float,
+        help="Allowed relative slowdown of the median time. Default: 0.15",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        default=0.10,
+        type=float,
+        help="Allowed relative increase of the peak memory. Default: 0.10",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.stages:
+        for size in args.sizes:
+            key = f"{name}/{size}"
+            case_args = (name, size, args.warmup, args.repeat, args.threads, args.seed)
+            if args.no_isolate:
+                try:
+                    result = run_case(*case_args)
+                except Exception:
+                    result = {"status": "error", "reason": traceback.format_exc()}
+            else:
+                result = run_isolated(*case_args)
+            results[key] = result
+            print(format_result(key, result), flush=True)
+
+    import torch
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "threads": args.threads,
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "isolated": not args.no_isolate,
+        },
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("threads") != args.threads:
+            print(
+                "Warning: the baseline was recorded with",
+                baseline["meta"].get("threads"),
+                "threads",
+            )
+        regressions = compare(
+            results,
+            baseline["results"],
+            args.time_threshold,
+            args.memory_threshold,
+        )
+        if len(regressions) > 0:
+            print("\nRegressions:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("\nNo regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+import numpy as np
+import torch
+
+from benchmarks.synthetic import (
+    make_island_mask,
+    make_sphere_mesh,
+    make_texture,
+    make_uv_grid,
+    save_tet_grid,
+    sphere_sdf,
+)
+
+
+@dataclass
+class Case:
+    # Runs one iteration of the benchmark
+    fn: Callable[[], object]
+    # Amount of work done by one iteration, used for the throughput
+    units: float
+    unit: str
+
+
+def setup_dinov2(size: str) -> Case:
+    from transformers.models.dinov2.configuration_dinov2 import Dinov2Config
+
+    from sf3d.models.tokenizers.dinov2 import Dinov2Model
+
+    hidden_size, layers, heads, image_size = {
+        "small": (384, 12, 6, 224),
+        "base": (768, 12, 12, 224),
+        # Same shape as the tokenizer of the released model
+        "sf3d": (1024, 24, 16, 512),
+    }[size]
+    config = Dinov2Config(
+        hidden_size=hidden_size,
+        num_hidden_layers=layers,
+        num_attention_heads=heads,
+        image_size=image_size,
+        patch_size=14,
+    )
+    model = Dinov2Model(config).eval()
+    images = torch.rand(1, 3, image_size, image_size)
+    return Case(fn=lambda: model(images), units=1, unit="images")
+
+
+def setup_transformer(size: str) -> Case:
+    from sf3d.models.transformers.backbone import TwoStreamInterleaveTransformer
+
+    heads, head_dim, channels, latents, plane, blocks, image_tokens = {
+        "small": (4, 32, 256, 256, 16, 2, 257),
+        "base": (8, 64, 512, 1024, 24, 4, 1025),
+        # Same shape as the backbone of the released model
+        "sf3d": (16, 64, 1024, 1792, 32, 4, 1370),
+    }[size]
+    model = TwoStreamInterleaveTransformer(
+        {
+            "num_attention_heads": heads,
+            "attention_head_dim": head_dim,
+            "raw_triplane_channels": channels,
+            "triplane_channels": channels,
+            "raw_image_channels": channels,
+            "num_latents": latents,
+            "num_blocks": blocks,
+            "cross_attention_dim": channels,
+        }
+    ).eval()
+    triplane_tokens = torch.randn(1, channels, 3 * plane * plane)
+    image_tokens = torch.randn(1, image_tokens, channels)
+    return Case(
+        fn=lambda: model(triplane_tokens, encoder_hidden_states=image_tokens),
+        units=1,
+        unit="images",
+    )
+
+
+def setup_isosurface(size: str) -> Case:
+    from sf3d.models.isosurface import MarchingTetrahedraHelper
+
+    resolution = {"small": 32, "base": 64, "sf3d": 160}[size]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tets_path = os.path.join(tmp_dir, f"{resolution}_tets.npz")
+        save_tet_grid(resolution, tets_path)
+        helper = MarchingTetrahedraHelper(resolution, tets_path)
+    sdf = sphere_sdf(helper.grid_vertices)
+    return Case(
+        fn=lambda: helper._forward(helper.grid_vertices, sdf, helper.indices),
+        units=helper.indices.shape[0],
+        unit="tets",
+    )
+
+
+def setup_unwrap_uv(size: str) -> Case:
+    from sf3d.models.mesh import Mesh
+
+    subdivisions = {"small": 3, "base": 5, "sf3d": 6}[size]
+    v_pos, t_pos_idx = make_sphere_mesh(subdivisions)
+    return Case(
+        fn=lambda: Mesh(v_pos.clone(), t_pos_idx.clone()).unwrap_uv(),
+        units=t_pos_idx.shape[0],
+        unit="faces",
+    )
+
+
+def _bake_inputs(size: str):
+    resolution, quads = {"small": 512, "base": 1024, "sf3d": 2048}[size], 96
+    uv, faces = make_uv_grid(quads)
+    return resolution, uv, faces
+
+
+def setup_rasterize(size: str) -> Case:
+    from texture_baker import TextureBaker
+
+    baker = TextureBaker()
+    resolution, uv, faces = _bake_inputs(size)
+    return Case(
+        fn=lambda: baker.rasterize(uv, faces, resolution, method="bvh"),
+        units=resolution * resolution,
+        unit="texels",
+    )
+
+
+def setup_rasterize_tile(size: str) -> Case:
+    from texture_baker import TextureBaker
+
+    baker = TextureBaker()
+    resolution, uv, faces = _bake_inputs(size)
+    # Both rasterizers have to produce the same map, bit for bit
+    reference = baker.rasterize(uv, faces, resolution, method="bvh")
+    rast = baker.rasterize(uv, faces, resolution, method="tile")
+    if not torch.equal(reference.view(torch.int32), rast.view(torch.int32)):
+        raise AssertionError("The tile rasterizer differs from the BVH rasterizer")
+    return Case(
+        fn=lambda: baker.rasterize(uv, faces, resolution, method="tile"),
+        units=resolution * resolution,
+        unit="texels",
+    )
+
+
+def setup_interpolate(size: str) -> Case:
+    from texture_baker import TextureBaker
+
+    baker = TextureBaker()
+    resolution, uv, faces = _bake_inputs(size)
+    rast = baker.rasterize(uv, faces, resolution)
+    attr = torch.randn(uv.shape[0], 3)
+    return Case(
+        fn=lambda: baker.interpolate(attr, rast, faces),
+        units=resolution * resolution,
+        unit="texels",
+    )
+
+
+def setup_dilate_fill(size: str) -> Case:
+    from sf3d.models.utils import dilate_fill
+
+    resolution = {"small": 512, "base": 1024, "sf3d": 2048}[size]
+    mask = make_island_mask(resolution)
+    image = torch.rand(1, 3, resolution, resolution) * mask
+    mask = mask[None, None]
+    return Case(
+        # Same number of iterations as the texture padding in SF3D
+        fn=lambda: dilate_fill(image, mask, iterations=resolution // 150),
+        units=resolution * resolution,
+        unit="texels",
+    )
+
+
+def setup_push_pull_fill(size: str) -> Case:
+    from sf3d.models.utils import push_pull_fill
+
+    resolution = {"small": 512, "base": 1024, "sf3d": 2048}[size]
+    mask = make_island_mask(resolution)
+    image = torch.rand(1, 3, resolution, resolution) * mask
+    mask = mask[None, None]
+    return Case(
+        fn=lambda: push_pull_fill(image, mask),
+        units=resolution * resolution,
+        unit="texels",
+    )
+
+
+def setup_glb_export(size: str) -> Case:
+    import trimesh
+
+    subdivisions, resolution = {
+        "small": (4, 512),
+        "base": (5, 1024),
+        "sf3d": (6, 2048),
+    }[size]
+    v_pos, t_pos_idx = make_sphere_mesh(subdivisions)
+    vertices = v_pos.numpy()
+    uv = (vertices[:, :2] * 0.5 + 0.5).astype(np.float32)
+
+    def export():
+        # The textures are encoded during the export, so build them fresh
+        material = trimesh.visual.material.PBRMaterial(
+            baseColorTexture=make_texture(resolution, seed=0),
+            normalTexture=make_texture(resolution, seed=1),
+            roughnessFactor=0.5,
+            metallicFactor=0.0,
+        )
+        material.baseColorTexture.format = "JPEG"
+        material.normalTexture.format = "JPEG"
+        mesh = trimesh.Trimesh(
+            vertices=vertices,
+            faces=t_pos_idx.numpy(),
+            visual=trimesh.visual.texture.TextureVisuals(uv=uv, material=material),
+        )
+        buffer = io.BytesIO()
+        mesh.export(buffer, file_type="glb", include_normals=True)
+        return buffer
+
+    return Case(fn=export, units=1, unit="meshes")
+
+
+BENCHMARKS: Dict[str, Callable[[str], Case]] = {
+    "dinov2": setup_dinov2,
+    "transformer": setup_transformer,
+    "isosurface": setup_isosurface,
+    "unwrap_uv": setup_unwrap_uv,
+    "rasterize": setup_rasterize,
+    "rasterize_tile": setup_rasterize_tile,
+    "interpolate": setup_interpolate,
+    "dilate_fill": setup_dilate_fill,
+    "push_pull_fill": setup_push_pull_fill,
+    "glb_export": setup_glb_export,
+}
+
+SIZES = ["small", "base", "sf3d"]
@@ -0,0 +1,114 @@
+import itertools
+
+import numpy as np
+import torch
+import trimesh
+from PIL import Image
+
+
+def make_tet_grid(resolution: int):
+    """Regular tetrahedral grid of the unit cube.
+
+    Every cell of a resolution^3 lattice is split into the 6 tetrahedra around
+    its main diagonal, which gives a conforming grid comparable to the
+    load/tets/<resolution>_tets.npz files shipped with the model.
+
+    Args:
+        resolution: Number of cells along each axis
+
+    Returns:
+        np.ndarray, (resolution + 1)^3 3, float32: Vertex positions in [0, 1]
+        np.ndarray, 6 * resolution^3 4, int64: Tetrahedra vertex indices
+    """
+    n = resolution + 1
+    coords = np.linspace(0.0, 1.0, n, dtype=np.float32)
+    vertices = np.stack(np.meshgrid(coords, coords, coords, indexing="ij"), -1)
+    vertices = vertices.reshape(-1, 3)
+
+    cells = np.stack(
+        np.meshgrid(*([np.arange(resolution)] * 3), indexing="ij"), -1
+    ).reshape(-1, 3)
+
+    def vertex_index(offset):
+        p = cells + np.asarray(offset)
+        return p[:, 0] * n * n + p[:, 1] * n + p[:, 2]
+
+    tets = []
+    for perm in itertools.permutations(range(3)):
+        corner = np.zeros(3, dtype=np.int64)
+        path = [vertex_index(corner)]
+        for axis in perm:
+            corner = corner.copy()
+            corner[axis] = 1
+            path.append(vertex_index(corner))
+        tets.append(np.stack(path, -1))
+    tets = np.stack(tets, 1).reshape(-1, 4).astype(np.int64)
+    return vertices, tets
+
+
+def save_tet_grid(resolution: int, path: str):
+    vertices, indices = make_tet_grid(resolution)
+    np.savez(path, vertices=vertices, indices=indices)
+
+
+def sphere_sdf(vertices: torch.Tensor, radius: float = 0.35) -> torch.Tensor:
+    """Signed distance to a slightly bumpy sphere, positive inside."""
+    centered = vertices - 0.5
+    bumps = 0.02 * torch.sin(20 * centered[:, :1]) * torch.cos(20 * centered[:, 1:2])
+    return radius + bumps - centered.norm(dim=-1, keepdim=True)
+
+
+def make_sphere_mesh(subdivisions: int):
+    sphere = trimesh.creation.icosphere(subdivisions=subdivisions)
+    v_pos = torch.from_numpy(np.asarray(sphere.vertices, dtype=np.float32))
+    t_pos_idx = torch.from_numpy(np.asarray(sphere.faces, dtype=np.int64))
+    return v_pos, t_pos_idx
+
+
+def make_uv_grid(quads: int, seed: int = 0):
+    """Triangulated grid covering the UV square with slightly jittered vertices.
+
+    Args:
+        quads: Number of quads along each axis
+
+    Returns:
+        Tensor, (quads + 1)^2 2, float: UV coordinates
+        Tensor, 2 * quads^2 3, int: Face indices
+    """
+    generator = torch.Generator().manual_seed(seed)
+    n = quads + 1
+    coords = torch.linspace(0.02, 0.98, n)
+    uv = torch.stack(torch.meshgrid(coords, coords, indexing="ij"), -1).reshape(-1, 2)
+    jitter = (torch.rand(uv.shape, generator=generator) - 0.5) * (0.3 * 0.96 / quads)
+    uv = uv + jitter
+
+    i, j = torch.meshgrid(torch.arange(quads), torch.arange(quads), indexing="ij")
+    v00 = (i * n + j).reshape(-1)
+    v01 = v00 + 1
+    v10 = v00 + n
+    v11 = v10 + 1
+    faces = torch.cat(
+        [torch.stack([v00, v10, v11], -1), torch.stack([v00, v11, v01], -1)], 0
+    )
+    return uv.float().contiguous(), faces.to(torch.int64).contiguous()
+
+
+def make_island_mask(resolution: int, islands: int = 24, seed: int = 0):
+    """Mask with round islands, roughly the coverage of a UV atlas bake."""
+    generator = torch.Generator().manual_seed(seed)
+    centers = torch.rand(islands, 2, generator=generator)
+    radii = 0.05 + 0.1 * torch.rand(islands, generator=generator)
+    coords = (torch.arange(resolution) + 0.5) / resolution
+    yy, xx = torch.meshgrid(coords, coords, indexing="ij")
+    mask = torch.zeros(resolution, resolution, dtype=torch.bool)
+    for center, radius in zip(centers, radii):
+        mask |= (yy - center[0]) ** 2 + (xx - center[1]) ** 2 < radius**2
+    return mask
+
+
+def make_texture(resolution: int, seed: int = 0) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    # Smooth noise compresses like a real bake, unlike white noise
+    small = rng.random((resolution // 16, resolution // 16, 3)).astype(np.float32)
+    image = Image.fromarray((small * 255).astype(np.uint8))
+    return image.resize((resolution, resolution), Image.BICUBIC)
@@ -49,6 +49,15 @@ model = SF3D.from_pretrained(
 )
 model.eval()
 model = model.to(device)
+# Changing the remeshing or texture size sliders re-generates the same image.
+# Keep the image encodings around so only the mesh extraction and baking re-run
+model.enable_scene_code_cache(
+    int(os.environ.get("SF3D_SCENE_CODE_CACHE_MB", "1024")) * 1024 * 1024,
+    spill_dir=os.environ.get("SF3D_SCENE_CODE_SPILL_DIR", None),
+    spill_max_size_bytes=int(os.environ.get("SF3D_SCENE_CODE_SPILL_MB", "4096"))
+    * 1024
+    * 1024,
+)
 
 example_files = [
     os.path.join("demo_files/examples", f) for f in os.listdir("demo_files/examples")
@@ -64,7 +73,11 @@ def run_model(input_image, remesh_option, vertex_count, texture_size):
             model_batch = create_batch(input_image)
             model_batch = {k: v.to(device) for k, v in model_batch.items()}
             trimesh_mesh, _glob_dict = model.generate_mesh(
-                model_batch, texture_size, remesh_option, vertex_count
+                model_batch,
+                texture_size,
+                remesh_option,
+                vertex_count,
+                output_format="glb",
             )
             trimesh_mesh = trimesh_mesh[0]
 
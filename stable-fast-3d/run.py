@@ -7,6 +7,9 @@ import torch
 from PIL import Image
 from tqdm import tqdm
 
+from sf3d.cache import MeshCache, hash_request
+from sf3d.pipeline import SF3DPipeline
+from sf3d.profiling import StageProfiler, profile_stage, profiling
 from sf3d.system import SF3D
 from sf3d.utils import get_device, remove_background, resize_foreground
 
@@ -60,6 +63,52 @@ if __name__ == "__main__":
     parser.add_argument(
         "--batch_size", default=1, type=int, help="Batch size for inference"
     )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Overlap the GPU encoding of the next images with the CPU remeshing, unwrapping and texture encoding of the current ones. Useful for folders with many images",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        type=str,
+        help="Record wall time, CPU/CUDA time and peak memory of every stage and write them to this path as JSON. The file can be opened in chrome://tracing or Perfetto. Default: no profiling",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        type=str,
+        help="Directory of the mesh cache. Images that were already generated with the same parameters are copied from the cache instead of running the model. Default: no cache",
+    )
+    parser.add_argument(
+        "--cache-size-mb",
+        default=1024,
+        type=int,
+        help="Maximum size of the mesh cache. Least recently used meshes are evicted first. Default: 1024",
+    )
+    parser.add_argument(
+        "--point-budget",
+        default=None,
+        type=int,
+        help="Maximum number of points queried from the triplane and decoded at once during the isosurface extraction and texture baking. Lower it to reduce the peak memory. Default: derived from the available memory",
+    )
+    parser.add_argument(
+        "--adaptive-isosurface",
+        action="store_true",
+        help="Decode a coarse grid first and only the isosurface grid vertices near the surface. Much less decoder work, but surface details smaller than 4 grid cells can be missed",
+    )
+    parser.add_argument(
+        "--texture-format",
+        default="jpeg",
+        choices=["jpeg", "png", "webp"],
+        help="Image format of the textures in the GLB. webp needs a viewer with EXT_texture_webp support. Default: jpeg",
+    )
+    parser.add_argument(
+        "--texture-quality",
+        default=None,
+        type=int,
+        help="Quality (0-100) of jpeg and webp textures. Default: the encoder default",
+    )
     args = parser.parse_args()
 
     # Ensure args.device contains cuda
@@ -81,22 +130,53 @@ if __name__ == "__main__":
         config_name="config.yaml",
         weight_name="model.safetensors",
     )
+    model.cfg.isosurface_adaptive = args.adaptive_isosurface
+    model.set_texture_encoding(args.texture_format, args.texture_quality)
     model.to(device)
     model.eval()
 
+    mesh_cache = None
+    if args.cache_dir is not None:
+        mesh_cache = MeshCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+
     rembg_session = rembg.new_session()
     images = []
+    # Output index and cache key of each image in images
+    image_entries = []
     idx = 0
     for image_path in args.image:
 
         def handle_image(image_path, idx):
+            os.makedirs(os.path.join(output_dir, str(idx)), exist_ok=True)
+            cache_key = None
+            if mesh_cache is not None:
+                with open(image_path, "rb") as f:
+                    cache_key = hash_request(
+                        f.read(),
+                        {
+                            "model": args.pretrained_model,
+                            "foreground_ratio": args.foreground_ratio,
+                            "texture_resolution": args.texture_resolution,
+                            "remesh_option": args.remesh_option,
+                            "target_vertex_count": args.target_vertex_count,
+                            "texture_format": args.texture_format,
+                            "texture_quality": args.texture_quality,
+                            "adaptive_isosurface": args.adaptive_isosurface,
+                        },
+                    )
+                if mesh_cache.copy_to(
+                    cache_key, os.path.join(output_dir, str(idx), "mesh.glb")
+                ):
+                    print(f"Using cached mesh for {image_path}")
+                    return
+
             image = remove_background(
                 Image.open(image_path).convert("RGBA"), rembg_session
             )
             image = resize_foreground(image, args.foreground_ratio)
-            os.makedirs(os.path.join(output_dir, str(idx)), exist_ok=True)
             image.save(os.path.join(output_dir, str(idx), "input.png"))
             images.append(image)
+            image_entries.append((idx, cache_key))
 
         if os.path.isdir(image_path):
             image_paths = [
@@ -111,31 +191,67 @@ if __name__ == "__main__":
             handle_image(image_path, idx)
             idx += 1
 
-    for i in tqdm(range(0, len(images), args.batch_size)):
-        image = images[i : i + args.batch_size]
-        if torch.cuda.is_available():
-            torch.cuda.reset_peak_memory_stats()
-        with torch.no_grad():
-            with torch.autocast(
-                device_type=device, dtype=torch.bfloat16
-            ) if "cuda" in device else nullcontext():
-                mesh, glob_dict = model.run_image(
-                    image,
+    def save_mesh(position, mesh):
+        out_idx, cache_key = image_entries[position]
+        out_mesh_path = os.path.join(output_dir, str(out_idx), "mesh.glb")
+        with profile_stage("export"):
+            mesh.export(out_mesh_path, include_normals=True)
+        if cache_key is not None:
+            mesh_cache.put(cache_key, out_mesh_path)
+
+    profiler = StageProfiler() if args.profile is not None else None
+    with profiling(profiler) if profiler is not None else nullcontext():
+        if args.pipelined:
+            with SF3DPipeline(
+                model,
+                max_batch_size=args.batch_size,
+                point_budget=args.point_budget,
+                output_format="glb",
+            ) as pipeline:
+                meshes = pipeline.map(
+                    images,
                     bake_resolution=args.texture_resolution,
                     remesh=args.remesh_option,
                     vertex_count=args.target_vertex_count,
                 )
-        if torch.cuda.is_available():
-            print("Peak Memory:", torch.cuda.max_memory_allocated() / 1024 / 1024, "MB")
-        elif torch.backends.mps.is_available():
-            print(
-                "Peak Memory:", torch.mps.driver_allocated_memory() / 1024 / 1024, "MB"
-            )
-
-        if len(image) == 1:
-            out_mesh_path = os.path.join(output_dir, str(i), "mesh.glb")
-            mesh.export(out_mesh_path, include_normals=True)
+                for i, mesh in enumerate(tqdm(meshes, total=len(images))):
+                    save_mesh(i, mesh)
         else:
-            for j in range(len(mesh)):
-                out_mesh_path = os.path.join(output_dir, str(i + j), "mesh.glb")
-                mesh[j].export(out_mesh_path, include_normals=True)
+            for i in tqdm(range(0, len(images), args.batch_size)):
+                image = images[i : i + args.batch_size]
+                if torch.cuda.is_available():
+                    torch.cuda.reset_peak_memory_stats()
+                with torch.no_grad():
+                    with torch.autocast(
+                        device_type=device, dtype=torch.bfloat16
+                    ) if "cuda" in device else nullcontext():
+                        mesh, glob_dict = model.run_image(
+                            image,
+                            bake_resolution=args.texture_resolution,
+                            remesh=args.remesh_option,
+                            vertex_count=args.target_vertex_count,
+                            point_budget=args.point_budget,
+                            output_format="glb",
+                        )
+                if torch.cuda.is_available():
+                    print(
+                        "Peak Memory:",
+                        torch.cuda.max_memory_allocated() / 1024 / 1024,
+                        "MB",
+                    )
+                elif torch.backends.mps.is_available():
+                    print(
+                        "Peak Memory:",
+                        torch.mps.driver_allocated_memory() / 1024 / 1024,
+                        "MB",
+                    )
+
+                if len(image) == 1:
+                    mesh = [mesh]
+                for j in range(len(mesh)):
+                    save_mesh(i + j, mesh[j])
+
+    if profiler is not None:
+        print(profiler.format_summary())
+        profiler.save(args.profile)
+        print("Profile written to", args.profile)
@@ -1,10 +1,18 @@
 import os
 import io
+import asyncio
+import queue
 import tempfile
 import shutil
+import threading
+import time
 import uuid
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import torch
@@ -12,14 +20,25 @@ from PIL import Image
 import rembg
 from contextlib import nullcontext
 
+from sf3d import metrics
+from sf3d.cache import MeshCache, hash_request
+from sf3d.models.utils import find_class
+from sf3d.pipeline import SF3DPipeline
 from sf3d.system import SF3D
 from sf3d.utils import get_device, remove_background, resize_foreground
 
 app = FastAPI(title="Stable Fast 3D API")
 
+PRETRAINED_MODEL = "stabilityai/stable-fast-3d"
+# Skip the random initialization and the separate DINOv2/CLIP downloads when loading the model
+FAST_INIT = os.environ.get("SF3D_FAST_INIT", "1") == "1"
+
 # Global variables
 model = None
 rembg_session = None
+started_at = time.time()
+time_to_ready = None
+load_error = None
 device = get_device()
 output_dir = "output/"
 os.makedirs(output_dir, exist_ok=True)
@@ -28,25 +47,422 @@ os.makedirs(output_dir, exist_ok=True)
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Micro-batching: concurrent uploads are collected for up to MAX_BATCH_WAIT_MS
+# and run through SF3D.run_image together when their generation parameters match
+MAX_BATCH_SIZE = int(os.environ.get("SF3D_MAX_BATCH_SIZE", "4"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("SF3D_MAX_BATCH_WAIT_MS", "50"))
+
+# Inference runs on a dedicated thread pool so the event loop stays responsive.
+# Background removal and GLB export use a separate pool so they never wait behind a forward pass
+INFERENCE_WORKERS = int(os.environ.get("SF3D_INFERENCE_WORKERS", "1"))
+IO_WORKERS = int(os.environ.get("SF3D_IO_WORKERS", "2"))
+# Requests beyond this many waiting jobs are rejected with 429 and a Retry-After header
+MAX_QUEUE_SIZE = int(os.environ.get("SF3D_MAX_QUEUE_SIZE", "16"))
+RETRY_AFTER_SECONDS = int(os.environ.get("SF3D_RETRY_AFTER_SECONDS", "10"))
+
+# Run the stages of the generation in a pipeline, so remeshing, unwrapping and texture
+# encoding on the CPU overlap with the GPU encoding of the next requests
+PIPELINED = os.environ.get("SF3D_PIPELINED", "0") == "1"
+PIPELINE_CPU_WORKERS = int(os.environ.get("SF3D_PIPELINE_CPU_WORKERS", "2"))
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_WORKERS, thread_name_prefix="sf3d-inference"
+)
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="sf3d-io")
+
+# Generated meshes are cached on disk keyed by the image bytes and all generation
+# parameters, so repeated requests are served without running the model. 0 disables the cache
+CACHE_DIR = os.environ.get("SF3D_CACHE_DIR", "cache")
+CACHE_SIZE_MB = int(os.environ.get("SF3D_CACHE_SIZE_MB", "1024"))
+# Image format and quality of the textures in the generated GLBs
+TEXTURE_FORMAT = os.environ.get("SF3D_TEXTURE_FORMAT", "jpeg")
+TEXTURE_QUALITY = (
+    int(os.environ["SF3D_TEXTURE_QUALITY"]) if "SF3D_TEXTURE_QUALITY" in os.environ else None
+)
+
+mesh_cache = (
+    MeshCache(CACHE_DIR, CACHE_SIZE_MB * 1024 * 1024) if CACHE_SIZE_MB > 0 else None
+)
+
+batch_queue = None
+inference_slots = None
+pipeline = None
+background_tasks = set()
+
+
+def queue_depth() -> int:
+    if pipeline is not None:
+        return pipeline.num_pending
+    if batch_queue is not None:
+        return batch_queue.qsize()
+    return 0
+
+
+# Prometheus metrics, served on /metrics
+REQUESTS = metrics.Counter(
+    "sf3d_requests_total", "HTTP requests by route and status code", ["route", "status"]
+)
+JOBS = metrics.Counter("sf3d_jobs_total", "Finished jobs by status", ["status"])
+JOBS_IN_FLIGHT = metrics.Gauge("sf3d_jobs_in_flight", "Jobs currently being processed")
+QUEUE_DEPTH = metrics.Gauge(
+    "sf3d_queue_depth",
+    "Images waiting for inference (pipelined: not yet finished)",
+    function=queue_depth,
+)
+JOB_DURATION = metrics.Histogram(
+    "sf3d_job_duration_seconds", "End to end duration of a job", ["status"]
+)
+STAGE_DURATION = metrics.Histogram(
+    "sf3d_stage_duration_seconds", "Time a job spent in each stage", ["stage"]
+)
+CACHE_HITS = metrics.Counter(
+    "sf3d_cache_hits_total",
+    "Requests served from the mesh cache",
+    function=lambda: mesh_cache.hits if mesh_cache is not None else 0,
+)
+CACHE_MISSES = metrics.Counter(
+    "sf3d_cache_misses_total",
+    "Mesh cache lookups that required inference",
+    function=lambda: mesh_cache.misses if mesh_cache is not None else 0,
+)
+CACHE_SIZE = metrics.Gauge(
+    "sf3d_cache_size_bytes",
+    "Size of the mesh cache on disk",
+    function=lambda: mesh_cache.size_bytes if mesh_cache is not None else 0,
+)
+MESH_VERTICES = metrics.Histogram(
+    "sf3d_mesh_vertices", "Vertex count of generated meshes", buckets=metrics.COUNT_BUCKETS
+)
+MESH_FACES = metrics.Histogram(
+    "sf3d_mesh_faces", "Face count of generated meshes", buckets=metrics.COUNT_BUCKETS
+)
+TIME_TO_READY = metrics.Gauge(
+    "sf3d_time_to_ready_seconds",
+    "Seconds from the server start until the model and rembg session were loaded",
+    function=lambda: time_to_ready if time_to_ready is not None else float("nan"),
+)
+PEAK_MEMORY = metrics.Histogram(
+    "sf3d_peak_device_memory_bytes",
+    "Peak device memory of the inference a job was part of",
+    buckets=metrics.BYTES_BUCKETS,
+)
+
+
+@dataclass
+class Job:
+    id: str
+    # One of queued, running, done, failed
+    status: str = "queued"
+    # One of cache, bg-removal, queued, prepare, tokenize, backbone, isosurface, remesh,
+    # unwrap, bake, encode-textures, export
+    stage: Optional[str] = None
+    # Accumulated seconds spent in each stage
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    stage_started_at: Optional[float] = None
+
+    def enter_stage(self, stage: Optional[str]):
+        now = time.time()
+        if self.stage is not None and self.stage_started_at is not None:
+            self.timings[self.stage] = (
+                self.timings.get(self.stage, 0.0) + now - self.stage_started_at
+            )
+        self.stage = stage
+        self.stage_started_at = now if stage is not None else None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobStore:
+    """
+    Storage for job state. The default keeps everything in process memory.
+    Other backends (e.g. Redis) only need to implement save and get and can be
+    selected with SF3D_JOB_STORE_CLS=<module>.<class>
+    """
+
+    def save(self, job: Job):
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+
+class InMemoryJobStore(JobStore):
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: Job):
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+JOB_STORE_CLS = os.environ.get("SF3D_JOB_STORE_CLS", "")
+job_store: JobStore = find_class(JOB_STORE_CLS)() if JOB_STORE_CLS else InMemoryJobStore()
+
+
+def set_job_stage(job: Job, stage: Optional[str]):
+    job.enter_stage(stage)
+    job_store.save(job)
+
+
+@dataclass
+class InferenceRequest:
+    image: Image.Image
+    texture_resolution: int
+    remesh_option: str
+    target_vertex_count: int
+    future: asyncio.Future
+    job: Job
+
+    @property
+    def group_key(self) -> Tuple[int, str, int]:
+        return (self.texture_resolution, self.remesh_option, self.target_vertex_count)
+
+
+async def collect_batch() -> List[InferenceRequest]:
+    """Wait for one request, then gather more until the batch is full or the wait window closes"""
+    loop = asyncio.get_running_loop()
+    batch = [await batch_queue.get()]
+    deadline = loop.time() + MAX_BATCH_WAIT_MS / 1000.0
+    while len(batch) < MAX_BATCH_SIZE:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(batch_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+def run_inference(requests: List[InferenceRequest]) -> list:
+    """Run a group of requests sharing the same generation parameters in one forward pass"""
+    first = requests[0]
+
+    def stage_callback(stage: str):
+        for request in requests:
+            set_job_stage(request.job, stage)
+
+    if torch.cuda.is_available():
+        # Other inference groups may run at the same time, so the peak counter
+        # is compared instead of reset
+        start_peak = torch.cuda.max_memory_allocated()
+        start_allocated = torch.cuda.memory_allocated()
+
+    with torch.no_grad():
+        with torch.autocast(device_type=device, dtype=torch.bfloat16) if "cuda" in device else nullcontext():
+            meshes, _ = model.run_image(
+                [r.image for r in requests],
+                bake_resolution=first.texture_resolution,
+                remesh=first.remesh_option,
+                vertex_count=first.target_vertex_count,
+                stage_callback=stage_callback,
+                output_format="glb",
+            )
+
+    peak_memory = None
+    if torch.cuda.is_available():
+        peak_memory = torch.cuda.max_memory_allocated()
+        if peak_memory <= start_peak:
+            # Stayed below an earlier peak, report what is allocated around it
+            peak_memory = max(start_allocated, torch.cuda.memory_allocated())
+    elif torch.backends.mps.is_available():
+        peak_memory = torch.mps.driver_allocated_memory()
+    if peak_memory is not None:
+        print("Peak Memory:", peak_memory / 1024 / 1024, "MB")
+        # The requests were batched together, so they share the peak
+        for _ in requests:
+            PEAK_MEMORY.observe(peak_memory)
+
+    # run_image unwraps single element batches
+    if not isinstance(meshes, list):
+        meshes = [meshes]
+    return meshes
+
+
+async def run_group(requests: List[InferenceRequest]):
+    print(f"Running batch of {len(requests)} request(s) with parameters {requests[0].group_key}")
+    try:
+        meshes = await asyncio.get_running_loop().run_in_executor(
+            inference_executor, run_inference, requests
+        )
+    except Exception as e:
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(e)
+        return
+    finally:
+        inference_slots.release()
+
+    for request, mesh in zip(requests, meshes):
+        # The client may have disconnected in the meantime
+        if not request.future.done():
+            request.future.set_result(mesh)
+
+
+async def batch_worker():
+    while True:
+        batch = await collect_batch()
+
+        groups: Dict[Tuple[int, str, int], List[InferenceRequest]] = {}
+        for request in batch:
+            groups.setdefault(request.group_key, []).append(request)
+
+        for requests in groups.values():
+            # Only dispatch when an inference worker is free. Until then requests keep
+            # accumulating in the queue, which both grows the next batch and applies back-pressure
+            await inference_slots.acquire()
+            task = asyncio.create_task(run_group(requests))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
+
+def queue_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+
+def preprocess_image(content: bytes, foreground_ratio: float, save_path: str) -> Image.Image:
+    img = Image.open(io.BytesIO(content)).convert("RGBA")
+
+    # Remove background and resize
+    img = remove_background(img, rembg_session)
+    img = resize_foreground(img, foreground_ratio)
+
+    # Save processed input image
+    img.save(save_path)
+    return img
+
+
+def load_model() -> SF3D:
+    loaded_model = SF3D.from_pretrained(
+        PRETRAINED_MODEL,
+        config_name="config.yaml",
+        weight_name="model.safetensors",
+        fast_init=FAST_INIT,
+    )
+    loaded_model.set_texture_encoding(TEXTURE_FORMAT, TEXTURE_QUALITY)
+    loaded_model.to(device)
+    loaded_model.eval()
+    return loaded_model
+
+
+async def load_components():
+    global model, rembg_session, batch_queue, inference_slots, pipeline, time_to_ready, load_error
+
+    loop = asyncio.get_running_loop()
+    try:
+        # The rembg session is independent of the model, load both at the same time
+        loaded_model, session = await asyncio.gather(
+            loop.run_in_executor(None, load_model),
+            loop.run_in_executor(None, rembg.new_session),
+        )
+    except Exception as e:
+        load_error = str(e)
+        print(f"Loading failed: {e}")
+        raise
+
+    if PIPELINED:
+        pipeline = SF3DPipeline(
+            loaded_model,
+            max_batch_size=MAX_BATCH_SIZE,
+            queue_size=MAX_QUEUE_SIZE,
+            num_postprocess_workers=PIPELINE_CPU_WORKERS,
+            num_export_workers=PIPELINE_CPU_WORKERS,
+            output_format="glb",
+        )
+    else:
+        batch_queue = asyncio.Queue(maxsize=MAX_QUEUE_SIZE)
+        inference_slots = asyncio.Semaphore(INFERENCE_WORKERS)
+        task = asyncio.create_task(batch_worker())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+    # Requests are accepted as soon as both are set, see /ready
+    model, rembg_session = loaded_model, session
+    time_to_ready = time.time() - started_at
+    print(f"Model loaded successfully, ready after {time_to_ready:.1f}s")
+
+
 @app.on_event("startup")
 async def startup_event():
-    global model, rembg_session, device
-    
     print("Device used:", device)
-    
-    # Load model
-    model = SF3D.from_pretrained(
-        "stabilityai/stable-fast-3d",
-        config_name="config.yaml",
-        weight_name="model.safetensors",
+
+    # Load in the background so /health and /ready answer while loading
+    task = asyncio.create_task(load_components())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    response = await call_next(request)
+    # Label by the route template, so job ids do not create a series per job
+    route = request.scope.get("route")
+    REQUESTS.inc(
+        route=route.path if route is not None else "unmatched",
+        status=str(response.status_code),
     )
-    model.to(device)
-    model.eval()
-    
-    # Initialize rembg session
-    rembg_session = rembg.new_session()
-    
-    print("Model loaded successfully")
+    return response
+
+
+def loaded_components() -> Dict[str, bool]:
+    return {"model": model is not None, "rembg_session": rembg_session is not None}
+
+
+def is_ready() -> bool:
+    return all(loaded_components().values())
+
+
+def check_ready():
+    if not is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="Model is still loading, please retry later",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
+
+@app.get("/health")
+async def health():
+    # Liveness: the process is up and serving requests. Fails if loading failed,
+    # so the process gets restarted
+    if load_error is not None:
+        return JSONResponse(
+            {"status": "error", "error": load_error, **loaded_components()},
+            status_code=500,
+        )
+    return {"status": "ok", **loaded_components()}
+
+
+@app.get("/ready")
+async def ready():
+    # Readiness: only route traffic here once everything is loaded
+    ready = is_ready()
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "loading",
+            "time_to_ready": time_to_ready,
+            **loaded_components(),
+        },
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/", response_class=HTMLResponse)
 async def get_home():
@@ -121,6 +537,169 @@ async def get_home():
     </html>
     """
 
+async def submit_to_pipeline(
+    job: Job,
+    img: Image.Image,
+    texture_resolution: int,
+    remesh_option: str,
+    target_vertex_count: int,
+    wait_for_queue: bool,
+):
+    submit = partial(
+        pipeline.submit,
+        img,
+        texture_resolution,
+        remesh_option,
+        target_vertex_count,
+        stage_callback=partial(set_job_stage, job),
+    )
+    if wait_for_queue:
+        # A full pipeline blocks the caller, keep that off the event loop
+        future = await asyncio.get_running_loop().run_in_executor(None, submit)
+    else:
+        try:
+            future = submit(block=False)
+        except queue.Full:
+            raise queue_full_error()
+    return await asyncio.wrap_future(future)
+
+
+async def run_job(
+    job: Job,
+    content: bytes,
+    foreground_ratio: float,
+    texture_resolution: int,
+    remesh_option: str,
+    target_vertex_count: int,
+    cache_key: Optional[str] = None,
+    wait_for_queue: bool = False,
+) -> str:
+    """Run a job to completion and return the path of its mesh"""
+    job_output_dir = os.path.join(output_dir, job.id)
+    os.makedirs(job_output_dir, exist_ok=True)
+    out_mesh_path = os.path.join(job_output_dir, "mesh.glb")
+
+    loop = asyncio.get_running_loop()
+    JOBS_IN_FLIGHT.inc()
+    try:
+        job.status = "running"
+        if cache_key is not None:
+            set_job_stage(job, "cache")
+            if await loop.run_in_executor(
+                io_executor, mesh_cache.copy_to, cache_key, out_mesh_path
+            ):
+                job.status = "done"
+                return out_mesh_path
+
+        set_job_stage(job, "bg-removal")
+        img = await loop.run_in_executor(
+            io_executor,
+            preprocess_image,
+            content,
+            foreground_ratio,
+            os.path.join(job_output_dir, "input.png"),
+        )
+
+        set_job_stage(job, "queued")
+        if pipeline is not None:
+            mesh = await submit_to_pipeline(
+                job,
+                img,
+                texture_resolution,
+                remesh_option,
+                target_vertex_count,
+                wait_for_queue,
+            )
+        else:
+            # Queue the image for the batching worker and wait for its mesh
+            future = loop.create_future()
+            request = InferenceRequest(
+                image=img,
+                texture_resolution=texture_resolution,
+                remesh_option=remesh_option,
+                target_vertex_count=target_vertex_count,
+                future=future,
+                job=job,
+            )
+            if wait_for_queue:
+                await batch_queue.put(request)
+            else:
+                try:
+                    batch_queue.put_nowait(request)
+                except asyncio.QueueFull:
+                    raise queue_full_error()
+            mesh = await future
+
+        MESH_VERTICES.observe(len(mesh.vertices))
+        MESH_FACES.observe(len(mesh.faces))
+
+        # Save the mesh
+        set_job_stage(job, "export")
+        await loop.run_in_executor(
+            io_executor, partial(mesh.export, out_mesh_path, include_normals=True)
+        )
+        if cache_key is not None:
+            try:
+                await loop.run_in_executor(
+                    io_executor, mesh_cache.put, cache_key, out_mesh_path
+                )
+            except OSError as e:
+                # The mesh itself is fine, only caching it failed
+                print(f"Could not cache mesh of job {job.id}: {e}")
+
+        job.status = "done"
+        return out_mesh_path
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+        raise
+    finally:
+        job.finished_at = time.time()
+        set_job_stage(job, None)
+        JOBS_IN_FLIGHT.dec()
+        JOBS.inc(status=job.status)
+        JOB_DURATION.observe(job.finished_at - job.created_at, status=job.status)
+        for stage, seconds in job.timings.items():
+            STAGE_DURATION.observe(seconds, stage=stage)
+
+
+def validate_upload(image: UploadFile):
+    if not image.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+        raise HTTPException(status_code=400, detail="Only PNG, JPG, and JPEG files are supported")
+
+
+def get_cache_key(
+    content: bytes,
+    foreground_ratio: float,
+    texture_resolution: int,
+    remesh_option: str,
+    target_vertex_count: int,
+) -> Optional[str]:
+    if mesh_cache is None:
+        return None
+    return hash_request(
+        content,
+        {
+            "model": PRETRAINED_MODEL,
+            "foreground_ratio": foreground_ratio,
+            "texture_resolution": texture_resolution,
+            "remesh_option": remesh_option,
+            "target_vertex_count": target_vertex_count,
+            "texture_format": TEXTURE_FORMAT,
+            "texture_quality": TEXTURE_QUALITY,
+        },
+    )
+
+
+def check_queue(cache_key: Optional[str]):
+    # Cache hits never reach the queue. Everything else is rejected early
+    # instead of spending time on background removal
+    if cache_key is not None and cache_key in mesh_cache:
+        return
+    if pipeline.full() if pipeline is not None else batch_queue.full():
+        raise queue_full_error()
+
+
 @app.post("/process/")
 async def process_image(
     image: UploadFile = File(...),
@@ -129,54 +708,115 @@ async def process_image(
     remesh_option: str = Form("none"),
     target_vertex_count: int = Form(-1)
 ):
-    if not image.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-        raise HTTPException(status_code=400, detail="Only PNG, JPG, and JPEG files are supported")
-    
-    # Create a unique directory for this request
-    job_id = str(uuid.uuid4())
-    job_output_dir = os.path.join(output_dir, job_id)
-    os.makedirs(job_output_dir, exist_ok=True)
-    
-    # Save uploaded file to a temporary location
+    validate_upload(image)
+    check_ready()
+
     content = await image.read()
-    img = Image.open(io.BytesIO(content)).convert("RGBA")
-    
-    # Remove background and resize
-    img = remove_background(img, rembg_session)
-    img = resize_foreground(img, foreground_ratio)
-    
-    # Save processed input image
-    img.save(os.path.join(job_output_dir, "input.png"))
-    
-    try:
-        # Process with the model
-        with torch.no_grad():
-            with torch.autocast(device_type=device, dtype=torch.bfloat16) if "cuda" in device else nullcontext():
-                mesh, _ = model.run_image(
-                    [img],
-                    bake_resolution=texture_resolution,
-                    remesh=remesh_option,
-                    vertex_count=target_vertex_count,
-                )
-        
-        if torch.cuda.is_available():
-            print("Peak Memory:", torch.cuda.max_memory_allocated() / 1024 / 1024, "MB")
-        elif torch.backends.mps.is_available():
-            print("Peak Memory:", torch.mps.driver_allocated_memory() / 1024 / 1024, "MB")
+    cache_key = get_cache_key(
+        content, foreground_ratio, texture_resolution, remesh_option, target_vertex_count
+    )
+    check_queue(cache_key)
 
-        # Save the mesh
-        out_mesh_path = os.path.join(job_output_dir, "mesh.glb")
-        mesh[0].export(out_mesh_path, include_normals=True)
+    # Create a unique job for this request
+    job = Job(id=str(uuid.uuid4()))
+    job_store.save(job)
+
+    try:
+        out_mesh_path = await run_job(
+            job,
+            content,
+            foreground_ratio,
+            texture_resolution,
+            remesh_option,
+            target_vertex_count,
+            cache_key=cache_key,
+        )
         
         # Return the mesh file
         return FileResponse(
             out_mesh_path, 
-            filename=f"mesh-{job_id}.glb",
+            filename=f"mesh-{job.id}.glb",
             media_type="model/gltf-binary"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    image: UploadFile = File(...),
+    foreground_ratio: float = Form(0.85),
+    texture_resolution: int = Form(1024),
+    remesh_option: str = Form("none"),
+    target_vertex_count: int = Form(-1)
+):
+    validate_upload(image)
+    check_ready()
+
+    content = await image.read()
+    cache_key = get_cache_key(
+        content, foreground_ratio, texture_resolution, remesh_option, target_vertex_count
+    )
+    check_queue(cache_key)
+
+    job = Job(id=str(uuid.uuid4()))
+    job_store.save(job)
+
+    async def run_in_background():
+        try:
+            await run_job(
+                job,
+                content,
+                foreground_ratio,
+                texture_resolution,
+                remesh_option,
+                target_vertex_count,
+                cache_key=cache_key,
+                wait_for_queue=True,
+            )
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+
+    # Keep a reference so the task is not garbage collected while running
+    task = asyncio.create_task(run_in_background())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+    return {
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "mesh_url": f"/jobs/{job.id}/mesh.glb",
+    }
+
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return get_job_or_404(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/mesh.glb")
+async def get_job_mesh(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    return FileResponse(
+        os.path.join(output_dir, job.id, "mesh.glb"),
+        filename=f"mesh-{job.id}.glb",
+        media_type="model/gltf-binary"
+    )
+
 if __name__ == "__main__":
     uvicorn.run("run_server:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+from safetensors.torch import load_file, save_file
+from torch import Tensor
+
+# Bump when a change to the pipeline invalidates previously generated meshes
+CACHE_VERSION = 2
+
+
+def hash_request(image_bytes: bytes, params: Dict[str, Any]) -> str:
+    """Content address of a generation request.
+
+    Args:
+        image_bytes: Raw bytes of the uploaded/input image file
+        params: All parameters that influence the result (JSON serializable)
+
+    Returns:
+        str: Hex digest used as cache key
+    """
+    hasher = hashlib.sha256()
+    hasher.update(image_bytes)
+    hasher.update(
+        json.dumps(
+            {"version": CACHE_VERSION, **params}, sort_keys=True, default=str
+        ).encode("utf-8")
+    )
+    return hasher.hexdigest()
+
+
+class MeshCache:
+    """On-disk LRU cache of generated GLB files keyed by hash_request.
+
+    Entries are stored as <cache_dir>/<key><suffix>. The recency order is restored
+    from the file modification times, so the cache survives restarts and can be
+    shared between the server and the CLI.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int, suffix: str = ".glb"):
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.max_size_bytes = max_size_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(cache_dir):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(cache_dir, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name[: -len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        with self._lock:
+            self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def _evict(self):
+        while self._size > self.max_size_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of the cached mesh or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            if not os.path.exists(path):
+                # Removed behind our back
+                self._size -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return path
+
+    def copy_to(self, key: str, dst_path: str) -> bool:
+        """Copy a cached mesh to dst_path. Returns False on a miss."""
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, dst_path)
+        except FileNotFoundError:
+            # Evicted between lookup and copy
+            return False
+        return True
+
+    def put(self, key: str, src_path: str):
+        """Store a copy of the mesh at src_path under key."""
+        size = os.path.getsize(src_path)
+        if size > self.max_size_bytes:
+            return
+
+        # Write to a temporary file first so readers never see partial meshes
+        tmp_path = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _tensor_nbytes(value: Any) -> int:
+    if isinstance(value, Tensor):
+        return value.numel() * value.element_size()
+    return 0
+
+
+def _autocast_state(device_type: str) -> Tuple[bool, str]:
+    try:
+        enabled = torch.is_autocast_enabled(device_type)
+        dtype = torch.get_autocast_dtype(device_type) if enabled else None
+    except (TypeError, AttributeError):
+        # Older torch versions only expose per backend getters
+        if device_type == "cuda":
+            enabled = torch.is_autocast_enabled()
+            dtype = torch.get_autocast_gpu_dtype() if enabled else None
+        else:
+            enabled = torch.is_autocast_cpu_enabled()
+            dtype = torch.get_autocast_cpu_dtype() if enabled else None
+    return enabled, str(dtype)
+
+
+SceneCodes = Tuple[Tensor, Tensor, Dict[str, Any]]
+
+
+class SceneCodeCache:
+    """Memory bounded LRU cache of the image encoding of SF3D.
+
+    Stores the scene codes, the non post-processed codes and the global dict of
+    the estimators, i.e. everything generate_mesh computes before the isosurface
+    extraction. Re-generating the same image with a different bake resolution,
+    remeshing option or vertex count then skips the image tokenizer and the
+    transformer backbone.
+
+    Only tensors are cached. Non tensor values in the global dict (the *_dist
+    distributions of the image estimator) are dropped on the way. Entries
+    evicted from memory are optionally spilled to spill_dir as safetensors.
+    """
+
+    def __init__(
+        self,
+        max_size_bytes: int,
+        storage_device: str = "cpu",
+        spill_dir: Optional[str] = None,
+        spill_max_size_bytes: int = 0,
+    ):
+        self.max_size_bytes = max_size_bytes
+        self.storage_device = storage_device
+        self._entries: "OrderedDict[str, Tuple[SceneCodes, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.spill = None
+        if spill_dir is not None and spill_max_size_bytes > 0:
+            self.spill = _SpillDir(spill_dir, spill_max_size_bytes)
+
+    @staticmethod
+    def key(batch: Dict[str, Tensor], estimate_illumination: bool) -> str:
+        """Hash of all conditioning tensors and options influencing the codes."""
+        hasher = hashlib.sha256()
+        device_type = "cpu"
+        for name in sorted(batch.keys()):
+            value = batch[name]
+            if not isinstance(value, Tensor):
+                continue
+            device_type = value.device.type
+            hasher.update(name.encode("utf-8"))
+            hasher.update(str((value.dtype, tuple(value.shape))).encode("utf-8"))
+            hasher.update(
+                value.detach().contiguous().view(torch.uint8).cpu().numpy().tobytes()
+            )
+        hasher.update(
+            str((estimate_illumination, _autocast_state(device_type))).encode("utf-8")
+        )
+        return hasher.hexdigest()
+
+    def _to(self, entry: SceneCodes, device) -> SceneCodes:
+        scene_codes, non_postprocessed_codes, global_dict = entry
+        return (
+            scene_codes.to(device),
+            non_postprocessed_codes.to(device),
+            {
+                k: v.to(device) if isinstance(v, Tensor) else v
+                for k, v in global_dict.items()
+            },
+        )
+
+    def get(self, key: str, device) -> Optional[SceneCodes]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._to(item[0], device)
+
+        entry = self.spill.load(key) if self.spill is not None else None
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._insert(key, entry)
+        with self._lock:
+            self.hits += 1
+        return self._to(entry, device)
+
+    def put(self, key: str, entry: SceneCodes):
+        scene_codes, non_postprocessed_codes, global_dict = entry
+        # The distributions keep their parameters on the model device and are
+        # not counted towards max_size_bytes, so only tensors are stored
+        global_dict = {k: v for k, v in global_dict.items() if isinstance(v, Tensor)}
+        entry = self._to(
+            (scene_codes, non_postprocessed_codes, global_dict), self.storage_device
+        )
+        self._insert(key, entry)
+
+    def _insert(self, key: str, entry: SceneCodes):
+        scene_codes, non_postprocessed_codes, global_dict = entry
+        size = (
+            _tensor_nbytes(scene_codes)
+            + _tensor_nbytes(non_postprocessed_codes)
+            + sum(_tensor_nbytes(v) for v in global_dict.values())
+        )
+        if size > self.max_size_bytes:
+            if self.spill is not None:
+                self.spill.save(key, entry)
+            return
+
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (entry, size)
+            self._size += size
+            while self._size > self.max_size_bytes:
+                evicted_key, (evicted_entry, evicted_size) = self._entries.popitem(
+                    last=False
+                )
+                self._size -= evicted_size
+                evicted.append((evicted_key, evicted_entry))
+
+        if self.spill is not None:
+            for evicted_key, evicted_entry in evicted:
+                self.spill.save(evicted_key, evicted_entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _SpillDir:
+    """Size capped directory of scene code entries stored as safetensors."""
+
+    GLOBAL_PREFIX = "global."
+
+    def __init__(self, spill_dir: str, max_size_bytes: int):
+        # Reuse the LRU bookkeeping of the mesh cache
+        self.cache = MeshCache(spill_dir, max_size_bytes, suffix=".safetensors")
+
+    def save(self, key: str, entry: SceneCodes):
+        scene_codes, non_postprocessed_codes, global_dict = entry
+        tensors = {
+            "scene_codes": scene_codes,
+            "non_postprocessed_codes": non_postprocessed_codes,
+        }
+        for k, v in global_dict.items():
+            if isinstance(v, Tensor):
+                tensors[self.GLOBAL_PREFIX + k] = v
+        tensors = {k: v.detach().cpu().contiguous() for k, v in tensors.items()}
+
+        tmp_path = os.path.join(self.cache.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        save_file(tensors, tmp_path)
+        try:
+            self.cache.put(key, tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+    def load(self, key: str) -> Optional[SceneCodes]:
+        path = self.cache.get(key)
+        if path is None:
+            return None
+        try:
+            tensors = load_file(path)
+        except (FileNotFoundError, OSError):
+            return None
+        global_dict = {
+            k[len(self.GLOBAL_PREFIX) :]: v
+            for k, v in tensors.items()
+            if k.startswith(self.GLOBAL_PREFIX)
+        }
+        return (
+            tensors["scene_codes"],
+            tensors["non_postprocessed_codes"],
+            global_dict,
+        )
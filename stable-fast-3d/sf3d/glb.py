@@ -0,0 +1,323 @@
+import io
+import json
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional, Sequence, Union
+
+import numpy as np
+from PIL import Image
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+CHUNK_JSON = 0x4E4F534A  # "JSON"
+CHUNK_BIN = 0x004E4942  # "BIN\0"
+
+COMPONENT_FLOAT = 5126
+COMPONENT_UINT32 = 5125
+TARGET_ARRAY_BUFFER = 34962
+TARGET_ELEMENT_ARRAY_BUFFER = 34963
+MODE_TRIANGLES = 4
+
+# JPEG and PNG are core glTF, WebP needs the EXT_texture_webp extension
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+TEXTURE_FORMATS = tuple(MIME_TYPES.keys())
+
+
+@dataclass
+class Texture:
+    # Encoded image file
+    data: bytes
+    mime_type: str
+
+
+def check_texture_format(format: str) -> str:
+    format = format.upper()
+    if format not in MIME_TYPES:
+        raise ValueError(
+            f"Unsupported texture format {format}, use one of {', '.join(TEXTURE_FORMATS)}"
+        )
+    return format
+
+
+def encode_texture(
+    image: np.ndarray, format: str = "JPEG", quality: Optional[int] = None
+) -> Texture:
+    """Encode an H x W x C uint8 array as an image file for a GLB.
+
+    Args:
+        image: Texture, RGB or RGBA
+        format: JPEG, PNG or WEBP
+        quality: 0-100 for JPEG and WEBP, the PIL default if None. PNG is
+            lossless and ignores it
+
+    Returns:
+        Texture: The encoded image
+    """
+    format = check_texture_format(format)
+    save_kwargs = {}
+    pil_image = Image.fromarray(image)
+    if format == "JPEG":
+        pil_image = pil_image.convert("RGB")
+    if quality is not None and format in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = quality
+    buffer = io.BytesIO()
+    pil_image.save(buffer, format=format, **save_kwargs)
+    return Texture(buffer.getvalue(), MIME_TYPES[format])
+
+
+_encode_executor: Optional[ThreadPoolExecutor] = None
+_encode_executor_lock = threading.Lock()
+
+
+def _get_encode_executor() -> ThreadPoolExecutor:
+    global _encode_executor
+    with _encode_executor_lock:
+        if _encode_executor is None:
+            _encode_executor = ThreadPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                thread_name_prefix="sf3d-texture-encode",
+            )
+        return _encode_executor
+
+
+def encode_textures(
+    images: Sequence[Optional[np.ndarray]],
+    format: str = "JPEG",
+    quality: Optional[int] = None,
+) -> List[Optional[Texture]]:
+    """encode_texture for several textures at once.
+
+    PIL releases the GIL while encoding, so the textures are encoded in
+    parallel on a shared thread pool. None entries stay None.
+    """
+    format = check_texture_format(format)
+    indices = [i for i, image in enumerate(images) if image is not None]
+    textures: List[Optional[Texture]] = [None] * len(images)
+    if len(indices) == 1:
+        textures[indices[0]] = encode_texture(images[indices[0]], format, quality)
+    elif len(indices) > 1:
+        executor = _get_encode_executor()
+        for i, texture in zip(
+            indices,
+            executor.map(lambda i: encode_texture(images[i], format, quality), indices),
+        ):
+            textures[i] = texture
+    return textures
+
+
+def _pad(length: int) -> int:
+    return (4 - length % 4) % 4
+
+
+class _BinaryBuffer:
+    """Collects the buffer views of the BIN chunk without copying the data."""
+
+    def __init__(self):
+        self.parts: List[memoryview] = []
+        self.buffer_views: List[dict] = []
+        self.length = 0
+
+    def add(self, data: Union[bytes, np.ndarray], target: Optional[int] = None) -> int:
+        if isinstance(data, np.ndarray):
+            data = np.ascontiguousarray(data)
+        view = memoryview(data).cast("B")
+        buffer_view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(view)}
+        if target is not None:
+            buffer_view["target"] = target
+        self.parts.append(view)
+        self.length += len(view)
+        # Every view starts 4 byte aligned
+        padding = _pad(self.length)
+        if padding > 0:
+            self.parts.append(memoryview(b"\0" * padding))
+            self.length += padding
+        self.buffer_views.append(buffer_view)
+        return len(self.buffer_views) - 1
+
+
+def write_glb(
+    file_obj: BinaryIO,
+    positions: np.ndarray,
+    faces: np.ndarray,
+    uvs: Optional[np.ndarray] = None,
+    normals: Optional[np.ndarray] = None,
+    base_color_texture: Optional[Texture] = None,
+    normal_texture: Optional[Texture] = None,
+    metallic_factor: Optional[float] = None,
+    roughness_factor: Optional[float] = None,
+) -> int:
+    """Write a single textured triangle mesh as a binary glTF.
+
+    The arrays are written as they are, so they have to be in glTF conventions
+    already: +Y up, counter-clockwise front faces and UV origin at the top left.
+
+    Args:
+        file_obj: Writable binary file
+        positions: Nv x 3 vertex positions
+        faces: Nf x 3 vertex indices
+        uvs: Nv x 2 texture coordinates
+        normals: Nv x 3 unit vertex normals
+        base_color_texture: Encoded base color texture
+        normal_texture: Encoded tangent space normal map
+        metallic_factor: Constant metalness
+        roughness_factor: Constant roughness
+
+    Returns:
+        int: Number of bytes written
+    """
+    gltf = {
+        "asset": {"version": "2.0", "generator": "sf3d"},
+        "scene": 0,
+        "scenes": [{"nodes": []}],
+    }
+    binary = _BinaryBuffer()
+
+    if len(faces) > 0:
+        positions = np.asarray(positions, dtype=np.float32)
+        accessors = [
+            {
+                "bufferView": binary.add(
+                    np.asarray(faces, dtype=np.uint32), TARGET_ELEMENT_ARRAY_BUFFER
+                ),
+                "componentType": COMPONENT_UINT32,
+                "count": int(np.size(faces)),
+                "type": "SCALAR",
+            },
+            {
+                "bufferView": binary.add(positions, TARGET_ARRAY_BUFFER),
+                "componentType": COMPONENT_FLOAT,
+                "count": len(positions),
+                "type": "VEC3",
+                # Required for positions
+                "min": positions.min(0).tolist(),
+                "max": positions.max(0).tolist(),
+            },
+        ]
+        attributes = {"POSITION": 1}
+        for name, values, accessor_type in (
+            ("NORMAL", normals, "VEC3"),
+            ("TEXCOORD_0", uvs, "VEC2"),
+        ):
+            if values is None:
+                continue
+            attributes[name] = len(accessors)
+            accessors.append(
+                {
+                    "bufferView": binary.add(
+                        np.asarray(values, dtype=np.float32), TARGET_ARRAY_BUFFER
+                    ),
+                    "componentType": COMPONENT_FLOAT,
+                    "count": len(values),
+                    "type": accessor_type,
+                }
+            )
+        primitive = {"attributes": attributes, "indices": 0, "mode": MODE_TRIANGLES}
+
+        pbr = {}
+        material = {}
+        images = []
+        for texture, slot in (
+            (base_color_texture, "baseColorTexture"),
+            (normal_texture, "normalTexture"),
+        ):
+            if texture is None:
+                continue
+            images.append(
+                {"bufferView": binary.add(texture.data), "mimeType": texture.mime_type}
+            )
+            if slot == "baseColorTexture":
+                pbr[slot] = {"index": len(images) - 1}
+            else:
+                material[slot] = {"index": len(images) - 1}
+        if metallic_factor is not None:
+            pbr["metallicFactor"] = float(metallic_factor)
+        if roughness_factor is not None:
+            pbr["roughnessFactor"] = float(roughness_factor)
+        if len(pbr) > 0 or len(material) > 0:
+            material["pbrMetallicRoughness"] = pbr
+            gltf["materials"] = [material]
+            primitive["material"] = 0
+        if len(images) > 0:
+            gltf["images"] = images
+            gltf["samplers"] = [{}]
+            gltf["textures"] = []
+            for i, image in enumerate(images):
+                if image["mimeType"] == "image/webp":
+                    # There is no fallback image, so the extension is required
+                    gltf["textures"].append(
+                        {
+                            "sampler": 0,
+                            "extensions": {"EXT_texture_webp": {"source": i}},
+                        }
+                    )
+                    gltf["extensionsUsed"] = ["EXT_texture_webp"]
+                    gltf["extensionsRequired"] = ["EXT_texture_webp"]
+                else:
+                    gltf["textures"].append({"source": i, "sampler": 0})
+
+        gltf["scenes"][0]["nodes"] = [0]
+        gltf["nodes"] = [{"mesh": 0}]
+        gltf["meshes"] = [{"primitives": [primitive]}]
+        gltf["accessors"] = accessors
+        gltf["bufferViews"] = binary.buffer_views
+        gltf["buffers"] = [{"byteLength": binary.length}]
+
+    json_chunk = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * _pad(len(json_chunk))
+    total_length = 12 + 8 + len(json_chunk)
+    if binary.length > 0:
+        total_length += 8 + binary.length
+
+    file_obj.write(struct.pack("<III", GLB_MAGIC, 2, total_length))
+    file_obj.write(struct.pack("<II", len(json_chunk), CHUNK_JSON))
+    file_obj.write(json_chunk)
+    if binary.length > 0:
+        file_obj.write(struct.pack("<II", binary.length, CHUNK_BIN))
+        for part in binary.parts:
+            file_obj.write(part)
+    return total_length
+
+
+class GLBMesh:
+    """A mesh exported straight to GLB, without building a trimesh.Trimesh.
+
+    Offers the parts of the trimesh.Trimesh interface the callers of SF3D use:
+    vertices, faces and export.
+    """
+
+    def __init__(self, data: bytes, vertices: np.ndarray, faces: np.ndarray):
+        self.data = data
+        self.vertices = vertices
+        self.faces = faces
+
+    @classmethod
+    def empty(cls) -> "GLBMesh":
+        vertices = np.zeros((0, 3), dtype=np.float32)
+        faces = np.zeros((0, 3), dtype=np.int32)
+        buffer = io.BytesIO()
+        write_glb(buffer, vertices, faces)
+        return cls(buffer.getvalue(), vertices, faces)
+
+    def export(
+        self,
+        file_obj: Union[str, os.PathLike, BinaryIO, None] = None,
+        file_type: str = "glb",
+        **kwargs,
+    ) -> bytes:
+        # The normals are always included, so include_normals is accepted and
+        # ignored like any other trimesh export option
+        if file_type.lower() != "glb":
+            raise ValueError(f"GLBMesh can only be exported as glb, not {file_type}")
+        if isinstance(file_obj, (str, os.PathLike)):
+            with open(file_obj, "wb") as f:
+                f.write(self.data)
+        elif file_obj is not None:
+            file_obj.write(self.data)
+        return self.data
+
+    def to_trimesh(self):
+        import trimesh
+
+        return trimesh.load(io.BytesIO(self.data), file_type="glb", force="mesh")
@@ -28,6 +28,8 @@ class ClipBasedHeadEstimator(BaseModule):
     class Config(BaseModule.Config):
         model: str = "ViT-B-32"
         pretrain: str = "laion2b_s34b_b79k"
+        # Disable when the weights are loaded from a checkpoint afterwards
+        load_pretrained_weights: bool = True
 
         distribution: str = "beta"
 
@@ -42,7 +44,8 @@ class ClipBasedHeadEstimator(BaseModule):
 
     def configure(self):
         self.model, _, self.preprocess = open_clip.create_model_and_transforms(
-            self.cfg.model, pretrained=self.cfg.pretrain
+            self.cfg.model,
+            pretrained=self.cfg.pretrain if self.cfg.load_pretrained_weights else None,
         )
         self.model.eval()
 
@@ -1,13 +1,90 @@
-from typing import Optional, Tuple
+import hashlib
+import logging
+import os
+import uuid
+from typing import List, Optional, Tuple
 
 import numpy as np
 import torch
 import torch.nn as nn
-from jaxtyping import Float, Integer
+import torch.nn.functional as F
+from jaxtyping import Bool, Float, Integer
 from torch import Tensor
 
 from .mesh import Mesh
 
+# Order of the 6 edges of a tet as pairs of its corners
+TET_EDGES = np.array([[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 3]], dtype=np.int64)
+
+
+def build_edge_tables(
+    indices: np.ndarray, num_vertices: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Unique edges of a tet grid and the edges of every tet.
+
+    Args:
+        indices: Tet vertex indices, Nt x 4
+        num_vertices: Number of grid vertices
+
+    Returns:
+        np.ndarray, Ne 2, int64: Unique edges as (smaller, larger) vertex index,
+            sorted lexicographically
+        np.ndarray, Nt 6, int32: Index into the edges for each edge of a tet, in
+            the order of TET_EDGES
+    """
+    tet_edges = indices[:, TET_EDGES.reshape(-1)].reshape(-1, 2).astype(np.int64)
+    # Encode each edge as one integer, so a 1D unique replaces the row-wise one
+    keys = tet_edges.min(1) * num_vertices + tet_edges.max(1)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    edges = np.stack((keys // num_vertices, keys % num_vertices), -1)
+    return edges, inverse.reshape(-1, 6).astype(np.int32)
+
+
+def _hash_indices(indices: np.ndarray) -> str:
+    hasher = hashlib.sha256()
+    hasher.update(str((indices.dtype, indices.shape)).encode("utf-8"))
+    hasher.update(np.ascontiguousarray(indices).tobytes())
+    return hasher.hexdigest()
+
+
+def load_edge_tables(
+    tets_path: str, indices: np.ndarray, num_vertices: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Edge tables of a tet grid, cached next to its .npz file."""
+    cache_path = os.path.splitext(tets_path)[0] + "_edges.npz"
+    indices_hash = _hash_indices(indices)
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                if (
+                    str(cached["indices_hash"]) == indices_hash
+                    and int(cached["num_vertices"]) == num_vertices
+                ):
+                    return cached["edges"], cached["tet_edges"]
+        except Exception as e:
+            # Outdated or damaged, rebuild and overwrite it
+            logging.warning(f"Ignoring the cached tet edges at {cache_path}: {e}")
+
+    edges, tet_edges = build_edge_tables(indices, num_vertices)
+    # Written under a temporary name and moved into place, so processes
+    # starting at the same time never read a partially written file
+    tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                edges=edges,
+                tet_edges=tet_edges,
+                num_vertices=num_vertices,
+                indices_hash=indices_hash,
+            )
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Could not cache the tet edges at {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return edges, tet_edges
+
 
 class IsosurfaceHelper(nn.Module):
     points_range: Tuple[float, float] = (0, 1)
@@ -80,7 +157,14 @@ class MarchingTetrahedraHelper(IsosurfaceHelper):
             "indices", torch.from_numpy(tets["indices"]).long(), persistent=False
         )
 
-        self._all_edges: Optional[Integer[Tensor, "Ne 2"]] = None
+        # The topology is fixed, so the edges are only computed once per grid
+        edges, tet_edges = load_edge_tables(
+            self.tets_path, tets["indices"], tets["vertices"].shape[0]
+        )
+        self.edges: Integer[Tensor, "Ne 2"]
+        self.register_buffer("edges", torch.from_numpy(edges), persistent=False)
+        self.tet_edges: Integer[Tensor, "Nt 6"]
+        self.register_buffer("tet_edges", torch.from_numpy(tet_edges), persistent=False)
 
         center_indices, boundary_indices = self.get_center_boundary_index(
             self._grid_vertices
@@ -116,20 +200,73 @@ class MarchingTetrahedraHelper(IsosurfaceHelper):
     def grid_vertices(self) -> Float[Tensor, "Nv 3"]:
         return self._grid_vertices
 
+    def coarse_grid_vertices(self, coarse_resolution: int) -> Float[Tensor, "Nc 3"]:
+        """Vertices of a regular lattice with coarse_resolution cells per axis.
+
+        The vertices are ordered x-major, matching the layout expected by
+        refine_from_coarse.
+        """
+        coords = torch.linspace(
+            self.points_range[0],
+            self.points_range[1],
+            coarse_resolution + 1,
+            device=self._grid_vertices.device,
+        )
+        return torch.stack(
+            torch.meshgrid(coords, coords, coords, indexing="ij"), -1
+        ).reshape(-1, 3)
+
+    def refine_from_coarse(
+        self,
+        coarse_level: Float[Tensor, "Nc 1"],
+        coarse_resolution: int,
+        dilation: int = 1,
+    ) -> Tuple[Bool[Tensor, " Nv"], Float[Tensor, "Nv 1"]]:
+        """Select the grid vertices near the surface of a coarse level set.
+
+        A coarse cell is near the surface if its corners are not all on the
+        same side, or if it is within dilation cells of such a cell. Grid
+        vertices outside these cells are far enough from the surface that none
+        of their tets is cut by it, as long as the surface has no features
+        smaller than a coarse cell.
+
+        Args:
+            coarse_level: Level at the coarse_grid_vertices
+            coarse_resolution: Number of coarse cells per axis
+            dilation: Number of coarse cells added around the cut cells
+
+        Returns:
+            Tensor: Mask of the grid vertices that need the exact level
+            Tensor: Trilinear interpolation of the coarse level at all grid
+                vertices. Its sign is exact for the vertices outside the mask
+        """
+        n = coarse_resolution + 1
+        coarse_level = coarse_level.view(1, 1, n, n, n).float()
+        occ = (coarse_level > 0).float()
+        any_occ = F.max_pool3d(occ, 2, stride=1)
+        all_occ = -F.max_pool3d(-occ, 2, stride=1)
+        near = any_occ != all_occ
+        if dilation > 0:
+            near = (
+                F.max_pool3d(near.float(), 2 * dilation + 1, stride=1, padding=dilation)
+                > 0
+            )
+
+        lo, hi = self.points_range
+        normalized = (self.grid_vertices - lo) / (hi - lo)
+        cell = (normalized * coarse_resolution).long().clamp(0, coarse_resolution - 1)
+        refine = near[0, 0, cell[:, 0], cell[:, 1], cell[:, 2]]
+
+        # grid_sample expects the coordinates in (W, H, D) = (z, y, x) order
+        grid = (normalized * 2 - 1).flip(-1).view(1, 1, 1, -1, 3)
+        level = F.grid_sample(
+            coarse_level, grid, mode="bilinear", align_corners=True
+        ).view(-1, 1)
+        return refine, level
+
     @property
     def all_edges(self) -> Integer[Tensor, "Ne 2"]:
-        if self._all_edges is None:
-            # compute edges on GPU, or it would be VERY SLOW (basically due to the unique operation)
-            edges = torch.tensor(
-                [0, 1, 0, 2, 0, 3, 1, 2, 1, 3, 2, 3],
-                dtype=torch.long,
-                device=self.indices.device,
-            )
-            _all_edges = self.indices[:, edges].reshape(-1, 2)
-            _all_edges_sorted = torch.sort(_all_edges, dim=1)[0]
-            _all_edges = torch.unique(_all_edges_sorted, dim=0)
-            self._all_edges = _all_edges
-        return self._all_edges
+        return self.edges
 
     def sort_edges(self, edges_ex2):
         with torch.no_grad():
@@ -141,35 +278,58 @@ class MarchingTetrahedraHelper(IsosurfaceHelper):
 
         return torch.stack([a, b], -1)
 
-    def _forward(self, pos_nx3, sdf_n, tet_fx4):
+    def _forward(self, pos_nx3, sdf_n, tet_fx4=None):
+        return self._forward_batched(pos_nx3[None], sdf_n[None], tet_fx4)[0]
+
+    def _forward_batched(
+        self,
+        pos_bxnx3: Float[Tensor, "B Nv 3"],
+        sdf_bxn: Float[Tensor, "B Nv 1"],
+        tet_fx4: Optional[Integer[Tensor, "Nt 4"]] = None,
+    ) -> List[Tuple[Float[Tensor, "Nf 3"], Integer[Tensor, "Nf 3"]]]:
+        """Marching tetrahedra over a batch of levels on the same tet grid.
+
+        The items are processed as one grid of B disjoint copies, so every step
+        runs once for the whole batch. The results are split per item at the end.
+        """
+        if tet_fx4 is None or tet_fx4 is self.indices:
+            tet_fx4, edges, tet_edges = self.indices, self.edges, self.tet_edges
+        else:
+            edges, tet_edges = (
+                torch.from_numpy(table).to(tet_fx4.device)
+                for table in build_edge_tables(
+                    tet_fx4.cpu().numpy(), pos_bxnx3.shape[1]
+                )
+            )
+        batch_size = sdf_bxn.shape[0]
+        device = pos_bxnx3.device
+
         with torch.no_grad():
-            occ_n = sdf_n > 0
-            occ_fx4 = occ_n[tet_fx4.reshape(-1)].reshape(-1, 4)
+            occ_n = sdf_bxn[..., 0] > 0
+            occ_fx4 = occ_n[:, tet_fx4]
             occ_sum = torch.sum(occ_fx4, -1)
-            valid_tets = (occ_sum > 0) & (occ_sum < 4)
-            occ_sum = occ_sum[valid_tets]
-
-            # find all vertices
-            all_edges = tet_fx4[valid_tets][:, self.base_tet_edges].reshape(-1, 2)
-            all_edges = self.sort_edges(all_edges)
-            unique_edges, idx_map = torch.unique(all_edges, dim=0, return_inverse=True)
-
-            unique_edges = unique_edges.long()
-            mask_edges = occ_n[unique_edges.reshape(-1)].reshape(-1, 2).sum(-1) == 1
-            mapping = (
-                torch.ones(
-                    (unique_edges.shape[0]), dtype=torch.long, device=pos_nx3.device
-                )
-                * -1
+            valid_b, valid_t = torch.nonzero(
+                (occ_sum > 0) & (occ_sum < 4), as_tuple=True
             )
-            mapping[mask_edges] = torch.arange(
-                mask_edges.sum(), dtype=torch.long, device=pos_nx3.device
+
+            # Every edge with one vertex inside and one outside becomes a mesh
+            # vertex. These edges only belong to valid tets, and the edge list is
+            # sorted, so the vertex order matches a unique over the valid tets
+            occ_edges = occ_n[:, edges]
+            mask_edges = occ_edges[..., 0] != occ_edges[..., 1]
+            # Vertex indices are numbered across the batch and made local below
+            mapping = torch.where(
+                mask_edges,
+                torch.cumsum(mask_edges.view(-1), 0).view(batch_size, -1) - 1,
+                torch.full_like(mask_edges, -1, dtype=torch.long),
             )
-            idx_map = mapping[idx_map]  # map edges to verts
+            # map edges to verts
+            idx_map = mapping[valid_b[:, None], tet_edges[valid_t].long()]
 
-            interp_v = unique_edges[mask_edges]
-        edges_to_interp = pos_nx3[interp_v.reshape(-1)].reshape(-1, 2, 3)
-        edges_to_interp_sdf = sdf_n[interp_v.reshape(-1)].reshape(-1, 2, 1)
+            interp_b, interp_e = torch.nonzero(mask_edges, as_tuple=True)
+            interp_v = edges[interp_e]
+        edges_to_interp = pos_bxnx3[interp_b[:, None], interp_v]
+        edges_to_interp_sdf = sdf_bxn[interp_b[:, None], interp_v]
         edges_to_interp_sdf[:, -1] *= -1
 
         denominator = edges_to_interp_sdf.sum(1, keepdim=True)
@@ -177,53 +337,79 @@ class MarchingTetrahedraHelper(IsosurfaceHelper):
         edges_to_interp_sdf = torch.flip(edges_to_interp_sdf, [1]) / denominator
         verts = (edges_to_interp * edges_to_interp_sdf).sum(1)
 
-        idx_map = idx_map.reshape(-1, 6)
-
-        v_id = torch.pow(2, torch.arange(4, dtype=torch.long, device=pos_nx3.device))
-        tetindex = (occ_fx4[valid_tets] * v_id.unsqueeze(0)).sum(-1)
+        v_id = torch.pow(2, torch.arange(4, dtype=torch.long, device=device))
+        tetindex = (occ_fx4[valid_b, valid_t] * v_id.unsqueeze(0)).sum(-1)
         num_triangles = self.num_triangles_table[tetindex]
 
         # Generate triangle indices
-        faces = torch.cat(
-            (
-                torch.gather(
-                    input=idx_map[num_triangles == 1],
-                    dim=1,
-                    index=self.triangle_table[tetindex[num_triangles == 1]][:, :3],
-                ).reshape(-1, 3),
-                torch.gather(
-                    input=idx_map[num_triangles == 2],
-                    dim=1,
-                    index=self.triangle_table[tetindex[num_triangles == 2]][:, :6],
-                ).reshape(-1, 3),
-            ),
-            dim=0,
-        )
-
-        return verts, faces
+        one_triangle = num_triangles == 1
+        two_triangles = num_triangles == 2
+        faces_one = torch.gather(
+            input=idx_map[one_triangle],
+            dim=1,
+            index=self.triangle_table[tetindex[one_triangle]][:, :3],
+        ).reshape(-1, 3)
+        faces_two = torch.gather(
+            input=idx_map[two_triangles],
+            dim=1,
+            index=self.triangle_table[tetindex[two_triangles]][:, :6],
+        ).reshape(-1, 3)
+
+        # Split per item. Each item keeps the face order of a single extraction
+        num_verts = mask_edges.sum(-1)
+        vert_offsets = (torch.cumsum(num_verts, 0) - num_verts).tolist()
+        num_one = torch.bincount(valid_b[one_triangle], minlength=batch_size)
+        num_two = 2 * torch.bincount(valid_b[two_triangles], minlength=batch_size)
+        results = []
+        for verts_i, faces_one_i, faces_two_i, offset in zip(
+            verts.split(num_verts.tolist()),
+            faces_one.split(num_one.tolist()),
+            faces_two.split(num_two.tolist()),
+            vert_offsets,
+        ):
+            results.append(
+                (verts_i, torch.cat((faces_one_i, faces_two_i), dim=0) - offset)
+            )
+        return results
 
     def forward(
         self,
         level: Float[Tensor, "N3 1"],
         deformation: Optional[Float[Tensor, "N3 3"]] = None,
     ) -> Mesh:
+        return self.forward_batched(
+            level[None], deformation[None] if deformation is not None else None
+        )[0]
+
+    def forward_batched(
+        self,
+        level: Float[Tensor, "B N3 1"],
+        deformation: Optional[Float[Tensor, "B N3 3"]] = None,
+    ) -> List[Mesh]:
+        """Extract one mesh per item of a batch of levels on the tet grid."""
         if deformation is not None:
             grid_vertices = self.grid_vertices + self.normalize_grid_deformation(
                 deformation
             )
         else:
-            grid_vertices = self.grid_vertices
-
-        v_pos, t_pos_idx = self._forward(grid_vertices, level, self.indices)
-
-        mesh = Mesh(
-            v_pos=v_pos,
-            t_pos_idx=t_pos_idx,
-            # extras
-            grid_vertices=grid_vertices,
-            tet_edges=self.all_edges,
-            grid_level=level,
-            grid_deformation=deformation,
-        )
+            grid_vertices = self.grid_vertices.expand(level.shape[0], -1, -1)
+
+        meshes = []
+        for i, (v_pos, t_pos_idx) in enumerate(
+            self._forward_batched(grid_vertices, level, self.indices)
+        ):
+            meshes.append(
+                Mesh(
+                    v_pos=v_pos,
+                    t_pos_idx=t_pos_idx,
+                    # extras
+                    grid_vertices=grid_vertices[i],
+                    tet_edges=self.all_edges,
+                    grid_level=level[i],
+                    grid_deformation=deformation[i]
+                    if deformation is not None
+                    else None,
+                )
+            )
 
-        return mesh
+        return meshes
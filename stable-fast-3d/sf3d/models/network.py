@@ -179,6 +179,11 @@ class MaterialMLP(BaseModule):
             ]
             heads[head.name] = nn.Sequential(*head_layers)
         self.heads = nn.ModuleDict(heads)
+        # Looked up once instead of on every forward
+        self.output_activations = {
+            head.name: get_activation(head.output_activation) for head in self.cfg.heads
+        }
+        self.hidden_activation = self.make_activation(self.cfg.activation)
 
     def make_activation(self, activation):
         if activation == "relu":
@@ -191,23 +196,69 @@ class MaterialMLP(BaseModule):
     def keys(self):
         return self.heads.keys()
 
-    def forward(
-        self, x, include: Optional[List] = None, exclude: Optional[List] = None
-    ):
+    def select_heads(
+        self, include: Optional[List] = None, exclude: Optional[List] = None
+    ) -> List[HeadSpec]:
         if include is not None and exclude is not None:
             raise ValueError("Cannot specify both include and exclude.")
         if include is not None:
-            heads = [h for h in self.cfg.heads if h.name in include]
+            return [h for h in self.cfg.heads if h.name in include]
         elif exclude is not None:
-            heads = [h for h in self.cfg.heads if h.name not in exclude]
-        else:
-            heads = self.cfg.heads
+            return [h for h in self.cfg.heads if h.name not in exclude]
+        return self.cfg.heads
+
+    def forward(
+        self, x, include: Optional[List] = None, exclude: Optional[List] = None
+    ):
+        heads = self.select_heads(include, exclude)
 
         out = {
-            head.name: get_activation(head.output_activation)(
+            head.name: self.output_activations[head.name](
                 self.heads[head.name](x) + head.out_bias
             )
             for head in heads
         }
 
         return out
+
+    def forward_fused(
+        self,
+        x: Float[Tensor, "*B N Ci"],
+        include: Optional[List] = None,
+        exclude: Optional[List] = None,
+    ) -> dict[str, Tensor]:
+        """Same result as forward, with the first layers of all heads in one GEMM.
+
+        All heads read the same input, so their first layers are concatenated
+        into a single linear layer and the hidden activation runs once over the
+        combined output. The remaining layers of each head read their slice of
+        it in place. x may be a strided view, e.g. the transposed channel-first
+        output of grid_sample, since the GEMM reads it without a copy.
+        """
+        heads = self.select_heads(include, exclude)
+        # Heads without hidden layers do not start with an input layer
+        fused = [head for head in heads if head.n_hidden_layers > 0]
+        out = {}
+        if len(fused) > 0:
+            first_layers = [self.heads[head.name][0] for head in fused]
+            weight = torch.cat([layer.weight for layer in first_layers], 0)
+            bias = torch.cat([layer.bias for layer in first_layers], 0)
+            if x.ndim == 3:
+                # bmm reads strided batches directly, F.linear would fold the
+                # batch dimension into a copy
+                hidden = torch.baddbmm(bias, x, weight.t().expand(x.shape[0], -1, -1))
+            else:
+                hidden = F.linear(x, weight, bias)
+            hidden = self.hidden_activation(hidden)
+            for i, head in enumerate(fused):
+                y = hidden[..., i * self.cfg.n_neurons : (i + 1) * self.cfg.n_neurons]
+                # Skip the first linear layer and its activation
+                y = self.heads[head.name][2:](y)
+                out[head.name] = self.output_activations[head.name](y + head.out_bias)
+        for head in heads:
+            if head.n_hidden_layers == 0:
+                out[head.name] = self.output_activations[head.name](
+                    self.heads[head.name](x) + head.out_bias
+                )
+        # Keep the order of forward
+        return {head.name: out[head.name] for head in heads}
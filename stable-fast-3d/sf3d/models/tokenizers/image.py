@@ -6,6 +6,7 @@ import torch.nn as nn
 from einops import rearrange
 from jaxtyping import Float
 from torch import Tensor
+from transformers.models.dinov2.configuration_dinov2 import Dinov2Config
 
 from sf3d.models.tokenizers.dinov2 import Dinov2Model
 from sf3d.models.transformers.attention import Modulation
@@ -19,11 +20,20 @@ class DINOV2SingleImageTokenizer(BaseModule):
         width: int = 512
         height: int = 512
         modulation_cond_dim: int = 768
+        # Disable when the weights are loaded from a checkpoint afterwards
+        load_pretrained_weights: bool = True
 
     cfg: Config
 
     def configure(self) -> None:
-        self.model = Dinov2Model.from_pretrained(self.cfg.pretrained_model_name_or_path)
+        if self.cfg.load_pretrained_weights:
+            self.model = Dinov2Model.from_pretrained(
+                self.cfg.pretrained_model_name_or_path
+            )
+        else:
+            self.model = Dinov2Model(
+                Dinov2Config.from_pretrained(self.cfg.pretrained_model_name_or_path)
+            )
 
         for p in self.model.parameters():
             p.requires_grad_(False)
@@ -55,20 +55,24 @@ class CrossAttention(nn.Module):
         self.proj = nn.Linear(dim, dim)
         self.proj_drop = nn.Dropout(proj_drop)
 
-    def forward(self, x_q, x_kv):
-        B, N_q, C = x_q.shape
+    def project_kv(self, x_kv):
         B, N_kv, _ = x_kv.shape
-        # [B, N_q, C] -> [B, N_q, H, C/H]
-        q = self.wq(x_q).reshape(B, N_q, self.num_heads, C // self.num_heads)
-        # [B, N_kv, C] -> [B, N_kv, H, C/H]
+        C = self.wk.out_features
+        # [B, N_kv, C] -> [B, H, N_kv, C/H]
         k = self.wk(x_kv).reshape(B, N_kv, self.num_heads, C // self.num_heads)
         v = self.wv(x_kv).reshape(B, N_kv, self.num_heads, C // self.num_heads)
+        return k.permute(0, 2, 1, 3), v.permute(0, 2, 1, 3)
+
+    def attend(self, x_q, k, v):
+        B, N_q, C = x_q.shape
+        # [B, N_q, C] -> [B, N_q, H, C/H]
+        q = self.wq(x_q).reshape(B, N_q, self.num_heads, C // self.num_heads)
 
         #  attention
         x = torch.nn.functional.scaled_dot_product_attention(
             q.permute(0, 2, 1, 3),
-            k.permute(0, 2, 1, 3),
-            v.permute(0, 2, 1, 3),
+            k,
+            v,
             attn_mask=None,
             dropout_p=self.attn_drop,
             scale=self.scale,
@@ -80,6 +84,9 @@ class CrossAttention(nn.Module):
         x = self.proj_drop(x)
         return x
 
+    def forward(self, x_q, x_kv):
+        return self.attend(x_q, *self.project_kv(x_kv))
+
 
 class FeedForward(nn.Module):
     def __init__(
@@ -211,6 +218,12 @@ class SingleStreamTransformer(BaseModule):
 class FuseBlock(nn.Module):
     """
     Fuse X in to Z with cross attention
+
+    With chunk_size set, the tokens of Z are processed in slices of at most
+    chunk_size tokens. Every op besides the attention is per token and the
+    attention only mixes the keys and values of X, which are projected once, so
+    the result is the same. Only the activations of one slice (queries,
+    attention and the 8x wider GEGLU hidden states) are alive at a time.
     """
 
     def __init__(
@@ -223,8 +236,10 @@ class FuseBlock(nn.Module):
         proj_drop: float = 0.0,
         ff_drop: float = 0.0,
         norm_x_input: bool = True,
+        chunk_size: Optional[int] = None,
     ):
         super().__init__()
+        self.chunk_size = chunk_size
         self.norm_x_input = norm_x_input
         if self.norm_x_input:
             self.norm_x = nn.LayerNorm(dim_x)
@@ -241,10 +256,23 @@ class FuseBlock(nn.Module):
         self.ff = FeedForward(dim_z, dropout=ff_drop)
 
     def forward(self, z, x):
-        # TODO: do we need to normalize x?
-        z = z + self.attn(self.norm_z1(z), self.norm_x(x) if self.norm_x_input else x)
-        z = z + self.ff(self.norm_z2(z))
-        return z
+        if self.chunk_size is None or z.shape[1] <= self.chunk_size:
+            # TODO: do we need to normalize x?
+            z = z + self.attn(
+                self.norm_z1(z), self.norm_x(x) if self.norm_x_input else x
+            )
+            z = z + self.ff(self.norm_z2(z))
+            return z
+
+        k, v = self.attn.project_kv(self.norm_x(x) if self.norm_x_input else x)
+        out = torch.empty_like(z)
+        for start in range(0, z.shape[1], self.chunk_size):
+            z_chunk = z[:, start : start + self.chunk_size]
+            z_chunk = z_chunk + self.attn.attend(self.norm_z1(z_chunk), k, v)
+            out[:, start : start + self.chunk_size] = z_chunk + self.ff(
+                self.norm_z2(z_chunk)
+            )
+        return out
 
 
 @torch.no_grad()
@@ -345,6 +373,7 @@ class TwoStreamBlock(nn.Module):
         ff_drop: float = 0.0,
         norm_x_input: bool = True,
         dim_cross: Optional[int] = None,
+        fuse_chunk_size: Optional[int] = None,
     ):
         super().__init__()
 
@@ -358,6 +387,7 @@ class TwoStreamBlock(nn.Module):
             proj_drop=proj_drop,
             ff_drop=ff_drop,
             norm_x_input=norm_x_input,
+            chunk_size=fuse_chunk_size,
         )
 
         # Define the transformer block that process the latent
@@ -385,6 +415,7 @@ class TwoStreamBlock(nn.Module):
             proj_drop=proj_drop,
             ff_drop=ff_drop,
             norm_x_input=norm_x_input,
+            chunk_size=fuse_chunk_size,
         )
 
     def forward(self, latent, input, cross_input):
@@ -413,6 +444,9 @@ class TwoStreamInterleaveTransformer(BaseModule):
         norm_x_input: bool = False
         cross_attention_dim: int = 1024
         mix_latent: bool = True
+        # Process the triplane tokens in the fuse blocks in slices of this many
+        # tokens to bound the activation memory. None disables the chunking
+        fuse_chunk_size: Optional[int] = 4096
 
     cfg: Config
 
@@ -463,6 +497,7 @@ class TwoStreamInterleaveTransformer(BaseModule):
                     ff_drop=self.cfg.dropout,
                     norm_x_input=self.cfg.norm_x_input,
                     dim_cross=self.cfg.cross_attention_dim,
+                    fuse_chunk_size=self.cfg.fuse_chunk_size,
                 )
                 for _ in range(self.cfg.num_blocks)
             ]
@@ -1,5 +1,6 @@
 import dataclasses
 import importlib
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any, List, Optional, Tuple, Union
 
@@ -39,6 +40,50 @@ def find_class(cls_string):
     return cls
 
 
+@contextmanager
+def init_empty_weights():
+    """Create the parameters of all modules constructed in this context on the meta device.
+
+    This skips allocating and randomly initializing weights that are replaced by
+    a checkpoint anyway. Buffers are created as usual, as non-persistent buffers
+    are not part of a checkpoint. The patch is process wide, so do not construct
+    other modules on other threads meanwhile.
+    """
+    register_parameter = nn.Module.register_parameter
+
+    def register_empty_parameter(module, name, param):
+        register_parameter(module, name, param)
+        if param is not None:
+            module._parameters[name] = nn.Parameter(
+                param.to("meta"), requires_grad=param.requires_grad
+            )
+
+    def skip_meta(init_fn):
+        # Initializing meta tensors does nothing, but still imports and traces
+        # the reference implementations on first use
+        def init(tensor, *args, **kwargs):
+            if tensor.is_meta:
+                return tensor
+            return init_fn(tensor, *args, **kwargs)
+
+        return init
+
+    init_fns = {
+        name: getattr(nn.init, name)
+        for name in dir(nn.init)
+        if name.endswith("_") and not name.startswith("_")
+    }
+    nn.Module.register_parameter = register_empty_parameter
+    for name, init_fn in init_fns.items():
+        setattr(nn.init, name, skip_meta(init_fn))
+    try:
+        yield
+    finally:
+        nn.Module.register_parameter = register_parameter
+        for name, init_fn in init_fns.items():
+            setattr(nn.init, name, init_fn)
+
+
 def parse_structured(fields: Any, cfg: Optional[Union[dict, DictConfig]] = None) -> Any:
     # Check if cfg.keys are in fields
     cfg_ = cfg.copy()
@@ -107,7 +152,7 @@ def dilate_fill(img, mask, iterations=10):
         newMask = torch.nn.functional.max_pool2d(oldMask, 3, 1, 1)
 
         # Fill the extension with mean color of old valid regions
-        img_unfold = F.unfold(oldImg, (3, 3)).view(1, 3, 3 * 3, -1)
+        img_unfold = F.unfold(oldImg, (3, 3)).view(1, img.shape[1], 3 * 3, -1)
         mask_unfold = F.unfold(oldMask, (3, 3)).view(1, 1, 3 * 3, -1)
         new_mask_unfold = F.unfold(newMask, (3, 3)).view(1, 1, 3 * 3, -1)
 
@@ -116,7 +161,7 @@ def dilate_fill(img, mask, iterations=10):
             2
         )
         # Extend it to the new region
-        fill_color = (mean_color * new_mask_unfold).view(1, 3 * 3 * 3, -1)
+        fill_color = (mean_color * new_mask_unfold).view(1, img.shape[1] * 3 * 3, -1)
 
         mask_conv = F.conv2d(
             newMask, mask_kernel, padding=1
@@ -133,6 +178,46 @@ def dilate_fill(img, mask, iterations=10):
     return oldImg
 
 
+def push_pull_fill(
+    img: Float[Tensor, "B C H W"], mask: Float[Tensor, "B 1 H W"]
+) -> Float[Tensor, "B C H W"]:
+    """Fill the texels outside the mask with a smooth continuation of the inside.
+
+    Pull: the valid texels are averaged down an image pyramid. Push: from the
+    coarsest level up, each level is blended over the upsampled coarser one by
+    its coverage. Every texel outside the mask is filled, in a single pass of
+    O(H * W) work, and the texels inside the mask are kept as they are.
+
+    Args:
+        img: Image, the texels outside the mask are ignored
+        mask: Valid texels
+
+    Returns:
+        Tensor: The filled image
+    """
+    mask = mask.bool()
+    weight = mask.to(img.dtype)
+    color = img * weight
+    levels = [(color, weight)]
+    while color.shape[-2] > 1 or color.shape[-1] > 1:
+        # Pooling color and weight alike keeps their ratio right at odd sizes
+        color = F.avg_pool2d(color, 2, ceil_mode=True)
+        weight = F.avg_pool2d(weight, 2, ceil_mode=True)
+        levels.append((color, weight))
+
+    filled = None
+    for color, weight in reversed(levels):
+        normalized = color / weight.clamp(min=1e-8)
+        if filled is None:
+            filled = normalized
+        else:
+            upsampled = F.interpolate(
+                filled, size=color.shape[-2:], mode="bilinear", align_corners=False
+            )
+            filled = torch.lerp(upsampled, normalized, weight)
+    return torch.where(mask, img, filled)
+
+
 def float32_to_uint8_np(
     x: Float[np.ndarray, "*B H W C"],
     dither: bool = True,
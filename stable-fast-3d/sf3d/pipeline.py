@@ -0,0 +1,399 @@
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, List, Literal, Optional
+
+import torch
+import trimesh
+from PIL import Image
+
+from sf3d.glb import GLBMesh
+from sf3d.models.mesh import Mesh
+from sf3d.profiling import profile_stage
+from sf3d.system import SF3D
+from sf3d.utils import create_intrinsic_from_fov_deg, default_cond_c2w
+
+# Marks the end of the stream for the stage threads
+_STOP = object()
+
+
+@dataclass
+class _WorkItem:
+    image: Image.Image
+    bake_resolution: int
+    remesh: Literal["none", "triangle", "quad"]
+    vertex_count: int
+    future: Future
+    stage_callback: Optional[Callable[[str], None]] = None
+
+    # Filled in by the stages
+    mesh: Optional[Mesh] = None
+    scene_code: Any = None
+    global_dict: dict = field(default_factory=dict)
+    index: int = 0
+    mat_out: Optional[dict] = None
+    bake_mask: Any = None
+
+    def stage(self, name: str):
+        if self.stage_callback is not None:
+            self.stage_callback(name)
+
+
+class SF3DPipeline:
+    """Runs SF3D over a stream of images with overlapping stages.
+
+    generate_mesh processes one mesh after the other, so the GPU idles while
+    the CPU remeshes, unwraps and encodes textures. The pipeline splits the work
+    into stages connected by bounded queues:
+
+        encode (GPU) -> postprocess (CPU workers) -> bake (GPU) -> export (CPU workers)
+
+    While image k is remeshed or unwrapped the next images are already being
+    encoded. The encode stage micro-batches whatever images are waiting, up to
+    max_batch_size. The bounded queues provide back-pressure: submit blocks once
+    queue_size images are waiting to be encoded.
+
+    Use submit() for individual images (returns a Future of a trimesh.Trimesh,
+    or of a GLBMesh with output_format="glb") or map() for an ordered stream of
+    results.
+    """
+
+    def __init__(
+        self,
+        model: SF3D,
+        max_batch_size: int = 1,
+        queue_size: int = 4,
+        num_postprocess_workers: int = 2,
+        num_export_workers: int = 2,
+        estimate_illumination: bool = False,
+        autocast_dtype: Optional[torch.dtype] = torch.bfloat16,
+        point_budget: Optional[int] = None,
+        output_format: Literal["trimesh", "glb"] = "trimesh",
+    ):
+        self.model = model
+        self.point_budget = point_budget
+        self.output_format = output_format
+        self.max_batch_size = max_batch_size
+        self.estimate_illumination = estimate_illumination
+        self.autocast_dtype = autocast_dtype
+
+        self.encode_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.postprocess_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.bake_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.export_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._closed = False
+
+        self._threads: List[threading.Thread] = []
+        self._start(self._encode_loop, 1, "sf3d-encode")
+        self._postprocess_threads = self._start(
+            self._postprocess_loop, num_postprocess_workers, "sf3d-postprocess"
+        )
+        self._bake_threads = self._start(self._bake_loop, 1, "sf3d-bake")
+        self._export_threads = self._start(
+            self._export_loop, num_export_workers, "sf3d-export"
+        )
+
+    def _start(self, target, count: int, name: str) -> List[threading.Thread]:
+        threads = []
+        for i in range(count):
+            # Run in a copy of the current context, so an active profiler also
+            # records the stages running on the pipeline threads
+            context = contextvars.copy_context()
+            thread = threading.Thread(
+                target=context.run, args=(target,), name=f"{name}-{i}", daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        self._threads.extend(threads)
+        return threads
+
+    @property
+    def num_pending(self) -> int:
+        """Number of submitted images whose mesh is not finished yet."""
+        return self._pending
+
+    def full(self) -> bool:
+        """Whether submit(block=False) would currently be rejected."""
+        return self.encode_queue.full()
+
+    def submit(
+        self,
+        image: Image.Image,
+        bake_resolution: int,
+        remesh: Literal["none", "triangle", "quad"] = "none",
+        vertex_count: int = -1,
+        stage_callback: Optional[Callable[[str], None]] = None,
+        block: bool = True,
+    ) -> Future:
+        """Queue an image for generation.
+
+        Args:
+            image: RGBA input image with the background removed
+            bake_resolution: Texture atlas resolution
+            remesh: Remeshing option
+            vertex_count: Target vertex count for remeshing
+            stage_callback: Called with the name of each stage the image enters
+            block: Wait for space in the queue. If False, queue.Full is raised
+                when the pipeline is saturated
+
+        Returns:
+            Future: Resolves to the generated trimesh.Trimesh
+        """
+        if self._closed:
+            raise RuntimeError("Pipeline is closed")
+
+        future = Future()
+        item = _WorkItem(
+            image=image,
+            bake_resolution=bake_resolution,
+            remesh=remesh,
+            vertex_count=vertex_count,
+            future=future,
+            stage_callback=stage_callback,
+        )
+        with self._pending_lock:
+            self._pending += 1
+        future.add_done_callback(self._on_done)
+        item.stage("queued")
+        try:
+            self.encode_queue.put(item, block=block)
+        except queue.Full:
+            future.cancel()
+            raise
+        return future
+
+    def map(
+        self,
+        images: Iterable[Image.Image],
+        bake_resolution: int,
+        remesh: Literal["none", "triangle", "quad"] = "none",
+        vertex_count: int = -1,
+    ) -> Iterator[trimesh.Trimesh]:
+        """Generate meshes for a stream of images, yielding them in input order."""
+        futures: "queue.Queue[Optional[Future]]" = queue.Queue()
+
+        def feed():
+            try:
+                for image in images:
+                    futures.put(
+                        self.submit(image, bake_resolution, remesh, vertex_count)
+                    )
+            finally:
+                futures.put(None)
+
+        # Submitting from a separate thread keeps the pipeline full while the
+        # caller consumes results
+        feeder = threading.Thread(target=feed, name="sf3d-feed", daemon=True)
+        feeder.start()
+        while True:
+            future = futures.get()
+            if future is None:
+                break
+            yield future.result()
+        feeder.join()
+
+    def close(self):
+        """Finish all queued images and stop the stage threads."""
+        if self._closed:
+            return
+        self._closed = True
+        # Stop each stage only after the previous one drained, so nothing
+        # queued is lost
+        self.encode_queue.put(_STOP)
+        self._threads[0].join()
+        for threads, stage_queue in (
+            (self._postprocess_threads, self.postprocess_queue),
+            (self._bake_threads, self.bake_queue),
+            (self._export_threads, self.export_queue),
+        ):
+            for _ in threads:
+                stage_queue.put(_STOP)
+            for thread in threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _on_done(self, future: Future):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _autocast(self):
+        device_type = self.model.device.type
+        if device_type == "cuda" and self.autocast_dtype is not None:
+            return torch.autocast(device_type=device_type, dtype=self.autocast_dtype)
+        return nullcontext()
+
+    def _no_autocast(self):
+        # Mirrors generate_mesh, which runs everything after the encoding in fp32
+        device_type = self.model.device.type
+        if device_type == "cuda":
+            return torch.autocast(device_type=device_type, enabled=False)
+        return nullcontext()
+
+    @staticmethod
+    def _fail(item: _WorkItem, error: BaseException):
+        if not item.future.done():
+            item.future.set_exception(error)
+
+    def _collect_batch(self) -> List[Any]:
+        items = [self.encode_queue.get()]
+        while len(items) < self.max_batch_size and items[-1] is not _STOP:
+            try:
+                items.append(self.encode_queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _encode_loop(self):
+        model = self.model
+        while True:
+            items = self._collect_batch()
+            stop = items[-1] is _STOP
+            items = [
+                item
+                for item in items
+                if item is not _STOP and item.future.set_running_or_notify_cancel()
+            ]
+
+            if len(items) > 0:
+                try:
+                    self._encode(model, items)
+                except Exception as e:
+                    for item in items:
+                        self._fail(item, e)
+                else:
+                    for item in items:
+                        if item.mesh.v_pos.shape[0] == 0:
+                            item.future.set_result(
+                                GLBMesh.empty()
+                                if self.output_format == "glb"
+                                else trimesh.Trimesh()
+                            )
+                        else:
+                            self.postprocess_queue.put(item)
+
+            if stop:
+                return
+
+    def _encode(self, model: SF3D, items: List[_WorkItem]):
+        batch_size = len(items)
+        mask_cond = []
+        rgb_cond = []
+        with profile_stage("prepare_image"):
+            for item in items:
+                item.stage("prepare")
+                mask, rgb = model.prepare_image(item.image)
+                mask_cond.append(mask)
+                rgb_cond.append(rgb)
+
+        c2w_cond = default_cond_c2w(model.cfg.default_distance).to(model.device)
+        intrinsic, intrinsic_normed_cond = create_intrinsic_from_fov_deg(
+            model.cfg.default_fovy_deg,
+            model.cfg.cond_image_size,
+            model.cfg.cond_image_size,
+        )
+        batch = {
+            "rgb_cond": torch.stack(rgb_cond, 0),
+            "mask_cond": torch.stack(mask_cond, 0),
+            "c2w_cond": c2w_cond.view(1, 1, 4, 4).repeat(batch_size, 1, 1, 1),
+            "intrinsic_cond": intrinsic.to(model.device)
+            .view(1, 1, 3, 3)
+            .repeat(batch_size, 1, 1, 1),
+            "intrinsic_normed_cond": intrinsic_normed_cond.to(model.device)
+            .view(1, 1, 3, 3)
+            .repeat(batch_size, 1, 1, 1),
+        }
+
+        def stage_callback(name: str):
+            for item in items:
+                item.stage(name)
+
+        with torch.no_grad():
+            with self._autocast():
+                scene_codes, _, global_dict = model.encode(
+                    batch, self.estimate_illumination, stage_callback=stage_callback
+                )
+            with self._no_autocast():
+                stage_callback("isosurface")
+                with profile_stage("triplane_to_meshes"):
+                    meshes = model.triplane_to_meshes(
+                        scene_codes, point_budget=self.point_budget
+                    )
+
+        for i, (item, mesh) in enumerate(zip(items, meshes)):
+            item.mesh = mesh
+            item.scene_code = scene_codes[i]
+            item.global_dict = global_dict
+            item.index = i
+
+    def _postprocess_loop(self):
+        while True:
+            item = self.postprocess_queue.get()
+            if item is _STOP:
+                return
+            try:
+                with torch.no_grad():
+                    item.mesh = self.model.postprocess_mesh(
+                        item.mesh,
+                        item.remesh,
+                        item.vertex_count,
+                        stage_callback=item.stage_callback,
+                    )
+            except Exception as e:
+                self._fail(item, e)
+                continue
+            self.bake_queue.put(item)
+
+    def _bake_loop(self):
+        while True:
+            item = self.bake_queue.get()
+            if item is _STOP:
+                return
+            try:
+                with torch.no_grad(), self._no_autocast():
+                    item.mat_out, item.bake_mask = self.model.bake_mesh(
+                        item.mesh,
+                        item.scene_code,
+                        item.global_dict,
+                        item.index,
+                        item.bake_resolution,
+                        stage_callback=item.stage_callback,
+                        point_budget=self.point_budget,
+                    )
+            except Exception as e:
+                self._fail(item, e)
+                continue
+            # Release the GPU tensors that are not needed anymore
+            item.scene_code = None
+            item.global_dict = {}
+            self.export_queue.put(item)
+
+    def _export_loop(self):
+        while True:
+            item = self.export_queue.get()
+            if item is _STOP:
+                return
+            try:
+                with torch.no_grad():
+                    tmesh = self.model.export_mesh(
+                        item.mesh,
+                        item.mat_out,
+                        item.bake_mask,
+                        item.bake_resolution,
+                        stage_callback=item.stage_callback,
+                        output_format=self.output_format,
+                    )
+            except Exception as e:
+                self._fail(item, e)
+                continue
+            item.future.set_result(tmesh)
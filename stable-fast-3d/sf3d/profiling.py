@@ -0,0 +1,247 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import torch
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+@dataclass
+class StageRecord:
+    name: str
+    depth: int
+    thread_id: int
+    # Wall clock start relative to the creation of the profiler
+    start_s: float
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    cuda_ms: Optional[float] = None
+    peak_memory_mb: Optional[float] = None
+    cuda_events: Any = field(default=None, repr=False)
+
+
+class StageProfiler:
+    """Records wall time, CPU time, CUDA time and peak memory per stage.
+
+    Stages are opened with the stage() context manager and may be nested.
+    CUDA kernels run asynchronously, so the CUDA time of a stage is measured
+    with events and only resolved (after a synchronize) in to_dict().
+
+    Peak memory is the maximum allocated CUDA memory during the stage. On MPS
+    the driver allocated memory at the end of the stage and on CPU the peak
+    resident set size of the process are reported instead. The global CUDA
+    peak counter is never reset. A stage that stays below an earlier peak
+    reports the larger of the memory allocated at its start and end, which is
+    a lower bound. Peaks of stages running concurrently on different threads
+    are only approximate.
+    """
+
+    def __init__(self, cuda: Optional[bool] = None):
+        if cuda is None:
+            cuda = torch.cuda.is_available()
+        self.cuda = cuda
+        if cuda:
+            self.memory_source = "cuda_max_memory_allocated"
+        elif torch.backends.mps.is_available():
+            self.memory_source = "mps_driver_allocated_memory"
+        elif resource is not None:
+            self.memory_source = "max_rss"
+        else:
+            self.memory_source = None
+
+        self.records: List[StageRecord] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def _stack(self) -> List[list]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _memory_mb(self) -> Optional[float]:
+        if self.memory_source == "cuda_max_memory_allocated":
+            return torch.cuda.max_memory_allocated() / 1024 / 1024
+        if self.memory_source == "mps_driver_allocated_memory":
+            return torch.mps.driver_allocated_memory() / 1024 / 1024
+        if self.memory_source == "max_rss":
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if sys.platform == "darwin":
+                return max_rss / 1024 / 1024
+            return max_rss / 1024
+        return None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageRecord]:
+        stack = self._stack()
+        record = StageRecord(
+            name=name,
+            depth=len(stack),
+            thread_id=threading.get_ident(),
+            start_s=time.perf_counter() - self._origin,
+        )
+        with self._lock:
+            self.records.append(record)
+
+        if self.cuda:
+            # The peak counter is left alone, callers read the peak of the
+            # whole run from it after profiling
+            start_peak = torch.cuda.max_memory_allocated()
+            start_allocated = torch.cuda.memory_allocated()
+            start_event = torch.cuda.Event(enable_timing=True)
+            end_event = torch.cuda.Event(enable_timing=True)
+            start_event.record()
+
+        # Entries are [record, running peak of the children]
+        stack.append([record, 0.0])
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield record
+        finally:
+            record.wall_ms = (time.perf_counter() - start_wall) * 1000
+            record.cpu_ms = (time.thread_time() - start_cpu) * 1000
+            _, children_peak = stack.pop()
+
+            memory = self._memory_mb()
+            if self.cuda:
+                end_event.record()
+                record.cuda_events = (start_event, end_event)
+                if torch.cuda.max_memory_allocated() <= start_peak:
+                    # The stage stayed below an earlier peak. Its own peak is
+                    # not known, report what is allocated at its boundaries
+                    memory = (
+                        max(start_allocated, torch.cuda.memory_allocated())
+                        / 1024
+                        / 1024
+                    )
+                memory = max(memory, children_peak)
+                if len(stack) > 0:
+                    stack[-1][1] = max(stack[-1][1], memory)
+            record.peak_memory_mb = memory
+
+    def _resolve_cuda_times(self):
+        if not self.cuda:
+            return
+        torch.cuda.synchronize()
+        for record in self.records:
+            if record.cuda_events is not None:
+                start_event, end_event = record.cuda_events
+                record.cuda_ms = start_event.elapsed_time(end_event)
+                record.cuda_events = None
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Aggregate the records by stage name."""
+        self._resolve_cuda_times()
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault(
+                record.name,
+                {"count": 0, "wall_ms": 0.0, "cpu_ms": 0.0},
+            )
+            entry["count"] += 1
+            entry["wall_ms"] += record.wall_ms
+            entry["cpu_ms"] += record.cpu_ms
+            if record.cuda_ms is not None:
+                entry["cuda_ms"] = entry.get("cuda_ms", 0.0) + record.cuda_ms
+            if record.peak_memory_mb is not None:
+                entry["peak_memory_mb"] = max(
+                    entry.get("peak_memory_mb", 0.0), record.peak_memory_mb
+                )
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON serializable report.
+
+        The result is also a valid Chrome trace (chrome://tracing, Perfetto), as
+        the trace viewers ignore the keys besides traceEvents.
+        """
+        summary = self.summary()
+        pid = os.getpid()
+        events = []
+        for record in self.records:
+            args = {"cpu_ms": record.cpu_ms}
+            if record.cuda_ms is not None:
+                args["cuda_ms"] = record.cuda_ms
+            if record.peak_memory_mb is not None:
+                args["peak_memory_mb"] = record.peak_memory_mb
+            events.append(
+                {
+                    "name": record.name,
+                    "cat": "sf3d",
+                    "ph": "X",
+                    "ts": record.start_s * 1e6,
+                    "dur": record.wall_ms * 1e3,
+                    "pid": pid,
+                    "tid": record.thread_id,
+                    "args": args,
+                }
+            )
+        return {
+            "memory_source": self.memory_source,
+            "summary": summary,
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+        }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def format_summary(self) -> str:
+        lines = [
+            f"{'stage':<20} {'count':>5} {'wall ms':>10} {'cpu ms':>10} {'cuda ms':>10} {'peak MB':>10}"
+        ]
+        for name, entry in self.summary().items():
+            cuda_ms = entry.get("cuda_ms")
+            peak = entry.get("peak_memory_mb")
+            lines.append(
+                f"{name:<20} {entry['count']:>5} {entry['wall_ms']:>10.1f} {entry['cpu_ms']:>10.1f} "
+                f"{cuda_ms if cuda_ms is None else round(cuda_ms, 1)!s:>10} "
+                f"{peak if peak is None else round(peak, 1)!s:>10}"
+            )
+        return "\n".join(lines)
+
+
+_active_profiler: ContextVar[Optional[StageProfiler]] = ContextVar(
+    "sf3d_active_profiler", default=None
+)
+
+
+def get_active_profiler() -> Optional[StageProfiler]:
+    return _active_profiler.get()
+
+
+@contextmanager
+def profiling(profiler: Optional[StageProfiler] = None) -> Iterator[StageProfiler]:
+    """Activate a profiler for all profile_stage calls in the current context."""
+    if profiler is None:
+        profiler = StageProfiler()
+    token = _active_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _active_profiler.reset(token)
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Record a stage on the active profiler. Does nothing if none is active."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
@@ -1,7 +1,10 @@
+import dataclasses
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import nullcontext
 from dataclasses import dataclass, field
-from typing import Any, List, Literal, Optional, Tuple, Union
+from typing import Any, Callable, List, Literal, Optional, Tuple, Union
 
 import numpy as np
 import torch
@@ -12,9 +15,11 @@ from huggingface_hub import hf_hub_download
 from jaxtyping import Float
 from omegaconf import OmegaConf
 from PIL import Image
-from safetensors.torch import load_model
+from safetensors.torch import load_file, load_model
 from torch import Tensor
 
+from sf3d.cache import SceneCodeCache
+from sf3d.glb import GLBMesh, check_texture_format, encode_textures, write_glb
 from sf3d.models.isosurface import MarchingTetrahedraHelper
 from sf3d.models.mesh import Mesh
 from sf3d.models.utils import (
@@ -24,10 +29,18 @@ from sf3d.models.utils import (
     dilate_fill,
     find_class,
     float32_to_uint8_np,
+    init_empty_weights,
     normalize,
+    push_pull_fill,
     scale_tensor,
 )
-from sf3d.utils import create_intrinsic_from_fov_deg, default_cond_c2w, get_device
+from sf3d.profiling import StageProfiler, get_active_profiler, profile_stage, profiling
+from sf3d.utils import (
+    create_intrinsic_from_fov_deg,
+    default_cond_c2w,
+    get_available_memory,
+    get_device,
+)
 
 try:
     from texture_baker import TextureBaker
@@ -40,6 +53,18 @@ except ImportError:
     # Exit early to avoid further errors
     raise ImportError("texture_baker not found")
 
+# Share of the available memory the points of one triplane query slice may use
+AUTO_POINT_BUDGET_MEMORY_FRACTION = 0.25
+# Point budget used when the available memory cannot be determined
+DEFAULT_POINT_BUDGET = 2**20
+MIN_POINT_BUDGET = 2**16
+
+# Rotation from the SF3D frame to the +Y up glTF frame: -90 degrees about x,
+# then 90 degrees about y
+GLB_AXIS_ROTATION = torch.tensor(
+    [[0.0, -1.0, 0.0], [0.0, 0.0, 1.0], [-1.0, 0.0, 0.0]], dtype=torch.float32
+)
+
 
 class SF3D(BaseModule):
     @dataclass
@@ -47,6 +72,15 @@ class SF3D(BaseModule):
         cond_image_size: int
         isosurface_resolution: int
         isosurface_threshold: float = 10.0
+        # Decode a coarse lattice first and only the tet grid vertices in cells
+        # near the surface. Features smaller than a coarse cell can be missed
+        isosurface_adaptive: bool = False
+        # Coarse cell size in fine grid cells
+        isosurface_coarse_factor: int = 4
+        # UV padding of the baked textures. "push_pull" fills every texel
+        # outside the UV islands in one pass, "dilate" grows the islands by
+        # bake_resolution // 150 texels and leaves the rest black
+        texture_padding: str = "push_pull"
         radius: float = 1.0
         background_color: list[float] = field(default_factory=lambda: [0.5, 0.5, 0.5])
         default_fovy_deg: float = 40.0
@@ -80,23 +114,72 @@ class SF3D(BaseModule):
 
     @classmethod
     def from_pretrained(
-        cls, pretrained_model_name_or_path: str, config_name: str, weight_name: str
+        cls,
+        pretrained_model_name_or_path: str,
+        config_name: str,
+        weight_name: str,
+        fast_init: bool = False,
     ):
-        if os.path.isdir(pretrained_model_name_or_path):
-            config_path = os.path.join(pretrained_model_name_or_path, config_name)
-            weight_path = os.path.join(pretrained_model_name_or_path, weight_name)
-        else:
-            config_path = hf_hub_download(
-                repo_id=pretrained_model_name_or_path, filename=config_name
-            )
-            weight_path = hf_hub_download(
-                repo_id=pretrained_model_name_or_path, filename=weight_name
+        """
+        Args:
+            pretrained_model_name_or_path: Local directory or Hugging Face repo id
+            config_name: Name of the config file
+            weight_name: Name of the safetensors checkpoint
+            fast_init: Construct the model without downloading the pretrained
+                DINOv2 and CLIP weights and without randomly initializing any
+                parameters, as the checkpoint replaces all of them. The checkpoint
+                is read concurrently with the construction and its tensors are
+                assigned to the parameters without another copy
+        """
+
+        def resolve(filename: str) -> str:
+            if os.path.isdir(pretrained_model_name_or_path):
+                return os.path.join(pretrained_model_name_or_path, filename)
+            return hf_hub_download(
+                repo_id=pretrained_model_name_or_path, filename=filename
             )
 
-        cfg = OmegaConf.load(config_path)
+        cfg = OmegaConf.load(resolve(config_name))
         OmegaConf.resolve(cfg)
-        model = cls(cfg)
-        load_model(model, weight_path)
+
+        if not fast_init:
+            model = cls(cfg)
+            load_model(model, resolve(weight_name))
+            return model
+
+        for name in ("image_tokenizer", "image_estimator"):
+            config_cls = find_class(cfg[f"{name}_cls"]).Config
+            if "load_pretrained_weights" in {
+                f.name for f in dataclasses.fields(config_cls)
+            }:
+                cfg[name]["load_pretrained_weights"] = False
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Download and read the checkpoint while the modules are constructed
+            # and the tets are loaded
+            state_dict = executor.submit(lambda: load_file(resolve(weight_name)))
+            with init_empty_weights():
+                model = cls(cfg)
+            state_dict = state_dict.result()
+
+        # Keep the dtypes of the model, as load_model would
+        expected = model.state_dict()
+        state_dict = {
+            key: value.to(expected[key].dtype) if key in expected else value
+            for key, value in state_dict.items()
+        }
+        model.load_state_dict(state_dict, strict=True, assign=True)
+
+        uninitialized = [
+            name
+            for name, tensor in list(model.named_parameters())
+            + list(model.named_buffers())
+            if tensor.is_meta
+        ]
+        if len(uninitialized) > 0:
+            raise RuntimeError(
+                f"Not initialized by the checkpoint: {', '.join(uninitialized)}"
+            )
         return model
 
     @property
@@ -147,36 +230,118 @@ class SF3D(BaseModule):
 
         self.baker = TextureBaker()
         self.image_processor = ImageProcessor()
+        self.scene_code_cache: Optional[SceneCodeCache] = None
+        self.texture_format = "JPEG"
+        self.texture_quality: Optional[int] = None
+
+    def set_texture_encoding(self, format: str = "JPEG", quality: Optional[int] = None):
+        """Image format and quality of the exported textures.
+
+        Args:
+            format: JPEG, PNG or WEBP. WEBP needs output_format="glb", and the
+                viewer has to support the EXT_texture_webp extension
+            quality: 0-100 for JPEG and WEBP, the PIL default if None. Only
+                applied with output_format="glb"
+        """
+        self.texture_format = check_texture_format(format)
+        self.texture_quality = quality
+
+    def enable_scene_code_cache(
+        self,
+        max_size_bytes: int = 1024 * 1024 * 1024,
+        spill_dir: Optional[str] = None,
+        spill_max_size_bytes: int = 0,
+    ):
+        self.scene_code_cache = SceneCodeCache(
+            max_size_bytes,
+            spill_dir=spill_dir,
+            spill_max_size_bytes=spill_max_size_bytes,
+        )
+
+    def disable_scene_code_cache(self):
+        self.scene_code_cache = None
 
     def triplane_to_meshes(
-        self, triplanes: Float[Tensor, "B 3 Cp Hp Wp"]
+        self,
+        triplanes: Float[Tensor, "B 3 Cp Hp Wp"],
+        point_budget: Optional[int] = None,
+        adaptive: Optional[bool] = None,
     ) -> list[Mesh]:
-        meshes = []
-        for i in range(triplanes.shape[0]):
-            triplane = triplanes[i]
+        if adaptive is None:
+            adaptive = self.cfg.isosurface_adaptive
+        if adaptive:
+            # The refined vertices differ per item
+            values = [
+                self._query_isosurface_adaptive(triplane, point_budget)
+                for triplane in triplanes
+            ]
+            sdf = torch.stack([value[0] for value in values], 0)
+            deform = torch.stack([value[1] for value in values], 0)
+        else:
             grid_vertices = scale_tensor(
                 self.isosurface_helper.grid_vertices.to(triplanes.device),
                 self.isosurface_helper.points_range,
                 self.bbox,
             )
 
-            values = self.query_triplane(grid_vertices, triplane)
-            decoded = self.decoder(values, include=["vertex_offset", "density"])
+            # All items share the grid, so they are queried in one call
+            decoded = self.decode_triplane(
+                grid_vertices,
+                triplanes,
+                include=["vertex_offset", "density"],
+                point_budget=point_budget,
+            )
             sdf = decoded["density"] - self.cfg.isosurface_threshold
+            deform = decoded["vertex_offset"]
 
-            deform = decoded["vertex_offset"].squeeze(0)
-
-            mesh: Mesh = self.isosurface_helper(
-                sdf.view(-1, 1), deform.view(-1, 3) if deform is not None else None
-            )
+        meshes = self.isosurface_helper.forward_batched(sdf, deform)
+        for mesh in meshes:
             mesh.v_pos = scale_tensor(
                 mesh.v_pos, self.isosurface_helper.points_range, self.bbox
             )
 
-            meshes.append(mesh)
-
         return meshes
 
+    def _query_isosurface_adaptive(
+        self, triplane: Float[Tensor, "3 Cp Hp Wp"], point_budget: Optional[int]
+    ) -> Tuple[Float[Tensor, "Nv 1"], Float[Tensor, "Nv 3"]]:
+        helper = self.isosurface_helper
+        coarse_resolution = max(
+            helper.resolution // self.cfg.isosurface_coarse_factor, 1
+        )
+        coarse_vertices = scale_tensor(
+            helper.coarse_grid_vertices(coarse_resolution).to(triplane.device),
+            helper.points_range,
+            self.bbox,
+        )
+        coarse_sdf = (
+            self.decode_triplane(
+                coarse_vertices,
+                triplane,
+                include=["density"],
+                point_budget=point_budget,
+            )["density"]
+            - self.cfg.isosurface_threshold
+        )
+        # The remaining vertices keep the interpolated coarse values. They only
+        # decide the inside/outside of tets that do not cross the surface
+        refine, sdf = helper.refine_from_coarse(coarse_sdf, coarse_resolution)
+
+        decoded = self.decode_triplane(
+            scale_tensor(
+                helper.grid_vertices[refine].to(triplane.device),
+                helper.points_range,
+                self.bbox,
+            ),
+            triplane,
+            include=["vertex_offset", "density"],
+            point_budget=point_budget,
+        )
+        sdf[refine] = decoded["density"] - self.cfg.isosurface_threshold
+        deform = torch.zeros_like(helper.grid_vertices)
+        deform[refine] = decoded["vertex_offset"].to(deform.dtype)
+        return sdf, deform
+
     def query_triplane(
         self,
         positions: Float[Tensor, "*B N 3"],
@@ -207,7 +372,135 @@ class SF3D(BaseModule):
 
         return out
 
-    def get_scene_codes(self, batch) -> Float[Tensor, "B 3 C H W"]:
+    def sample_triplane(
+        self,
+        positions: Float[Tensor, "N 3"],
+        triplane: Float[Tensor, "*B 3 Cp Hp Wp"],
+        dtype: torch.dtype = torch.float32,
+    ) -> Float[Tensor, "*B N F"]:
+        """query_triplane for positions shared by all triplanes, without the
+        feature layout change.
+
+        The features are returned as a transposed view of the channel-first
+        grid_sample output instead of being rearranged into a new tensor.
+        Only the triplane and the sampling grid are cast to dtype, not the
+        features.
+        """
+        batched = triplane.ndim == 5
+        triplanes = triplane if batched else triplane[None]
+        batch_size = triplanes.shape[0]
+        positions = scale_tensor(
+            positions, (-self.cfg.radius, self.cfg.radius), (-1, 1)
+        ).to(dtype)
+        # xy, xz and yz coordinates for the three planes: 3 x 1 x N x 2
+        plane_axes = torch.tensor([[0, 1], [0, 2], [1, 2]], device=positions.device)
+        grid = positions[:, plane_axes].permute(1, 0, 2).unsqueeze(1)
+        out: Float[Tensor, "B3 Cp 1 N"] = F.grid_sample(
+            triplanes.flatten(0, 1).to(dtype),
+            grid.repeat(batch_size, 1, 1, 1),
+            align_corners=True,
+            mode="bilinear",
+        )
+        # B (Np Cp) N -> B N (Np Cp) without a copy
+        out = out.view(batch_size, -1, out.shape[-1]).transpose(1, 2)
+        return out if batched else out[0]
+
+    def decode_triplane(
+        self,
+        positions: Float[Tensor, "N 3"],
+        triplane: Float[Tensor, "*B 3 Cp Hp Wp"],
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        point_budget: Optional[int] = None,
+    ) -> dict[str, Tensor]:
+        """Query the triplane at the positions and decode the features.
+
+        The positions are processed in slices of at most point_budget points and
+        the decoded values are written into preallocated outputs, so only the
+        triplane features and decoder activations of one slice are alive at a
+        time.
+
+        Args:
+            positions: Query positions
+            triplane: Triplane of a single scene, or a batch of triplanes that
+                are all queried at the same positions
+            include: Decoder heads to evaluate
+            exclude: Decoder heads to skip
+            point_budget: Maximum number of points per slice. If None, the
+                budget is derived from the memory available on the device
+
+        Returns:
+            dict[str, Tensor]: Decoded values per head, each of shape [N, C], or
+                [B, N, C] for a batch of triplanes
+        """
+        budget = self.resolve_point_budget(point_budget, positions.device)
+        if triplane.ndim == 5:
+            # The budget covers the points of all triplanes
+            budget = max(budget // triplane.shape[0], 1)
+        num_points = positions.shape[0]
+        if num_points <= budget:
+            return self._decode_triplane_slice(positions, triplane, include, exclude)
+
+        out = {}
+        for start in range(0, num_points, budget):
+            end = min(start + budget, num_points)
+            decoded = self._decode_triplane_slice(
+                positions[start:end], triplane, include, exclude
+            )
+            for name, value in decoded.items():
+                if name not in out:
+                    out[name] = value.new_empty(
+                        (*value.shape[:-2], num_points, value.shape[-1])
+                    )
+                out[name][..., start:end, :] = value
+        return out
+
+    def _decode_triplane_slice(
+        self,
+        positions: Float[Tensor, "N 3"],
+        triplane: Float[Tensor, "*B 3 Cp Hp Wp"],
+        include: Optional[List[str]],
+        exclude: Optional[List[str]],
+    ) -> dict[str, Tensor]:
+        if hasattr(self.decoder, "forward_fused"):
+            features = self.sample_triplane(
+                positions, triplane, dtype=next(self.decoder.parameters()).dtype
+            )
+            return self.decoder.forward_fused(
+                features, include=include, exclude=exclude
+            )
+        if triplane.ndim == 5:
+            positions = positions.expand(triplane.shape[0], -1, -1)
+            features = self.query_triplane(positions, triplane)
+        else:
+            features = self.query_triplane(positions, triplane)[0]
+        return self.decoder(features, include=include, exclude=exclude)
+
+    def resolve_point_budget(
+        self, point_budget: Optional[int], device: Union[str, torch.device]
+    ) -> int:
+        if point_budget is not None:
+            if point_budget <= 0:
+                raise ValueError(f"point_budget must be positive, got {point_budget}")
+            return point_budget
+
+        available = get_available_memory(device)
+        if available is None:
+            return DEFAULT_POINT_BUDGET
+        # Per point: the grid_sample coordinates, the sampled and rearranged
+        # features, the activations of a hidden layer and all head outputs
+        feature_channels = self.decoder.cfg.in_channels
+        hidden_channels = getattr(self.decoder.cfg, "n_neurons", feature_channels)
+        out_channels = sum(head.out_channels for head in self.decoder.cfg.heads)
+        bytes_per_point = 4 * (
+            6 + 2 * feature_channels + 2 * hidden_channels + out_channels
+        )
+        budget = int(available * AUTO_POINT_BUDGET_MEMORY_FRACTION) // bytes_per_point
+        return max(budget, MIN_POINT_BUDGET)
+
+    def get_scene_codes(
+        self, batch, stage_callback: Optional[Callable[[str], None]] = None
+    ) -> Float[Tensor, "B 3 C H W"]:
         # if batch[rgb_cond] is only one view, add a view dimension
         if len(batch["rgb_cond"].shape) == 4:
             batch["rgb_cond"] = batch["rgb_cond"].unsqueeze(1)
@@ -221,10 +514,13 @@ class SF3D(BaseModule):
         camera_embeds: Optional[Float[Tensor, "B Nv Cc"]]
         camera_embeds = self.camera_embedder(**batch)
 
-        input_image_tokens: Float[Tensor, "B Nv Cit Nit"] = self.image_tokenizer(
-            rearrange(batch["rgb_cond"], "B Nv H W C -> B Nv C H W"),
-            modulation_cond=camera_embeds,
-        )
+        if stage_callback is not None:
+            stage_callback("tokenize")
+        with profile_stage("image_tokenizer"):
+            input_image_tokens: Float[Tensor, "B Nv Cit Nit"] = self.image_tokenizer(
+                rearrange(batch["rgb_cond"], "B Nv H W C -> B Nv C H W"),
+                modulation_cond=camera_embeds,
+            )
 
         input_image_tokens = rearrange(
             input_image_tokens, "B Nv C Nt -> B (Nv Nt) C", Nv=n_input_views
@@ -232,14 +528,18 @@ class SF3D(BaseModule):
 
         tokens: Float[Tensor, "B Ct Nt"] = self.tokenizer(batch_size)
 
-        tokens = self.backbone(
-            tokens,
-            encoder_hidden_states=input_image_tokens,
-            modulation_cond=None,
-        )
+        if stage_callback is not None:
+            stage_callback("backbone")
+        with profile_stage("backbone"):
+            tokens = self.backbone(
+                tokens,
+                encoder_hidden_states=input_image_tokens,
+                modulation_cond=None,
+            )
 
-        direct_codes = self.tokenizer.detokenize(tokens)
-        scene_codes = self.post_processor(direct_codes)
+        with profile_stage("post_processor"):
+            direct_codes = self.tokenizer.detokenize(tokens)
+            scene_codes = self.post_processor(direct_codes)
         return scene_codes, direct_codes
 
     def run_image(
@@ -249,20 +549,58 @@ class SF3D(BaseModule):
         remesh: Literal["none", "triangle", "quad"] = "none",
         vertex_count: int = -1,
         estimate_illumination: bool = False,
+        stage_callback: Optional[Callable[[str], None]] = None,
+        profile: bool = False,
+        point_budget: Optional[int] = None,
+        output_format: Literal["trimesh", "glb"] = "trimesh",
     ) -> Tuple[Union[trimesh.Trimesh, List[trimesh.Trimesh]], dict[str, Any]]:
-        if isinstance(image, list):
-            rgb_cond = []
-            mask_cond = []
-            for img in image:
-                mask, rgb = self.prepare_image(img)
-                mask_cond.append(mask)
-                rgb_cond.append(rgb)
-            rgb_cond = torch.stack(rgb_cond, 0)
-            mask_cond = torch.stack(mask_cond, 0)
-            batch_size = rgb_cond.shape[0]
-        else:
-            mask_cond, rgb_cond = self.prepare_image(image)
-            batch_size = 1
+        with self._profiling(profile) as profiler:
+            meshes, global_dict = self._run_image(
+                image,
+                bake_resolution,
+                remesh,
+                vertex_count,
+                estimate_illumination,
+                stage_callback,
+                point_budget,
+                output_format,
+            )
+        if profile:
+            global_dict["profile"] = profiler.to_dict()
+        return meshes, global_dict
+
+    def _profiling(self, profile: bool):
+        # Record into an already active profiler (e.g. one spanning the export
+        # in run.py) instead of starting a new one
+        if not profile:
+            return nullcontext()
+        return profiling(get_active_profiler() or StageProfiler())
+
+    def _run_image(
+        self,
+        image: Union[Image.Image, List[Image.Image]],
+        bake_resolution: int,
+        remesh: Literal["none", "triangle", "quad"],
+        vertex_count: int,
+        estimate_illumination: bool,
+        stage_callback: Optional[Callable[[str], None]],
+        point_budget: Optional[int] = None,
+        output_format: Literal["trimesh", "glb"] = "trimesh",
+    ) -> Tuple[Union[trimesh.Trimesh, List[trimesh.Trimesh]], dict[str, Any]]:
+        with profile_stage("prepare_image"):
+            if isinstance(image, list):
+                rgb_cond = []
+                mask_cond = []
+                for img in image:
+                    mask, rgb = self.prepare_image(img)
+                    mask_cond.append(mask)
+                    rgb_cond.append(rgb)
+                rgb_cond = torch.stack(rgb_cond, 0)
+                mask_cond = torch.stack(mask_cond, 0)
+                batch_size = rgb_cond.shape[0]
+            else:
+                mask_cond, rgb_cond = self.prepare_image(image)
+                batch_size = 1
 
         c2w_cond = default_cond_c2w(self.cfg.default_distance).to(self.device)
         intrinsic, intrinsic_normed_cond = create_intrinsic_from_fov_deg(
@@ -284,7 +622,14 @@ class SF3D(BaseModule):
         }
 
         meshes, global_dict = self.generate_mesh(
-            batch, bake_resolution, remesh, vertex_count, estimate_illumination
+            batch,
+            bake_resolution,
+            remesh,
+            vertex_count,
+            estimate_illumination,
+            stage_callback=stage_callback,
+            point_budget=point_budget,
+            output_format=output_format,
         )
         if batch_size == 1:
             return meshes[0], global_dict
@@ -314,219 +659,406 @@ class SF3D(BaseModule):
 
         return mask_cond, rgb_cond
 
-    def generate_mesh(
+    def encode(
         self,
         batch,
-        bake_resolution: int,
-        remesh: Literal["none", "triangle", "quad"] = "none",
-        vertex_count: int = -1,
         estimate_illumination: bool = False,
-    ) -> Tuple[List[trimesh.Trimesh], dict[str, Any]]:
+        stage_callback: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[Float[Tensor, "B 3 C H W"], Tensor, dict[str, Any]]:
+        # The image encoding does not depend on the baking options. Reuse it if
+        # the same images were already encoded
+        cached = None
+        if self.scene_code_cache is not None:
+            cache_key = self.scene_code_cache.key(batch, estimate_illumination)
+            cached = self.scene_code_cache.get(cache_key, self.device)
+        if cached is not None:
+            return cached
+
         batch["rgb_cond"] = self.image_processor(
             batch["rgb_cond"], self.cfg.cond_image_size
         )
         batch["mask_cond"] = self.image_processor(
             batch["mask_cond"], self.cfg.cond_image_size
         )
-        scene_codes, non_postprocessed_codes = self.get_scene_codes(batch)
+        scene_codes, non_postprocessed_codes = self.get_scene_codes(
+            batch, stage_callback=stage_callback
+        )
 
         global_dict = {}
         if self.image_estimator is not None:
-            global_dict.update(
-                self.image_estimator(batch["rgb_cond"] * batch["mask_cond"])
-            )
+            with profile_stage("image_estimator"):
+                global_dict.update(
+                    self.image_estimator(batch["rgb_cond"] * batch["mask_cond"])
+                )
         if self.global_estimator is not None and estimate_illumination:
-            global_dict.update(self.global_estimator(non_postprocessed_codes))
+            with profile_stage("global_estimator"):
+                global_dict.update(self.global_estimator(non_postprocessed_codes))
 
-        device = get_device()
-        with torch.no_grad():
-            with torch.autocast(
-                device_type=device, enabled=False
-            ) if "cuda" in device else nullcontext():
-                meshes = self.triplane_to_meshes(scene_codes)
+        if self.scene_code_cache is not None:
+            self.scene_code_cache.put(
+                cache_key, (scene_codes, non_postprocessed_codes, global_dict)
+            )
+        return scene_codes, non_postprocessed_codes, global_dict
 
-                rets = []
-                for i, mesh in enumerate(meshes):
-                    # Check for empty mesh
-                    if mesh.v_pos.shape[0] == 0:
-                        rets.append(trimesh.Trimesh())
-                        continue
+    def postprocess_mesh(
+        self,
+        mesh: Mesh,
+        remesh: Literal["none", "triangle", "quad"] = "none",
+        vertex_count: int = -1,
+        stage_callback: Optional[Callable[[str], None]] = None,
+    ) -> Mesh:
+        if stage_callback is not None:
+            stage_callback("remesh")
+        with profile_stage("remesh"):
+            if remesh == "triangle":
+                mesh = mesh.triangle_remesh(triangle_vertex_count=vertex_count)
+            elif remesh == "quad":
+                mesh = mesh.quad_remesh(quad_vertex_count=vertex_count)
+            else:
+                if vertex_count > 0:
+                    print("Warning: vertex_count is ignored when remesh is none")
+
+        print("After Remesh", mesh.v_pos.shape[0], mesh.t_pos_idx.shape[0])
+        if stage_callback is not None:
+            stage_callback("unwrap")
+        with profile_stage("unwrap_uv"):
+            mesh.unwrap_uv()
+        return mesh
+
+    def bake_mesh(
+        self,
+        mesh: Mesh,
+        scene_code: Float[Tensor, "3 C H W"],
+        global_dict: dict[str, Any],
+        index: int,
+        bake_resolution: int,
+        stage_callback: Optional[Callable[[str], None]] = None,
+        point_budget: Optional[int] = None,
+    ) -> Tuple[dict[str, Any], Tensor]:
+        if stage_callback is not None:
+            stage_callback("bake")
+        # Build textures
+        with profile_stage("rasterize"):
+            rast = self.baker.rasterize(mesh.v_tex, mesh.t_pos_idx, bake_resolution)
+        bake_mask = self.baker.get_mask(rast)
+
+        # Only the covered texels are interpolated, in the order of bake_mask
+        with profile_stage("interpolate"):
+            (gb_pos, gb_nrm, gb_tng), _ = self.baker.interpolate(
+                [mesh.v_pos, mesh.v_nrm, mesh.v_tng],
+                rast,
+                mesh.t_pos_idx,
+                compact=True,
+            )
 
-                    if remesh == "triangle":
-                        mesh = mesh.triangle_remesh(triangle_vertex_count=vertex_count)
-                    elif remesh == "quad":
-                        mesh = mesh.quad_remesh(quad_vertex_count=vertex_count)
-                    else:
-                        if vertex_count > 0:
-                            print(
-                                "Warning: vertex_count is ignored when remesh is none"
-                            )
+        with profile_stage("decoder"):
+            decoded = self.decode_triplane(
+                gb_pos,
+                scene_code,
+                exclude=["density", "vertex_offset"],
+                point_budget=point_budget,
+            )
 
-                    print("After Remesh", mesh.v_pos.shape[0], mesh.t_pos_idx.shape[0])
-                    mesh.unwrap_uv()
+        gb_nrm = F.normalize(gb_nrm, dim=-1)
+        decoded["normal"] = gb_nrm
 
-                    # Build textures
-                    rast = self.baker.rasterize(
-                        mesh.v_tex, mesh.t_pos_idx, bake_resolution
-                    )
-                    bake_mask = self.baker.get_mask(rast)
+        # Check if any keys in global_dict start with decoded_
+        for k, v in global_dict.items():
+            if k.startswith("decoder_"):
+                decoded[k.replace("decoder_", "")] = v[index]
 
-                    pos_bake = self.baker.interpolate(
-                        mesh.v_pos,
-                        rast,
-                        mesh.t_pos_idx,
-                    )
-                    gb_pos = pos_bake[bake_mask]
+        mat_out = {
+            "albedo": decoded["features"],
+            "roughness": decoded["roughness"],
+            "metallic": decoded["metallic"],
+            "normal": normalize(decoded["perturb_normal"]),
+            "bump": None,
+        }
 
-                    tri_query = self.query_triplane(gb_pos, scene_codes[i])[0]
-                    decoded = self.decoder(
-                        tri_query, exclude=["density", "vertex_offset"]
-                    )
+        # Per texel values are kept for the covered texels only, in the order
+        # of bake_mask. They are scattered into textures when encoding
+        for k, v in mat_out.items():
+            if v is None:
+                continue
+            if v.shape[0] == 1:
+                # Skip and directly add a single value
+                mat_out[k] = v[0]
+            elif k == "normal":
+                # Use un-normalized tangents here so that larger smaller tris
+                # Don't effect the tangents that much
+                gb_tng = F.normalize(gb_tng, dim=-1)
+                gb_btng = F.normalize(torch.cross(gb_nrm, gb_tng, dim=-1), dim=-1)
+                normal = F.normalize(mat_out["normal"], dim=-1)
+
+                # Create tangent space matrix and transform normal
+                tangent_matrix = torch.stack([gb_tng, gb_btng, gb_nrm], dim=-1)
+                normal_tangent = torch.bmm(
+                    tangent_matrix.transpose(1, 2), normal.unsqueeze(-1)
+                ).squeeze(-1)
+
+                # Convert from [-1,1] to [0,1] range for storage
+                normal_tangent = (normal_tangent * 0.5 + 0.5).clamp(0, 1)
+
+                mat_out["bump"] = normal_tangent.view(-1, 3)
+            else:
+                mat_out[k] = v.view(-1, v.shape[-1])
+
+        return mat_out, bake_mask
+
+    def export_mesh(
+        self,
+        mesh: Mesh,
+        mat_out: dict[str, Any],
+        bake_mask: Tensor,
+        bake_resolution: int,
+        stage_callback: Optional[Callable[[str], None]] = None,
+        output_format: Literal["trimesh", "glb"] = "trimesh",
+    ) -> Union[trimesh.Trimesh, GLBMesh]:
+        if stage_callback is not None:
+            stage_callback("encode-textures")
+
+        basecolor, bump, metallic, roughness = self._prepare_textures(
+            mat_out, bake_mask, bake_resolution
+        )
+        if output_format == "glb":
+            return self._export_glb(mesh, basecolor, bump, metallic, roughness)
+
+        verts_np = convert_data(mesh.v_pos)
+        faces = convert_data(mesh.t_pos_idx)
+        uvs = convert_data(mesh.v_tex)
+
+        if self.texture_format == "WEBP":
+            raise ValueError('WEBP textures need output_format="glb"')
+        basecolor_tex = Image.fromarray(basecolor).convert("RGB")
+        basecolor_tex.format = self.texture_format
+        if bump is not None:
+            bump_tex = Image.fromarray(bump).convert("RGB")
+            bump_tex.format = self.texture_format
+        else:
+            bump_tex = None
 
-                    nrm = self.baker.interpolate(
-                        mesh.v_nrm,
-                        rast,
-                        mesh.t_pos_idx,
-                    )
-                    gb_nrm = F.normalize(nrm[bake_mask], dim=-1)
-                    decoded["normal"] = gb_nrm
-
-                    # Check if any keys in global_dict start with decoded_
-                    for k, v in global_dict.items():
-                        if k.startswith("decoder_"):
-                            decoded[k.replace("decoder_", "")] = v[i]
-
-                    mat_out = {
-                        "albedo": decoded["features"],
-                        "roughness": decoded["roughness"],
-                        "metallic": decoded["metallic"],
-                        "normal": normalize(decoded["perturb_normal"]),
-                        "bump": None,
-                    }
-
-                    for k, v in mat_out.items():
-                        if v is None:
-                            continue
-                        if v.shape[0] == 1:
-                            # Skip and directly add a single value
-                            mat_out[k] = v[0]
-                        else:
-                            f = torch.zeros(
-                                bake_resolution,
-                                bake_resolution,
-                                v.shape[-1],
-                                dtype=v.dtype,
-                                device=v.device,
-                            )
-                            if v.shape == f.shape:
-                                continue
-                            if k == "normal":
-                                # Use un-normalized tangents here so that larger smaller tris
-                                # Don't effect the tangents that much
-                                tng = self.baker.interpolate(
-                                    mesh.v_tng,
-                                    rast,
-                                    mesh.t_pos_idx,
-                                )
-                                gb_tng = tng[bake_mask]
-                                gb_tng = F.normalize(gb_tng, dim=-1)
-                                gb_btng = F.normalize(
-                                    torch.cross(gb_nrm, gb_tng, dim=-1), dim=-1
-                                )
-                                normal = F.normalize(mat_out["normal"], dim=-1)
-
-                                # Create tangent space matrix and transform normal
-                                tangent_matrix = torch.stack(
-                                    [gb_tng, gb_btng, gb_nrm], dim=-1
-                                )
-                                normal_tangent = torch.bmm(
-                                    tangent_matrix.transpose(1, 2), normal.unsqueeze(-1)
-                                ).squeeze(-1)
-
-                                # Convert from [-1,1] to [0,1] range for storage
-                                normal_tangent = (normal_tangent * 0.5 + 0.5).clamp(
-                                    0, 1
-                                )
-
-                                f[bake_mask] = normal_tangent.view(-1, 3)
-                                mat_out["bump"] = f
-                            else:
-                                f[bake_mask] = v.view(-1, v.shape[-1])
-                                mat_out[k] = f
-
-                    def uv_padding(arr):
-                        if arr.ndim == 1:
-                            return arr
-                        return (
-                            dilate_fill(
-                                arr.permute(2, 0, 1)[None, ...].contiguous(),
-                                bake_mask.unsqueeze(0).unsqueeze(0),
-                                iterations=bake_resolution // 150,
-                            )
-                            .squeeze(0)
-                            .permute(1, 2, 0)
-                            .contiguous()
-                        )
+        material = trimesh.visual.material.PBRMaterial(
+            baseColorTexture=basecolor_tex,
+            roughnessFactor=roughness,
+            metallicFactor=metallic,
+            normalTexture=bump_tex,
+        )
 
-                    verts_np = convert_data(mesh.v_pos)
-                    faces = convert_data(mesh.t_pos_idx)
-                    uvs = convert_data(mesh.v_tex)
-
-                    basecolor_tex = Image.fromarray(
-                        float32_to_uint8_np(convert_data(uv_padding(mat_out["albedo"])))
-                    ).convert("RGB")
-                    basecolor_tex.format = "JPEG"
-
-                    metallic = mat_out["metallic"].squeeze().cpu().item()
-                    roughness = mat_out["roughness"].squeeze().cpu().item()
-
-                    if "bump" in mat_out and mat_out["bump"] is not None:
-                        bump_np = convert_data(uv_padding(mat_out["bump"]))
-                        bump_up = np.ones_like(bump_np)
-                        bump_up[..., :2] = 0.5
-                        bump_up[..., 2:] = 1
-                        bump_tex = Image.fromarray(
-                            float32_to_uint8_np(
-                                bump_np,
-                                dither=True,
-                                # Do not dither if something is perfectly flat
-                                dither_mask=np.all(
-                                    bump_np == bump_up, axis=-1, keepdims=True
-                                ).astype(np.float32),
-                            )
-                        ).convert("RGB")
-                        bump_tex.format = (
-                            "JPEG"  # PNG would be better but the assets are larger
-                        )
+        with profile_stage("build_trimesh"):
+            tmesh = trimesh.Trimesh(
+                vertices=verts_np,
+                faces=faces,
+                visual=trimesh.visual.texture.TextureVisuals(uv=uvs, material=material),
+            )
+            rot = trimesh.transformations.rotation_matrix(np.radians(-90), [1, 0, 0])
+            tmesh.apply_transform(rot)
+            tmesh.apply_transform(
+                trimesh.transformations.rotation_matrix(np.radians(90), [0, 1, 0])
+            )
+
+            tmesh.invert()
+        return tmesh
+
+    def _prepare_textures(
+        self, mat_out: dict[str, Any], bake_mask: Tensor, bake_resolution: int
+    ) -> Tuple[np.ndarray, Optional[np.ndarray], float, float]:
+        # All textures are densified and padded at once, stacked along the
+        # channels. Values are either per covered texel or full textures
+        names = [
+            k
+            for k in ("albedo", "bump")
+            if mat_out.get(k) is not None and mat_out[k].ndim > 1
+        ]
+        padded = dict(mat_out)
+        if len(names) > 0:
+            with profile_stage("dilate_fill"):
+                channels = [mat_out[k].shape[-1] for k in names]
+                stacked = torch.zeros(
+                    1,
+                    sum(channels),
+                    bake_resolution,
+                    bake_resolution,
+                    dtype=mat_out[names[0]].dtype,
+                    device=bake_mask.device,
+                )
+                texels = None
+                start = 0
+                for k, num_channels in zip(names, channels):
+                    v = mat_out[k]
+                    if v.ndim == 3:
+                        stacked[0, start : start + num_channels] = v.permute(2, 0, 1)
                     else:
-                        bump_tex = None
+                        if texels is None:
+                            texels = torch.nonzero(bake_mask.flatten()).squeeze(1)
+                        stacked[0, start : start + num_channels].flatten(1)[
+                            :, texels
+                        ] = v.t().to(stacked.dtype)
+                    start += num_channels
+
+                mask = bake_mask.unsqueeze(0).unsqueeze(0)
+                if self.cfg.texture_padding == "push_pull":
+                    stacked = push_pull_fill(stacked, mask)
+                elif self.cfg.texture_padding == "dilate":
+                    stacked = dilate_fill(
+                        stacked, mask, iterations=bake_resolution // 150
+                    )
+                else:
+                    raise ValueError(
+                        f"Unknown texture padding {self.cfg.texture_padding}, use push_pull or dilate"
+                    )
+                stacked = stacked.squeeze(0).permute(1, 2, 0)
+                for k, v in zip(names, stacked.split(channels, dim=-1)):
+                    padded[k] = v.contiguous()
+
+        with profile_stage("texture_quantize"):
+            basecolor = float32_to_uint8_np(convert_data(padded["albedo"]))
+
+            metallic = mat_out["metallic"].squeeze().cpu().item()
+            roughness = mat_out["roughness"].squeeze().cpu().item()
+
+            if "bump" in mat_out and mat_out["bump"] is not None:
+                bump_np = convert_data(padded["bump"])
+                bump_up = np.ones_like(bump_np)
+                bump_up[..., :2] = 0.5
+                bump_up[..., 2:] = 1
+                bump = float32_to_uint8_np(
+                    bump_np,
+                    dither=True,
+                    # Do not dither if something is perfectly flat
+                    dither_mask=np.all(
+                        bump_np == bump_up, axis=-1, keepdims=True
+                    ).astype(np.float32),
+                )
+            else:
+                bump = None
+        return basecolor, bump, metallic, roughness
+
+    def _export_glb(
+        self,
+        mesh: Mesh,
+        basecolor: np.ndarray,
+        bump: Optional[np.ndarray],
+        metallic: float,
+        roughness: float,
+    ) -> GLBMesh:
+        # Same result as the transforms and the inversion of the trimesh export
+        with profile_stage("texture_encode"):
+            basecolor_tex, bump_tex = encode_textures(
+                [basecolor, bump], self.texture_format, self.texture_quality
+            )
+
+        with profile_stage("build_glb"):
+            rotation = GLB_AXIS_ROTATION.to(mesh.v_pos)
+            verts_np = convert_data(mesh.v_pos @ rotation.T)
+            # Inverting flips the winding and with it the normals
+            normals = convert_data(-mesh.v_nrm @ rotation.T)
+            faces = convert_data(mesh.t_pos_idx.flip(-1).to(torch.int32))
+            uvs = mesh.v_tex.clone()
+            # glTF has the UV origin at the top left
+            uvs[:, 1] = 1.0 - uvs[:, 1]
+
+            buffer = io.BytesIO()
+            write_glb(
+                buffer,
+                verts_np,
+                faces,
+                uvs=convert_data(uvs),
+                normals=normals,
+                base_color_texture=basecolor_tex,
+                normal_texture=bump_tex,
+                metallic_factor=metallic,
+                roughness_factor=roughness,
+            )
+        return GLBMesh(buffer.getvalue(), verts_np, faces)
 
-                    material = trimesh.visual.material.PBRMaterial(
-                        baseColorTexture=basecolor_tex,
-                        roughnessFactor=roughness,
-                        metallicFactor=metallic,
-                        normalTexture=bump_tex,
+    def generate_mesh(
+        self,
+        batch,
+        bake_resolution: int,
+        remesh: Literal["none", "triangle", "quad"] = "none",
+        vertex_count: int = -1,
+        estimate_illumination: bool = False,
+        stage_callback: Optional[Callable[[str], None]] = None,
+        profile: bool = False,
+        point_budget: Optional[int] = None,
+        output_format: Literal["trimesh", "glb"] = "trimesh",
+    ) -> Tuple[List[trimesh.Trimesh], dict[str, Any]]:
+        with self._profiling(profile) as profiler:
+            meshes, global_dict = self._generate_mesh(
+                batch,
+                bake_resolution,
+                remesh,
+                vertex_count,
+                estimate_illumination,
+                stage_callback,
+                point_budget,
+                output_format,
+            )
+        if profile:
+            global_dict["profile"] = profiler.to_dict()
+        return meshes, global_dict
+
+    def _generate_mesh(
+        self,
+        batch,
+        bake_resolution: int,
+        remesh: Literal["none", "triangle", "quad"],
+        vertex_count: int,
+        estimate_illumination: bool,
+        stage_callback: Optional[Callable[[str], None]],
+        point_budget: Optional[int] = None,
+        output_format: Literal["trimesh", "glb"] = "trimesh",
+    ) -> Tuple[List[trimesh.Trimesh], dict[str, Any]]:
+        scene_codes, non_postprocessed_codes, global_dict = self.encode(
+            batch, estimate_illumination, stage_callback=stage_callback
+        )
+
+        device = get_device()
+        with torch.no_grad():
+            with torch.autocast(
+                device_type=device, enabled=False
+            ) if "cuda" in device else nullcontext():
+                # Notify about stage changes. Everything after the isosurface
+                # extraction is reported once per mesh
+                if stage_callback is not None:
+                    stage_callback("isosurface")
+                with profile_stage("triplane_to_meshes"):
+                    meshes = self.triplane_to_meshes(
+                        scene_codes, point_budget=point_budget
                     )
 
-                    tmesh = trimesh.Trimesh(
-                        vertices=verts_np,
-                        faces=faces,
-                        visual=trimesh.visual.texture.TextureVisuals(
-                            uv=uvs, material=material
-                        ),
+                rets = []
+                for i, mesh in enumerate(meshes):
+                    # Check for empty mesh
+                    if mesh.v_pos.shape[0] == 0:
+                        rets.append(
+                            GLBMesh.empty()
+                            if output_format == "glb"
+                            else trimesh.Trimesh()
+                        )
+                        continue
+
+                    mesh = self.postprocess_mesh(
+                        mesh, remesh, vertex_count, stage_callback=stage_callback
                     )
-                    rot = trimesh.transformations.rotation_matrix(
-                        np.radians(-90), [1, 0, 0]
+                    mat_out, bake_mask = self.bake_mesh(
+                        mesh,
+                        scene_codes[i],
+                        global_dict,
+                        i,
+                        bake_resolution,
+                        stage_callback=stage_callback,
+                        point_budget=point_budget,
                     )
-                    tmesh.apply_transform(rot)
-                    tmesh.apply_transform(
-                        trimesh.transformations.rotation_matrix(
-                            np.radians(90), [0, 1, 0]
+                    rets.append(
+                        self.export_mesh(
+                            mesh,
+                            mat_out,
+                            bake_mask,
+                            bake_resolution,
+                            stage_callback=stage_callback,
+                            output_format=output_format,
                         )
                     )
 
-                    tmesh.invert()
-
-                    rets.append(tmesh)
-
         return rets, global_dict
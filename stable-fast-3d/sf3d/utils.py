@@ -1,5 +1,5 @@
 import os
-from typing import Any, Union
+from typing import Any, Optional, Union
 
 import numpy as np
 import rembg
@@ -22,6 +22,38 @@ def get_device():
     return device
 
 
+def get_available_memory(device: Union[str, torch.device]) -> Optional[int]:
+    """Bytes that can still be allocated on the device, None if unknown."""
+    device = torch.device(device)
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(device)
+        # Memory cached by the allocator can be reused without a new allocation
+        cached = torch.cuda.memory_reserved(device) - torch.cuda.memory_allocated(
+            device
+        )
+        return free + cached
+    if device.type == "mps":
+        try:
+            return (
+                torch.mps.recommended_max_memory() - torch.mps.driver_allocated_memory()
+            )
+        except (AttributeError, RuntimeError):
+            return None
+    if device.type == "cpu":
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        try:
+            return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, ValueError, OSError):
+            return None
+    return None
+
+
 def create_intrinsic_from_fov_deg(fov_deg: float, cond_height: int, cond_width: int):
     intrinsic = sf3d_utils.get_intrinsic_from_fov(
         np.deg2rad(fov_deg),
@@ -0,0 +1,117 @@
+import pytest
+import torch
+
+try:
+    from texture_baker import TextureBaker
+except ImportError:
+    # Also raised for the in-tree sources when the extension is not built
+    pytest.skip("texture_baker is not built", allow_module_level=True)
+
+
+def random_atlas(num_faces: int, seed: int):
+    """Unconnected triangles of random size, overlapping each other."""
+    generator = torch.Generator().manual_seed(seed)
+    centers = torch.rand(num_faces, 1, 2, generator=generator)
+    sizes = torch.rand(num_faces, 1, 1, generator=generator) * 0.2
+    offsets = torch.rand(num_faces, 3, 2, generator=generator) - 0.5
+    uv = (centers + offsets * sizes).reshape(-1, 2)
+    faces = torch.arange(num_faces * 3).reshape(-1, 3)
+    return uv.float(), faces
+
+
+def grid_atlas(quads: int, seed: int, extent=(1.0, 1.0)):
+    """Jittered triangulated grid scaled to extent of the UV square."""
+    generator = torch.Generator().manual_seed(seed)
+    n = quads + 1
+    coords = torch.linspace(0.02, 0.98, n)
+    uv = torch.stack(torch.meshgrid(coords, coords, indexing="ij"), -1).reshape(-1, 2)
+    uv = uv + (torch.rand(uv.shape, generator=generator) - 0.5) * (0.3 / quads)
+    uv = uv * torch.tensor(extent)
+
+    i, j = torch.meshgrid(torch.arange(quads), torch.arange(quads), indexing="ij")
+    v00 = (i * n + j).reshape(-1)
+    v10 = v00 + n
+    faces = torch.cat(
+        [
+            torch.stack([v00, v10, v10 + 1], -1),
+            torch.stack([v00, v10 + 1, v00 + 1], -1),
+        ],
+        0,
+    )
+    return uv.float(), faces
+
+
+def sparse_atlas(seed: int):
+    """A few small islands with most of the map left empty."""
+    generator = torch.Generator().manual_seed(seed)
+    uvs, faces = [], []
+    for island in range(5):
+        uv, face = grid_atlas(4, seed + island)
+        corner = torch.rand(1, 2, generator=generator) * 0.9
+        uvs.append(uv * 0.08 + corner)
+        faces.append(face + sum(len(u) for u in uvs[:-1]))
+    return torch.cat(uvs), torch.cat(faces)
+
+
+def degenerate_atlas(seed: int):
+    """Valid triangles mixed with zero area, collinear and out of range ones."""
+    uv, faces = random_atlas(64, seed)
+    num_vertices = len(uv)
+    degenerate_uv = torch.tensor(
+        [
+            # All corners on the same point
+            [0.5, 0.5],
+            [0.5, 0.5],
+            [0.5, 0.5],
+            # Collinear
+            [0.1, 0.1],
+            [0.3, 0.3],
+            [0.6, 0.6],
+            # Partly outside of the UV square
+            [-0.2, 0.4],
+            [0.3, 1.3],
+            [0.5, 0.2],
+        ]
+    )
+    degenerate_faces = torch.arange(9).reshape(-1, 3) + num_vertices
+    # A face repeating a vertex
+    degenerate_faces = torch.cat([degenerate_faces, torch.tensor([[0, 0, 1]])], 0)
+    return torch.cat([uv, degenerate_uv]), torch.cat([faces, degenerate_faces])
+
+
+ATLASES = {
+    "random": lambda: random_atlas(500, seed=0),
+    "random_dense": lambda: random_atlas(5000, seed=1),
+    "grid": lambda: grid_atlas(32, seed=2),
+    "sparse": lambda: sparse_atlas(seed=3),
+    "degenerate": lambda: degenerate_atlas(seed=4),
+    "wide": lambda: grid_atlas(16, seed=5, extent=(1.0, 0.25)),
+    "tall": lambda: grid_atlas(16, seed=6, extent=(0.1, 1.0)),
+}
+
+
+@pytest.mark.parametrize("atlas", list(ATLASES.keys()))
+# Tile multiples and sizes that leave partial tiles at the border
+@pytest.mark.parametrize("resolution", [1, 17, 64, 100, 257])
+def test_tile_matches_bvh(atlas, resolution):
+    uv, faces = ATLASES[atlas]()
+    baker = TextureBaker()
+    reference = baker.rasterize(uv, faces, resolution, method="bvh")
+    rast = baker.rasterize(uv, faces, resolution, method="tile")
+    assert rast.shape == (resolution, resolution, 4)
+    # Bit for bit, including the barycentrics and the -1 of empty texels
+    assert torch.equal(reference.view(torch.int32), rast.view(torch.int32))
+
+
+def test_auto_uses_tile_on_cpu():
+    uv, faces = random_atlas(100, seed=7)
+    baker = TextureBaker()
+    reference = baker.rasterize(uv, faces, 64, method="tile")
+    rast = baker.rasterize(uv, faces, 64)
+    assert torch.equal(reference.view(torch.int32), rast.view(torch.int32))
+
+
+def test_unknown_method():
+    uv, faces = random_atlas(10, seed=8)
+    with pytest.raises(ValueError):
+        TextureBaker().rasterize(uv, faces, 16, method="scanline")
@@ -1,5 +1,8 @@
+from typing import List, Sequence, Tuple, Union
+
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch import Tensor
 
 
@@ -12,6 +15,7 @@ class TextureBaker(nn.Module):
         uv: Tensor,
         face_indices: Tensor,
         bake_resolution: int,
+        method: str = "auto",
     ) -> Tensor:
         """
         Rasterize the UV coordinates to a barycentric coordinates
@@ -21,10 +25,23 @@ class TextureBaker(nn.Module):
             uv (Tensor, num_vertices 2, float): UV coordinates of the mesh
             face_indices (Tensor, num_faces 3, int): Face indices of the mesh
             bake_resolution (int): Resolution of the bake
+            method (str): "bvh" queries a BVH of the triangles for every texel.
+                "tile" only visits the texels near the triangles and is CPU only.
+                Both give identical maps. "auto" uses "tile" on the CPU
 
         Returns:
             Tensor, bake_resolution bake_resolution 4, float: Rasterized map
         """
+        if method == "auto":
+            method = "tile" if uv.device.type == "cpu" else "bvh"
+        if method == "tile":
+            if uv.device.type != "cpu":
+                raise ValueError("The tile rasterizer only runs on the CPU")
+            return torch.ops.texture_baker_cpp.rasterize_tiled(
+                uv, face_indices.to(torch.int32), bake_resolution
+            )
+        if method != "bvh":
+            raise ValueError(f"Unknown rasterization method {method}, use bvh or tile")
         return torch.ops.texture_baker_cpp.rasterize(
             uv, face_indices.to(torch.int32), bake_resolution
         )
@@ -43,25 +60,67 @@ class TextureBaker(nn.Module):
 
     def interpolate(
         self,
-        attr: Tensor,
+        attr: Union[Tensor, Sequence[Tensor]],
         rast: Tensor,
         face_indices: Tensor,
-    ) -> Tensor:
+        compact: bool = False,
+    ) -> Union[
+        Tensor, List[Tensor], Tuple[Tensor, Tensor], Tuple[List[Tensor], Tensor]
+    ]:
         """
         Interpolate the attributes using the rasterized map
 
         Args:
-            attr (Tensor, num_vertices 3, float): Attributes of the mesh
+            attr (Tensor, num_vertices C, float32/float16/bfloat16): Attributes of the mesh.
+                A list of attributes is interpolated in a single pass over the
+                rasterized map, and a list is returned in place of the tensor
             rast (Tensor, bake_resolution bake_resolution 4, float): Rasterized map
             face_indices (Tensor, num_faces 3, int): Face indices of the mesh
-            uv (Tensor, num_vertices 2, float): UV coordinates of the mesh
+            compact (bool): Only return the covered texels
 
         Returns:
-            Tensor, bake_resolution bake_resolution 3, float: Interpolated attributes
+            Tensor, bake_resolution bake_resolution C: Interpolated attributes, zero
+                where no triangle covers the texel
+            With compact, a tuple of:
+                Tensor, num_covered C: Interpolated attributes of the covered texels
+                Tensor, num_covered, long: Flat indices of the covered texels
         """
-        return torch.ops.texture_baker_cpp.interpolate(
-            attr, face_indices.to(torch.int32), rast
-        )
+        if not isinstance(attr, Tensor):
+            channels = [a.shape[-1] for a in attr]
+            interpolated = self.interpolate(
+                torch.cat(list(attr), dim=-1), rast, face_indices, compact
+            )
+            values = interpolated[0] if compact else interpolated
+            values = [
+                v.to(a.dtype).contiguous()
+                for v, a in zip(values.split(channels, dim=-1), attr)
+            ]
+            return (values, interpolated[1]) if compact else values
+
+        face_indices = face_indices.to(torch.int32)
+        if attr.device.type == "cpu":
+            if compact:
+                return torch.ops.texture_baker_cpp.interpolate_compact(
+                    attr, face_indices, rast
+                )
+            return torch.ops.texture_baker_cpp.interpolate(attr, face_indices, rast)
+
+        # The GPU kernels interpolate 3 float channels at a time
+        channels = attr.shape[-1]
+        padded = F.pad(attr.float(), (0, -channels % 3))
+        interpolated = torch.cat(
+            [
+                torch.ops.texture_baker_cpp.interpolate(
+                    chunk.contiguous(), face_indices, rast
+                )
+                for chunk in padded.split(3, dim=-1)
+            ],
+            dim=-1,
+        )[..., :channels].to(attr.dtype)
+        if not compact:
+            return interpolated
+        texels = torch.nonzero(self.get_mask(rast).flatten()).squeeze(1)
+        return interpolated.flatten(0, 1)[texels], texels
 
     def forward(
         self,
@@ -74,13 +133,13 @@ class TextureBaker(nn.Module):
         Bake the texture
 
         Args:
-            attr (Tensor, num_vertices 3, float): Attributes of the mesh
+            attr (Tensor, num_vertices C, float): Attributes of the mesh
             uv (Tensor, num_vertices 2, float): UV coordinates of the mesh
             face_indices (Tensor, num_faces 3, int): Face indices of the mesh
             bake_resolution (int): Resolution of the bake
 
         Returns:
-            Tensor, bake_resolution bake_resolution 3, float: Baked texture
+            Tensor, bake_resolution bake_resolution C, float: Baked texture
         """
         rast = self.rasterize(uv, face_indices, bake_resolution)
-        return self.interpolate(attr, rast, face_indices, uv)
+        return self.interpolate(attr, rast, face_indices)
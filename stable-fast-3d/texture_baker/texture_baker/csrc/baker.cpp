@@ -1,7 +1,10 @@
 #include <ATen/ATen.h>
 #include <ATen/Context.h>
+#include <algorithm>
 #include <chrono>
 #include <cmath>
+#include <cstdlib>
+#include <string>
 #include <omp.h>
 #include <torch/extension.h>
 #ifndef __ARM_ARCH_ISA_A64
@@ -12,6 +15,8 @@
 
 // #define TIMING
 #define BINS 8
+// Edge length in texels of the tiles of the tiled rasterizer
+#define RASTER_TILE_SIZE 32
 
 namespace texture_baker_cpp {
 // Calculate the centroid of a triangle
@@ -368,6 +373,14 @@ bool barycentric_coordinates(tb_float2 xy, tb_float2 v1, tb_float2 v2,
   return (v >= 0.0f) && (w >= 0.0f) && (v + w <= 1.0f);
 }
 
+// UV coordinate of the texel in row x and column y
+tb_float2 texel_coord(int x, int y, int width, int height) {
+  tb_float2 pixel_coord = {float(y) / height, float(x) / width};
+  pixel_coord.x = clamp(pixel_coord.x, 0.0f, 1.0f);
+  pixel_coord.y = 1.0f - clamp(pixel_coord.y, 0.0f, 1.0f);
+  return pixel_coord;
+}
+
 bool BVH::intersect(const tb_float2 &point, float &u, float &v, float &w,
                     int &index) const {
   const int max_stack_size = 64;
@@ -437,9 +450,7 @@ torch::Tensor rasterize_cpu(torch::Tensor uv, torch::Tensor indices,
     int y = idx % height;
     int idx_ = idx * 4; // Note: *4 because we're storing float4 per pixel
 
-    tb_float2 pixel_coord = {float(y) / height, float(x) / width};
-    pixel_coord.x = clamp(pixel_coord.x, 0.0f, 1.0f);
-    pixel_coord.y = 1.0f - clamp(pixel_coord.y, 0.0f, 1.0f);
+    tb_float2 pixel_coord = texel_coord(x, y, width, height);
 
     float u, v, w;
     int triangle_idx;
@@ -464,70 +475,416 @@ torch::Tensor rasterize_cpu(torch::Tensor uv, torch::Tensor indices,
   return rast_result;
 }
 
-torch::Tensor interpolate_cpu(torch::Tensor attr, torch::Tensor indices,
-                              torch::Tensor rast) {
+// Conservative range [lo, hi] of the texels i with i / size in [min, max]
+void texel_range(float min, float max, int size, int &lo, int &hi) {
+  lo = std::max(0, (int)std::floor(clamp(min * size, 0.0f, size)) - 1);
+  hi = std::min(size - 1, (int)std::ceil(clamp(max * size, 0.0f, size)) + 1);
+}
+
+struct LeafRange {
+  int node;
+  // Rows and columns of the texels the leaf can cover
+  int x0, x1, y0, y1;
+};
+
+// Rasterizes the leaves of the BVH instead of querying the BVH per texel. The
+// depth first query visits the leaves in the order of their triangle ranges
+// and returns the first triangle containing the texel in the first leaf whose
+// bounding box contains it. Resolving every texel by that same order gives a
+// result identical to rasterize_cpu, while only the texels inside the bounding
+// box of a leaf are visited. The leaves are binned into tiles of texels, which
+// are rasterized in parallel, so no two threads write the same texel.
+torch::Tensor rasterize_tiled_cpu(torch::Tensor uv, torch::Tensor indices,
+                                  int64_t bake_resolution) {
+  int width = bake_resolution;
+  int height = bake_resolution;
+  int num_pixels = width * height;
+  torch::Tensor rast_result = torch::empty(
+      {bake_resolution, bake_resolution, 4},
+      torch::TensorOptions().dtype(torch::kFloat32).device(torch::kCPU));
+
+  float *rast_result_ptr = rast_result.data_ptr<float>();
+  const tb_float2 *vertices = (tb_float2 *)uv.data_ptr<float>();
+  const tb_int3 *tris = (tb_int3 *)indices.data_ptr<int>();
+
+#pragma omp parallel for
+  for (int idx = 0; idx < num_pixels; ++idx) {
+    rast_result_ptr[idx * 4 + 0] = 0.0f;
+    rast_result_ptr[idx * 4 + 1] = 0.0f;
+    rast_result_ptr[idx * 4 + 2] = 0.0f;
+    rast_result_ptr[idx * 4 + 3] = -1.0f;
+  }
+
+  BVH bvh;
+  bvh.build(vertices, tris, indices.size(0));
+
 #ifdef TIMING
   auto start = std::chrono::high_resolution_clock::now();
 #endif
-  int height = rast.size(0);
-  int width = rast.size(1);
-  torch::Tensor pos_bake = torch::empty(
-      {height, width, 3},
-      torch::TensorOptions().dtype(torch::kFloat32).device(torch::kCPU));
 
-  const float *attr_ptr = attr.contiguous().data_ptr<float>();
-  const int *indices_ptr = indices.contiguous().data_ptr<int>();
-  const float *rast_ptr = rast.contiguous().data_ptr<float>();
-  float *output_ptr = pos_bake.contiguous().data_ptr<float>();
+  // Leaves in query order
+  std::vector<LeafRange> leaves;
+  for (int node_idx = 0; node_idx < (int)bvh.nodes.size(); ++node_idx) {
+    const BVHNode &node = bvh.nodes[node_idx];
+    if (!node.is_leaf() || node.num_triangles() == 0) {
+      continue;
+    }
+    LeafRange leaf = {node_idx, 0, width - 1, 0, height - 1};
+    // The bounding box of the root is never checked
+    if (node_idx != bvh.root) {
+      texel_range(1.0f - node.bbox.max.y, 1.0f - node.bbox.min.y, width,
+                  leaf.x0, leaf.x1);
+      texel_range(node.bbox.min.x, node.bbox.max.x, height, leaf.y0, leaf.y1);
+    }
+    if (leaf.x0 <= leaf.x1 && leaf.y0 <= leaf.y1) {
+      leaves.push_back(leaf);
+    }
+  }
+  std::sort(leaves.begin(), leaves.end(),
+            [&bvh](const LeafRange &a, const LeafRange &b) {
+              return bvh.nodes[a.node].start < bvh.nodes[b.node].start;
+            });
+
+  // Bin the leaves into the tiles they overlap, keeping the query order
+  const int tile_size = RASTER_TILE_SIZE;
+  int tiles_x = (width + tile_size - 1) / tile_size;
+  int tiles_y = (height + tile_size - 1) / tile_size;
+  std::vector<int64_t> tile_offsets((int64_t)tiles_x * tiles_y + 1, 0);
+  for (const LeafRange &leaf : leaves) {
+    for (int tx = leaf.x0 / tile_size; tx <= leaf.x1 / tile_size; ++tx) {
+      for (int ty = leaf.y0 / tile_size; ty <= leaf.y1 / tile_size; ++ty) {
+        tile_offsets[(int64_t)tx * tiles_y + ty + 1]++;
+      }
+    }
+  }
+  for (size_t i = 1; i < tile_offsets.size(); ++i) {
+    tile_offsets[i] += tile_offsets[i - 1];
+  }
+  std::vector<int> tile_leaves(tile_offsets.back());
+  std::vector<int64_t> tile_fill(tile_offsets.begin(), tile_offsets.end() - 1);
+  for (int i = 0; i < (int)leaves.size(); ++i) {
+    const LeafRange &leaf = leaves[i];
+    for (int tx = leaf.x0 / tile_size; tx <= leaf.x1 / tile_size; ++tx) {
+      for (int ty = leaf.y0 / tile_size; ty <= leaf.y1 / tile_size; ++ty) {
+        tile_leaves[tile_fill[(int64_t)tx * tiles_y + ty]++] = i;
+      }
+    }
+  }
+
+  int num_tiles = tiles_x * tiles_y;
+#pragma omp parallel for schedule(dynamic)
+  for (int tile = 0; tile < num_tiles; ++tile) {
+    int tile_x0 = (tile / tiles_y) * tile_size;
+    int tile_y0 = (tile % tiles_y) * tile_size;
+    int tile_x1 = std::min(tile_x0 + tile_size, width) - 1;
+    int tile_y1 = std::min(tile_y0 + tile_size, height) - 1;
+
+    for (int64_t k = tile_offsets[tile]; k < tile_offsets[tile + 1]; ++k) {
+      const LeafRange &leaf = leaves[tile_leaves[k]];
+      const BVHNode &node = bvh.nodes[leaf.node];
+      bool check_bbox = leaf.node != bvh.root;
+      for (int x = std::max(leaf.x0, tile_x0); x <= std::min(leaf.x1, tile_x1);
+           ++x) {
+        for (int y = std::max(leaf.y0, tile_y0);
+             y <= std::min(leaf.y1, tile_y1); ++y) {
+          float *texel = rast_result_ptr + ((int64_t)x * height + y) * 4;
+          // Already covered by an earlier leaf
+          if (texel[3] >= 0.0f) {
+            continue;
+          }
+          tb_float2 pixel_coord = texel_coord(x, y, width, height);
+          if (check_bbox && !node.bbox.overlaps(pixel_coord)) {
+            continue;
+          }
+          float u, v, w;
+          for (int i = node.start; i < node.end; ++i) {
+            const Triangle &tri = bvh.triangles[bvh.triangle_indices[i]];
+            if (barycentric_coordinates(pixel_coord, tri.v0, tri.v1, tri.v2, u,
+                                        v, w)) {
+              texel[0] = u;
+              texel[1] = v;
+              texel[2] = w;
+              texel[3] = static_cast<float>(tri.index);
+              break;
+            }
+          }
+        }
+      }
+    }
+  }
 
-  int num_pixels = width * height;
+#ifdef TIMING
+  auto end = std::chrono::high_resolution_clock::now();
+  std::chrono::duration<double> elapsed = end - start;
+  std::cout << "Tiled rasterization time: " << elapsed.count() << "s"
+            << std::endl;
+#endif
+  return rast_result;
+}
+
+#if !defined(__ARM_ARCH_ISA_A64) && !defined(_MSC_VER)
+#define TB_X86_SIMD
+#endif
+
+enum class SimdLevel { Scalar, AVX2, AVX512 };
+
+// The widest instruction set supported by the CPU. TEXTURE_BAKER_SIMD=scalar,
+// avx2 or avx512 caps it, e.g. to compare against the scalar path
+SimdLevel simd_level() {
+  static const SimdLevel level = [] {
+    const char *env = std::getenv("TEXTURE_BAKER_SIMD");
+    std::string cap = env != nullptr ? env : "avx512";
+    if (cap == "scalar")
+      return SimdLevel::Scalar;
+#ifdef TB_X86_SIMD
+    if (cap == "avx512" && __builtin_cpu_supports("avx512f"))
+      return SimdLevel::AVX512;
+    if (__builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma"))
+      return SimdLevel::AVX2;
+#endif
+    return SimdLevel::Scalar;
+  }();
+  return level;
+}
+
+// Interpolates the attributes of the covered texels. texels holds the flat
+// indices of the covered texels in the rasterized map. Texel i is written to
+// row texels[i] of the output if dense, otherwise to row i
+struct InterpolateArgs {
+  const float *attr;
+  int channels;
+  const int *indices;
+  const float *rast;
+  const int *texels;
+  float *output;
+  bool dense;
+
+  int64_t output_row(int64_t i) const { return dense ? texels[i] : i; }
+};
+
+// CHANNELS > 0 fixes the number of channels at compile time
+template <int CHANNELS>
+void interpolate_texel_scalar(const InterpolateArgs &a, int64_t i) {
+  const int channels = CHANNELS > 0 ? CHANNELS : a.channels;
+  const float *rast = a.rast + 4 * (int64_t)a.texels[i];
+  const int *triangle = a.indices + 3 * (int64_t)rast[3];
+  const float *v1 = a.attr + (int64_t)triangle[0] * channels;
+  const float *v2 = a.attr + (int64_t)triangle[1] * channels;
+  const float *v3 = a.attr + (int64_t)triangle[2] * channels;
+  float *out = a.output + a.output_row(i) * channels;
+  for (int c = 0; c < channels; ++c) {
+    out[c] = v1[c] * rast[0] + v2[c] * rast[1] + v3[c] * rast[2];
+  }
+}
+
+void interpolate_texel_scalar(const InterpolateArgs &a, int64_t i) {
+  // Positions and normals are the common case
+  if (a.channels == 3) {
+    interpolate_texel_scalar<3>(a, i);
+  } else {
+    interpolate_texel_scalar<0>(a, i);
+  }
+}
+
+#ifdef TB_X86_SIMD
+// Interpolates 8 texels at once. Each channel is gathered from the three
+// vertices of the 8 triangles
+__attribute__((target("avx2,fma"))) void
+interpolate_block_avx2(const InterpolateArgs &a, int64_t start) {
+  __m256i texel = _mm256_loadu_si256((const __m256i *)(a.texels + start));
+  __m256i rast_offset = _mm256_slli_epi32(texel, 2);
+  __m256 u = _mm256_i32gather_ps(a.rast + 0, rast_offset, 4);
+  __m256 v = _mm256_i32gather_ps(a.rast + 1, rast_offset, 4);
+  __m256 w = _mm256_i32gather_ps(a.rast + 2, rast_offset, 4);
+  __m256i triangle =
+      _mm256_cvttps_epi32(_mm256_i32gather_ps(a.rast + 3, rast_offset, 4));
+  __m256i index_offset =
+      _mm256_add_epi32(_mm256_slli_epi32(triangle, 1), triangle);
+  __m256i channels = _mm256_set1_epi32(a.channels);
+  __m256i v1 = _mm256_mullo_epi32(
+      _mm256_i32gather_epi32(a.indices + 0, index_offset, 4), channels);
+  __m256i v2 = _mm256_mullo_epi32(
+      _mm256_i32gather_epi32(a.indices + 1, index_offset, 4), channels);
+  __m256i v3 = _mm256_mullo_epi32(
+      _mm256_i32gather_epi32(a.indices + 2, index_offset, 4), channels);
+
+  float *rows[8];
+  for (int lane = 0; lane < 8; ++lane) {
+    rows[lane] = a.output + a.output_row(start + lane) * a.channels;
+  }
+  alignas(32) float result[8];
+  for (int c = 0; c < a.channels; ++c) {
+    __m256 value = _mm256_mul_ps(_mm256_i32gather_ps(a.attr + c, v3, 4), w);
+    value = _mm256_fmadd_ps(_mm256_i32gather_ps(a.attr + c, v2, 4), v, value);
+    value = _mm256_fmadd_ps(_mm256_i32gather_ps(a.attr + c, v1, 4), u, value);
+    _mm256_store_ps(result, value);
+    for (int lane = 0; lane < 8; ++lane) {
+      rows[lane][c] = result[lane];
+    }
+  }
+}
+
+// Same as interpolate_block_avx2 for 16 texels
+__attribute__((target("avx512f"))) void
+interpolate_block_avx512(const InterpolateArgs &a, int64_t start) {
+  __m512i texel = _mm512_loadu_si512((const void *)(a.texels + start));
+  __m512i rast_offset = _mm512_slli_epi32(texel, 2);
+  __m512 u = _mm512_i32gather_ps(rast_offset, a.rast + 0, 4);
+  __m512 v = _mm512_i32gather_ps(rast_offset, a.rast + 1, 4);
+  __m512 w = _mm512_i32gather_ps(rast_offset, a.rast + 2, 4);
+  __m512i triangle =
+      _mm512_cvttps_epi32(_mm512_i32gather_ps(rast_offset, a.rast + 3, 4));
+  __m512i index_offset =
+      _mm512_add_epi32(_mm512_slli_epi32(triangle, 1), triangle);
+  __m512i channels = _mm512_set1_epi32(a.channels);
+  __m512i v1 = _mm512_mullo_epi32(
+      _mm512_i32gather_epi32(index_offset, a.indices + 0, 4), channels);
+  __m512i v2 = _mm512_mullo_epi32(
+      _mm512_i32gather_epi32(index_offset, a.indices + 1, 4), channels);
+  __m512i v3 = _mm512_mullo_epi32(
+      _mm512_i32gather_epi32(index_offset, a.indices + 2, 4), channels);
+
+  float *rows[16];
+  for (int lane = 0; lane < 16; ++lane) {
+    rows[lane] = a.output + a.output_row(start + lane) * a.channels;
+  }
+  alignas(64) float result[16];
+  for (int c = 0; c < a.channels; ++c) {
+    __m512 value = _mm512_mul_ps(_mm512_i32gather_ps(v3, a.attr + c, 4), w);
+    value = _mm512_fmadd_ps(_mm512_i32gather_ps(v2, a.attr + c, 4), v, value);
+    value = _mm512_fmadd_ps(_mm512_i32gather_ps(v1, a.attr + c, 4), u, value);
+    _mm512_store_ps(result, value);
+    for (int lane = 0; lane < 16; ++lane) {
+      rows[lane][c] = result[lane];
+    }
+  }
+}
+#endif
+
+void interpolate_texels(const InterpolateArgs &a, int64_t num_texels) {
+  SimdLevel level = simd_level();
+  int64_t width = level == SimdLevel::AVX512 ? 16
+                  : level == SimdLevel::AVX2 ? 8
+                                             : 1;
+  int64_t num_blocks = num_texels / width;
 
 #pragma omp parallel for
-  for (int idx = 0; idx < num_pixels; ++idx) {
-    int idx_ = idx * 4; // Index into the float4 array (4 floats per pixel)
-    tb_float3 barycentric = {
-        rast_ptr[idx_ + 0],
-        rast_ptr[idx_ + 1],
-        rast_ptr[idx_ + 2],
-    };
-    int triangle_idx = static_cast<int>(rast_ptr[idx_ + 3]);
-
-    if (triangle_idx < 0) {
-      output_ptr[idx * 3 + 0] = 0.0f;
-      output_ptr[idx * 3 + 1] = 0.0f;
-      output_ptr[idx * 3 + 2] = 0.0f;
+  for (int64_t block = 0; block < num_blocks; ++block) {
+#ifdef TB_X86_SIMD
+    if (level == SimdLevel::AVX512) {
+      interpolate_block_avx512(a, block * width);
       continue;
     }
+    if (level == SimdLevel::AVX2) {
+      interpolate_block_avx2(a, block * width);
+      continue;
+    }
+#endif
+    interpolate_texel_scalar(a, block);
+  }
+  for (int64_t i = num_blocks * width; i < num_texels; ++i) {
+    interpolate_texel_scalar(a, i);
+  }
+}
+
+// Flat indices of the texels covered by a triangle, in order. Each row is
+// counted first, so the rows can be compacted in parallel
+torch::Tensor covered_texels(const torch::Tensor &rast) {
+  int64_t height = rast.size(0);
+  int64_t width = rast.size(1);
+  const float *rast_ptr = rast.data_ptr<float>();
+
+  std::vector<int64_t> row_offsets(height + 1, 0);
+#pragma omp parallel for
+  for (int64_t y = 0; y < height; ++y) {
+    const float *row = rast_ptr + y * width * 4;
+    int64_t count = 0;
+    for (int64_t x = 0; x < width; ++x) {
+      count += row[4 * x + 3] >= 0.0f;
+    }
+    row_offsets[y + 1] = count;
+  }
+  for (int64_t y = 0; y < height; ++y) {
+    row_offsets[y + 1] += row_offsets[y];
+  }
 
-    tb_int3 triangle = {indices_ptr[3 * triangle_idx + 0],
-                        indices_ptr[3 * triangle_idx + 1],
-                        indices_ptr[3 * triangle_idx + 2]};
-    tb_float3 v1 = {attr_ptr[3 * triangle.x + 0], attr_ptr[3 * triangle.x + 1],
-                    attr_ptr[3 * triangle.x + 2]};
-    tb_float3 v2 = {attr_ptr[3 * triangle.y + 0], attr_ptr[3 * triangle.y + 1],
-                    attr_ptr[3 * triangle.y + 2]};
-    tb_float3 v3 = {attr_ptr[3 * triangle.z + 0], attr_ptr[3 * triangle.z + 1],
-                    attr_ptr[3 * triangle.z + 2]};
-
-    tb_float3 interpolated;
-    interpolated.x =
-        v1.x * barycentric.x + v2.x * barycentric.y + v3.x * barycentric.z;
-    interpolated.y =
-        v1.y * barycentric.x + v2.y * barycentric.y + v3.y * barycentric.z;
-    interpolated.z =
-        v1.z * barycentric.x + v2.z * barycentric.y + v3.z * barycentric.z;
-
-    output_ptr[idx * 3 + 0] = interpolated.x;
-    output_ptr[idx * 3 + 1] = interpolated.y;
-    output_ptr[idx * 3 + 2] = interpolated.z;
+  torch::Tensor texels = torch::empty(
+      {row_offsets[height]},
+      torch::TensorOptions().dtype(torch::kInt32).device(torch::kCPU));
+  int *texels_ptr = texels.data_ptr<int>();
+#pragma omp parallel for
+  for (int64_t y = 0; y < height; ++y) {
+    const float *row = rast_ptr + y * width * 4;
+    int *out = texels_ptr + row_offsets[y];
+    for (int64_t x = 0; x < width; ++x) {
+      if (row[4 * x + 3] >= 0.0f) {
+        *out++ = static_cast<int>(y * width + x);
+      }
+    }
   }
+  return texels;
+}
+
+torch::Tensor interpolate_into(const torch::Tensor &attr,
+                               const torch::Tensor &indices,
+                               const torch::Tensor &rast,
+                               const torch::Tensor &texels,
+                               torch::Tensor output, bool dense) {
+  TORCH_CHECK(attr.dim() == 2, "attr must have the shape [num_vertices, C]");
+  TORCH_CHECK(attr.numel() < std::numeric_limits<int>::max(),
+              "attr is too large");
+  TORCH_CHECK(rast.numel() < std::numeric_limits<int>::max(),
+              "rast is too large");
+
+  // The math runs in float32 for all attribute dtypes
+  torch::Tensor attr_f = attr.to(torch::kFloat32).contiguous();
+  torch::Tensor indices_c = indices.contiguous();
+
+  InterpolateArgs args = {attr_f.data_ptr<float>(),
+                          static_cast<int>(attr.size(1)),
+                          indices_c.data_ptr<int>(),
+                          rast.data_ptr<float>(),
+                          texels.data_ptr<int>(),
+                          output.data_ptr<float>(),
+                          dense};
+  interpolate_texels(args, texels.size(0));
+
+  return output.to(attr.scalar_type());
+}
+
+torch::Tensor interpolate_cpu(torch::Tensor attr, torch::Tensor indices,
+                              torch::Tensor rast) {
+#ifdef TIMING
+  auto start = std::chrono::high_resolution_clock::now();
+#endif
+  rast = rast.contiguous();
+  int64_t height = rast.size(0);
+  int64_t width = rast.size(1);
+  torch::Tensor texels = covered_texels(rast);
+  // Only the covered texels are visited, the rest keeps the zeros
+  torch::Tensor output = torch::zeros(
+      {height, width, attr.size(1)},
+      torch::TensorOptions().dtype(torch::kFloat32).device(torch::kCPU));
+  output = interpolate_into(attr, indices, rast, texels, output, true);
 
 #ifdef TIMING
   auto end = std::chrono::high_resolution_clock::now();
   std::chrono::duration<double> elapsed = end - start;
   std::cout << "Interpolation time: " << elapsed.count() << "s" << std::endl;
 #endif
-  return pos_bake;
+  return output;
+}
+
+std::tuple<torch::Tensor, torch::Tensor>
+interpolate_compact_cpu(torch::Tensor attr, torch::Tensor indices,
+                        torch::Tensor rast) {
+  rast = rast.contiguous();
+  torch::Tensor texels = covered_texels(rast);
+  torch::Tensor output = torch::empty(
+      {texels.size(0), attr.size(1)},
+      torch::TensorOptions().dtype(torch::kFloat32).device(torch::kCPU));
+  output = interpolate_into(attr, indices, rast, texels, output, false);
+  return {output, texels.to(torch::kInt64)};
 }
 
 // Registers _C as a Python extension module.
@@ -536,13 +893,19 @@ PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {}
 // Defines the operators
 TORCH_LIBRARY(texture_baker_cpp, m) {
   m.def("rasterize(Tensor uv, Tensor indices, int bake_resolution) -> Tensor");
+  m.def("rasterize_tiled(Tensor uv, Tensor indices, int bake_resolution) -> "
+        "Tensor");
   m.def("interpolate(Tensor attr, Tensor indices, Tensor rast) -> Tensor");
+  m.def("interpolate_compact(Tensor attr, Tensor indices, Tensor rast) -> "
+        "(Tensor, Tensor)");
 }
 
 // Registers CPP implementations
 TORCH_LIBRARY_IMPL(texture_baker_cpp, CPU, m) {
   m.impl("rasterize", &rasterize_cpu);
+  m.impl("rasterize_tiled", &rasterize_tiled_cpu);
   m.impl("interpolate", &interpolate_cpu);
+  m.impl("interpolate_compact", &interpolate_compact_cpu);
 }
 
 } // namespace texture_baker_cpp
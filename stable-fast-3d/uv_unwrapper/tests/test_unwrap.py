@@ -0,0 +1,127 @@
+import pytest
+import torch
+import torch.nn.functional as F
+
+try:
+    from uv_unwrapper import Unwrapper
+except ImportError:
+    # Also raised for the in-tree sources when the extension is not built
+    pytest.skip("uv_unwrapper is not built", allow_module_level=True)
+
+
+def vertex_normals(v_pos, faces, noise: float, seed: int):
+    """Area weighted vertex normals, perturbed by noise."""
+    generator = torch.Generator().manual_seed(seed)
+    face_normals = torch.linalg.cross(
+        v_pos[faces[:, 1]] - v_pos[faces[:, 0]],
+        v_pos[faces[:, 2]] - v_pos[faces[:, 0]],
+        dim=-1,
+    )
+    normals = torch.zeros_like(v_pos)
+    for i in range(3):
+        normals.index_add_(0, faces[:, i], face_normals)
+    normals = F.normalize(normals, dim=-1)
+    noise = noise * torch.randn(v_pos.shape, generator=generator)
+    return F.normalize(normals + noise, dim=-1)
+
+
+def grid_faces(rows: int, cols: int, wrap: bool = False):
+    i, j = torch.meshgrid(torch.arange(rows), torch.arange(cols), indexing="ij")
+    num_rows, num_cols = (rows, cols) if wrap else (rows + 1, cols + 1)
+    v00 = (i * num_cols + j).reshape(-1)
+    v01 = (i * num_cols + (j + 1) % num_cols).reshape(-1)
+    v10 = ((i + 1) % num_rows * num_cols + j).reshape(-1)
+    v11 = ((i + 1) % num_rows * num_cols + (j + 1) % num_cols).reshape(-1)
+    return torch.cat(
+        [torch.stack([v00, v10, v11], -1), torch.stack([v00, v11, v01], -1)], 0
+    )
+
+
+def wavy_sheet(n: int, seed: int):
+    """Open height field with noisy normals."""
+    x, y = torch.meshgrid(
+        torch.linspace(-1, 1, n + 1), torch.linspace(-1, 1, n + 1), indexing="ij"
+    )
+    z = 0.3 * torch.sin(3 * x + seed) * torch.cos(2 * y)
+    v_pos = torch.stack([x, y, z], -1).reshape(-1, 3)
+    faces = grid_faces(n, n)
+    return v_pos, vertex_normals(v_pos, faces, 0.3, seed), faces
+
+
+def torus(n: int, seed: int):
+    """Closed surface, faces point into all directions of the cube projection."""
+    u, v = torch.meshgrid(
+        torch.arange(n) / n * 2 * torch.pi,
+        torch.arange(n) / n * 2 * torch.pi,
+        indexing="ij",
+    )
+    radius = 0.4 + 0.1 * torch.sin(3 * v + seed)
+    v_pos = torch.stack(
+        [
+            (1 + radius * torch.cos(v)) * torch.cos(u),
+            (1 + radius * torch.cos(v)) * torch.sin(u),
+            1.5 * radius * torch.sin(v),
+        ],
+        -1,
+    ).reshape(-1, 3)
+    faces = grid_faces(n, n, wrap=True)
+    return v_pos, vertex_normals(v_pos, faces, 0.1, seed), faces
+
+
+def texel_coverage(face_uv, resolution: int = 128):
+    """Number of faces covering each texel center."""
+    centers = (torch.arange(resolution) + 0.5) / resolution
+    points = torch.stack(torch.meshgrid(centers, centers, indexing="ij"), -1)
+    points = points.reshape(-1, 2)
+    count = torch.zeros(points.shape[0], dtype=torch.int64)
+    for chunk in face_uv.split(512):
+        edges = []
+        for a, b in ((0, 1), (1, 2), (2, 0)):
+            p0, p1 = chunk[:, None, a], chunk[:, None, b]
+            edges.append(
+                (p1[..., 0] - p0[..., 0]) * (points[None, :, 1] - p0[..., 1])
+                - (p1[..., 1] - p0[..., 1]) * (points[None, :, 0] - p0[..., 0])
+            )
+        edges = torch.stack(edges, -1)
+        inside = (edges >= 0).all(-1) | (edges <= 0).all(-1)
+        count += inside.sum(0)
+    return count
+
+
+MESHES = {
+    "wavy_sheet_0": lambda: wavy_sheet(40, seed=0),
+    "wavy_sheet_1": lambda: wavy_sheet(40, seed=1),
+    "torus": lambda: torus(48, seed=2),
+}
+
+
+@pytest.mark.parametrize("mesh", list(MESHES.keys()))
+def test_packing(mesh):
+    v_pos, v_nrm, faces = MESHES[mesh]()
+    uv, uv_idx = Unwrapper()(v_pos, v_nrm, faces, 0.02)
+    assert uv_idx.shape == faces.shape
+    face_uv = uv[uv_idx]
+    assert torch.isfinite(face_uv).all()
+    assert face_uv.min() >= 0 and face_uv.max() <= 1
+
+    count = texel_coverage(face_uv)
+    # Islands never overlap, and together they cover a sensible part of the atlas
+    assert (count > 1).sum() == 0
+    assert (count > 0).float().mean() > 0.03
+
+
+@pytest.mark.parametrize("mesh", list(MESHES.keys()))
+def test_independent_of_thread_count(mesh):
+    v_pos, v_nrm, faces = MESHES[mesh]()
+    num_threads = torch.get_num_threads()
+    results = []
+    try:
+        for threads in (1, 4):
+            torch.set_num_threads(threads)
+            results.append(
+                Unwrapper()(v_pos.clone(), v_nrm.clone(), faces.clone(), 0.02)
+            )
+    finally:
+        torch.set_num_threads(num_threads)
+    (uv_a, idx_a), (uv_b, idx_b) = results
+    assert torch.equal(uv_a, uv_b) and torch.equal(idx_a, idx_b)
@@ -335,11 +335,17 @@ std::vector<int> BVH::Intersect(Triangle &tri_intersect) {
    * @return -1 for no intersection, the index of the intersected triangle
    * otherwise
    */
+  std::vector<int> intersected_triangles;
+  Intersect(tri_intersect, intersected_triangles);
+  return intersected_triangles;
+}
 
+void BVH::Intersect(Triangle &tri_intersect,
+                    std::vector<int> &intersected_triangles) {
   const int max_stack_size = 64;
   int node_stack[max_stack_size];
   int stack_size = 0;
-  std::vector<int> intersected_triangles;
+  intersected_triangles.clear();
 
   node_stack[stack_size++] = 0; // Start with the root node (index 0)
   while (stack_size > 0) {
@@ -375,7 +381,6 @@ std::vector<int> BVH::Intersect(Triangle &tri_intersect) {
       }
     }
   }
-  return intersected_triangles; // Return all intersected triangle indices
 }
 
 } // namespace UVUnwrapper
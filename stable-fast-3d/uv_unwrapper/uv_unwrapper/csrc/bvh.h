@@ -98,6 +98,8 @@ public:
   ~BVH();
 
   std::vector<int> Intersect(Triangle &triangle);
+  // Same as above, but reuses the buffer of the caller
+  void Intersect(Triangle &triangle, std::vector<int> &intersected_triangles);
 
 private:
   void Subdivide(unsigned int node_idx, unsigned int &nodePtr,
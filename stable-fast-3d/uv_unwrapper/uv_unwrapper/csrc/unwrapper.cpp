@@ -5,7 +5,7 @@
 #include <cmath>
 #include <cstring>
 #include <omp.h>
-#include <set>
+#include <algorithm>
 #include <torch/extension.h>
 #include <vector>
 
@@ -17,123 +17,131 @@ typedef SSIZE_T ssize_t;
 #endif
 
 namespace UVUnwrapper {
-void create_bvhs(BVH *bvhs, Triangle *triangles,
-                 std::vector<std::set<int>> &triangle_per_face, int num_faces,
-                 int start, int end) {
-#pragma omp parallel for
+// Atlas indices are 0-5 for the cube faces, 6-11 for the first overlaps and
+// 12 for everything overlapping more than that
+#define NUM_ATLAS_INDICES 13
+
+// Groups the triangles by atlas index with a counting sort. The triangles of
+// atlas index k are order[offsets[k]:offsets[k + 1]], in ascending order
+void sort_by_atlas_index(const int64_t *assign_indices_ptr, int num_faces,
+                         std::vector<int> &order, std::vector<int> &offsets) {
+  offsets.assign(NUM_ATLAS_INDICES + 1, 0);
+  for (int i = 0; i < num_faces; i++) {
+    offsets[assign_indices_ptr[i] + 1]++;
+  }
+  for (int k = 0; k < NUM_ATLAS_INDICES; k++) {
+    offsets[k + 1] += offsets[k];
+  }
+  order.resize(num_faces);
+  std::vector<int> fill(offsets.begin(), offsets.end() - 1);
+  for (int i = 0; i < num_faces; i++) {
+    order[fill[assign_indices_ptr[i]]++] = i;
+  }
+}
+
+void create_bvhs(BVH *bvhs, Triangle *triangles, const std::vector<int> &order,
+                 const std::vector<int> &offsets, int start, int end) {
+  // One BVH per atlas index, built in parallel
+#pragma omp parallel for schedule(dynamic, 1)
   for (int i = start; i < end; i++) {
-    int num_triangles = triangle_per_face[i].size();
-    Triangle *triangles_per_face = new Triangle[num_triangles];
-    int *indices = new int[num_triangles];
-    int j = 0;
-    for (int idx : triangle_per_face[i]) {
-      triangles_per_face[j] = triangles[idx];
-      indices[j++] = idx;
-    }
+    int num_triangles = offsets[i + 1] - offsets[i];
     // Each thread writes to it's own memory space
     // First check if the number of triangles is 0
     if (num_triangles == 0) {
       bvhs[i - start] = std::move(BVH()); // Default constructor
-    } else {
-      bvhs[i - start] = std::move(
-          BVH(triangles_per_face, indices,
-              num_triangles)); // BVH now handles memory of triangles_per_face
+      continue;
     }
-    delete[] triangles_per_face;
+    const int *indices = order.data() + offsets[i];
+    std::vector<Triangle> triangles_per_face(num_triangles);
+    for (int j = 0; j < num_triangles; j++) {
+      triangles_per_face[j] = triangles[indices[j]];
+    }
+    // The BVH copies the triangles and indices
+    bvhs[i - start] = std::move(BVH(triangles_per_face.data(),
+                                    const_cast<int *>(indices), num_triangles));
   }
 }
 
 void perform_intersection_check(BVH *bvhs, int num_bvhs, Triangle *triangles,
                                 uv_float3 *vertex_tri_centroids,
                                 int64_t *assign_indices_ptr,
-                                ssize_t num_indices, int offset,
-                                std::vector<std::set<int>> &triangle_per_face) {
-  std::vector<std::pair<int, int>>
-      unique_intersections; // Store unique intersections as pairs of triangle
-                            // indices
+                                ssize_t num_indices, int offset) {
+  // The occluded triangle of every intersecting pair. Collected in buffers
+  // per thread, so the threads never wait on each other
+  int num_threads = omp_get_max_threads();
+  std::vector<std::vector<int>> occluded_per_thread(num_threads);
+
+#pragma omp parallel
+  {
+    std::vector<int> &occluded = occluded_per_thread[omp_get_thread_num()];
+    std::vector<int> intersections;
+
+#pragma omp for schedule(dynamic, 64)
+    for (int i = 0; i < num_indices; i++) {
+      if (assign_indices_ptr[i] < offset) {
+        continue;
+      }
 
-// Step 1: Detect intersections in parallel
-#pragma omp parallel for
-  for (int i = 0; i < num_indices; i++) {
-    if (assign_indices_ptr[i] < offset) {
-      continue;
-    }
+      Triangle cur_tri = triangles[i];
+      auto &cur_bvh = bvhs[assign_indices_ptr[i] - offset];
 
-    Triangle cur_tri = triangles[i];
-    auto &cur_bvh = bvhs[assign_indices_ptr[i] - offset];
+      if (cur_bvh.bvhNode == nullptr) {
+        continue;
+      }
 
-    if (cur_bvh.bvhNode == nullptr) {
-      continue;
-    }
+      cur_bvh.Intersect(cur_tri, intersections);
 
-    std::vector<int> intersections = cur_bvh.Intersect(cur_tri);
-
-    if (!intersections.empty()) {
-
-#pragma omp critical
-      {
-        for (int intersect : intersections) {
-          if (i != intersect) {
-            // Ensure we only store unique pairs (A, B) where A < B to avoid
-            // duplication
-            if (i < intersect) {
-              unique_intersections.push_back(std::make_pair(i, intersect));
-            } else {
-              unique_intersections.push_back(std::make_pair(intersect, i));
-            }
+      for (int intersect : intersections) {
+        if (i == intersect) {
+          continue;
+        }
+        // Order the pair (A, B) with A < B, so both triangles of a pair
+        // agree on the occluded one
+        int first = std::min(i, intersect);
+        int second = std::max(i, intersect);
+
+        int i_idx = assign_indices_ptr[first];
+
+        int norm_idx = i_idx % 6;
+        int axis = (norm_idx < 2) ? 0 : (norm_idx < 4) ? 1 : 2;
+        bool use_max = (i_idx % 2) == 1;
+
+        float pos_a = vertex_tri_centroids[first][axis];
+        float pos_b = vertex_tri_centroids[second][axis];
+        // Sort the intersections based on vertex_tri_centroids along the
+        // specified axis
+        if (use_max) {
+          if (pos_a < pos_b) {
+            std::swap(first, second);
+          }
+        } else {
+          if (pos_a > pos_b) {
+            std::swap(first, second);
           }
         }
-      }
-    }
-  }
-
-  // Step 2: Process unique intersections
-  for (int idx = 0; idx < unique_intersections.size(); idx++) {
-    int first = unique_intersections[idx].first;
-    int second = unique_intersections[idx].second;
 
-    int i_idx = assign_indices_ptr[first];
-
-    int norm_idx = i_idx % 6;
-    int axis = (norm_idx < 2) ? 0 : (norm_idx < 4) ? 1 : 2;
-    bool use_max = (i_idx % 2) == 1;
-
-    float pos_a = vertex_tri_centroids[first][axis];
-    float pos_b = vertex_tri_centroids[second][axis];
-    // Sort the intersections based on vertex_tri_centroids along the specified
-    // axis
-    if (use_max) {
-      if (pos_a < pos_b) {
-        std::swap(first, second);
-      }
-    } else {
-      if (pos_a > pos_b) {
-        std::swap(first, second);
+        // The second intersection should always be the occluded triangle
+        occluded.push_back(second);
       }
     }
-
-    // Update the unique intersections
-    unique_intersections[idx].first = first;
-    unique_intersections[idx].second = second;
   }
 
-  // Now only get the second intersections from the pair and put them in a set
-  // The second intersection should always be the occluded triangle
-  std::set<int> second_intersections;
-  for (int idx = 0; idx < (int)unique_intersections.size(); idx++) {
-    int second = unique_intersections[idx].second;
-    second_intersections.insert(second);
+  // Triangles are only moved once all intersections are known, as the
+  // atlas indices decide the order of the pairs
+  std::vector<char> is_occluded(num_indices, 0);
+  for (const std::vector<int> &occluded : occluded_per_thread) {
+    for (int int_idx : occluded) {
+      is_occluded[int_idx] = 1;
+    }
   }
 
-  for (int int_idx : second_intersections) {
-    // Move the second (occluded) triangle by 6
-    int intersect_idx = assign_indices_ptr[int_idx];
-    int new_index = intersect_idx + 6;
-    new_index = std::clamp(new_index, 0, 12);
-
-    assign_indices_ptr[int_idx] = new_index;
-    triangle_per_face[intersect_idx].erase(int_idx);
-    triangle_per_face[new_index].insert(int_idx);
+#pragma omp parallel for
+  for (int i = 0; i < num_indices; i++) {
+    if (is_occluded[i]) {
+      // Move the occluded triangle by 6
+      int new_index = assign_indices_ptr[i] + 6;
+      assign_indices_ptr[i] = std::clamp(new_index, 0, 12);
+    }
   }
 }
 
@@ -159,6 +167,10 @@ torch::Tensor assign_faces_uv_to_atlas_index(torch::Tensor vertices,
   int64_t *assign_indices_ptr = assign_indices.data_ptr<int64_t>();
   // copy face_index to assign_indices
   memcpy(assign_indices_ptr, face_index_ptr, num_faces * sizeof(int64_t));
+  for (int i = 0; i < num_faces; i++) {
+    TORCH_CHECK(face_index_ptr[i] >= 0 && face_index_ptr[i] < 6,
+                "face_index must be a cube face index between 0 and 5");
+  }
 
 #ifdef TIMING
   auto start = std::chrono::high_resolution_clock::now();
@@ -166,10 +178,6 @@ torch::Tensor assign_faces_uv_to_atlas_index(torch::Tensor vertices,
   uv_float3 *vertex_tri_centroids = new uv_float3[num_faces];
   Triangle *triangles = new Triangle[num_faces];
 
-  // Use std::set to store triangles for each face
-  std::vector<std::set<int>> triangle_per_face;
-  triangle_per_face.resize(13);
-
 #pragma omp parallel for
   for (int i = 0; i < num_faces; i++) {
     int face_idx = i * 3;
@@ -192,18 +200,17 @@ torch::Tensor assign_faces_uv_to_atlas_index(torch::Tensor vertices,
                     vert_accessor[indices_accessor[i][2]][1],
                     vert_accessor[indices_accessor[i][2]][2]};
     vertex_tri_centroids[i] = triangle_centroid(v0, v1, v2);
-
-// Assign the triangle to the face index
-#pragma omp critical
-    { triangle_per_face[face_index_ptr[i]].insert(i); }
   }
 
+  std::vector<int> order, offsets;
+  sort_by_atlas_index(assign_indices_ptr, num_faces, order, offsets);
+
 #ifdef TIMING
   auto start_bvh = std::chrono::high_resolution_clock::now();
 #endif
 
   BVH *bvhs = new BVH[6];
-  create_bvhs(bvhs, triangles, triangle_per_face, num_faces, 0, 6);
+  create_bvhs(bvhs, triangles, order, offsets, 0, 6);
 
 #ifdef TIMING
   auto end_bvh = std::chrono::high_resolution_clock::now();
@@ -214,17 +221,17 @@ torch::Tensor assign_faces_uv_to_atlas_index(torch::Tensor vertices,
 #endif
 
   perform_intersection_check(bvhs, 6, triangles, vertex_tri_centroids,
-                             assign_indices_ptr, num_faces, 0,
-                             triangle_per_face);
+                             assign_indices_ptr, num_faces, 0);
 
 #ifdef TIMING
   auto end_intersection_1 = std::chrono::high_resolution_clock::now();
   elapsed_seconds = end_intersection_1 - start_intersection_1;
   std::cout << "Intersection 1 time: " << elapsed_seconds.count() << "s\n";
 #endif
-  // Create 6 new bvhs and delete the old ones
+  // Create 6 new bvhs for the triangles moved to the first overlaps
+  sort_by_atlas_index(assign_indices_ptr, num_faces, order, offsets);
   BVH *new_bvhs = new BVH[6];
-  create_bvhs(new_bvhs, triangles, triangle_per_face, num_faces, 6, 12);
+  create_bvhs(new_bvhs, triangles, order, offsets, 6, 12);
 
 #ifdef TIMING
   auto end_bvh2 = std::chrono::high_resolution_clock::now();
@@ -234,8 +241,7 @@ torch::Tensor assign_faces_uv_to_atlas_index(torch::Tensor vertices,
 #endif
 
   perform_intersection_check(new_bvhs, 6, triangles, vertex_tri_centroids,
-                             assign_indices_ptr, num_faces, 6,
-                             triangle_per_face);
+                             assign_indices_ptr, num_faces, 6);
 
 #ifdef TIMING
   auto end_intersection_2 = std::chrono::high_resolution_clock::now();
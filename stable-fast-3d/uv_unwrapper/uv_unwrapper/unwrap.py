@@ -58,9 +58,6 @@ class Unwrapper(nn.Module):
         face_normal = F.normalize(torch.sum(tri_stack_nrm, 1), eps=1e-6, dim=-1)
 
         # Now decide based on the face normal in which box map we project
-        # abs_x, abs_y, abs_z = tri_stack_nrm.abs().unbind(-1)
-        abs_x, abs_y, abs_z = tri_stack.abs().unbind(-1)
-
         axis = torch.tensor(
             [
                 [1, 0, 0],  # 0
@@ -76,40 +73,20 @@ class Unwrapper(nn.Module):
         face_normal_axis = (face_normal[:, None] * axis[None]).sum(-1)
         index = face_normal_axis.argmax(-1)
 
-        max_axis, uc, vc = (
-            torch.ones_like(abs_x),
-            torch.zeros_like(tri_stack[..., :1]),
-            torch.zeros_like(tri_stack[..., :1]),
+        # Look up per cube face which axes are projected to u and v
+        # +x, -x: (y, -z), +y, -y: (x, -z), +z: (x, y), -z: (x, -y)
+        def lookup(values, dtype=torch.long):
+            return torch.tensor(values, device=index.device, dtype=dtype)[index]
+
+        def gather(values, axis):
+            return values.gather(-1, axis[:, None, None].expand(-1, 3, 1))
+
+        max_axis = gather(tri_stack.abs(), lookup([0, 0, 1, 1, 2, 2]))[..., 0]
+        uc = gather(tri_stack, lookup([1, 1, 0, 0, 0, 0]))
+        vc = (
+            gather(tri_stack, lookup([2, 2, 2, 2, 1, 1]))
+            * lookup([-1, -1, -1, -1, 1, -1], tri_stack.dtype)[:, None, None]
         )
-        mask_pos_x = index == 0
-        max_axis[mask_pos_x] = abs_x[mask_pos_x]
-        uc[mask_pos_x] = tri_stack[mask_pos_x][..., 1:2]
-        vc[mask_pos_x] = -tri_stack[mask_pos_x][..., -1:]
-
-        mask_neg_x = index == 1
-        max_axis[mask_neg_x] = abs_x[mask_neg_x]
-        uc[mask_neg_x] = tri_stack[mask_neg_x][..., 1:2]
-        vc[mask_neg_x] = -tri_stack[mask_neg_x][..., -1:]
-
-        mask_pos_y = index == 2
-        max_axis[mask_pos_y] = abs_y[mask_pos_y]
-        uc[mask_pos_y] = tri_stack[mask_pos_y][..., 0:1]
-        vc[mask_pos_y] = -tri_stack[mask_pos_y][..., -1:]
-
-        mask_neg_y = index == 3
-        max_axis[mask_neg_y] = abs_y[mask_neg_y]
-        uc[mask_neg_y] = tri_stack[mask_neg_y][..., 0:1]
-        vc[mask_neg_y] = -tri_stack[mask_neg_y][..., -1:]
-
-        mask_pos_z = index == 4
-        max_axis[mask_pos_z] = abs_z[mask_pos_z]
-        uc[mask_pos_z] = tri_stack[mask_pos_z][..., 0:1]
-        vc[mask_pos_z] = tri_stack[mask_pos_z][..., 1:2]
-
-        mask_neg_z = index == 5
-        max_axis[mask_neg_z] = abs_z[mask_neg_z]
-        uc[mask_neg_z] = tri_stack[mask_neg_z][..., 0:1]
-        vc[mask_neg_z] = -tri_stack[mask_neg_z][..., 1:2]
 
         # UC from [-1, 1] to [0, 1]
         max_dim_div = max_axis.max(dim=0, keepdim=True).values
@@ -139,6 +116,7 @@ class Unwrapper(nn.Module):
         Returns:
             Integer[Tensor, "Nf"]: Atlas index
         """
+        # Only implemented on the CPU
         return torch.ops.UVUnwrapper.assign_faces_uv_to_atlas_index(
             vertex_positions.cpu(),
             triangle_idxs.cpu(),
@@ -186,16 +164,21 @@ class Unwrapper(nn.Module):
                 # Smaller coordinates in the lowest row
                 return dupl_off * x + off * 2
 
-        offset_x = torch.zeros_like(index, dtype=torch.float32)
-        offset_y = torch.zeros_like(index, dtype=torch.float32)
         offset_x_vals = [0, 1, 2, 0, 1, 2]
         offset_y_vals = [0, 0, 0, 1, 1, 1]
-        for i in range(index.max().item() + 1):
-            mask = index == i
-            if not mask.any():
-                continue
-            offset_x[mask] = x_offset_calc(offset_x_vals[i % 6], i)
-            offset_y[mask] = y_offset_calc(offset_y_vals[i % 6], i)
+        # From the third 3x2 grid on the offsets repeat, so a lookup table of
+        # the first three covers all indices
+        lookup_index = torch.where(index < 12, index, 12 + index % 6).long()
+        offset_x = torch.tensor(
+            [x_offset_calc(offset_x_vals[i % 6], i) for i in range(18)],
+            dtype=torch.float32,
+            device=index.device,
+        )[lookup_index]
+        offset_y = torch.tensor(
+            [y_offset_calc(offset_y_vals[i % 6], i) for i in range(18)],
+            dtype=torch.float32,
+            device=index.device,
+        )[lookup_index]
 
         div_x = torch.full_like(index, 6 // 2, dtype=torch.float32)
         # All overlap elements are saved in half scale
@@ -318,22 +301,28 @@ class Unwrapper(nn.Module):
             -1,
         )
 
-        actual_tangents = tangents[triangle_idxs]
-        expected_tangents = expected_tangents[triangle_idxs]
-
-        def rotation_matrix_2d(theta):
-            c, s = torch.cos(theta), torch.sin(theta)
-            return torch.tensor([[c, -s], [s, c]])
-
-        # Now find the rotation
-        index_mod = index % 6  # Shouldn't happen. Just for safety
-        for i in range(6):
-            mask = index_mod == i
-            if not mask.any():
+        # Now find the rotation of each cube face
+        index_mod = (index % 6).long()  # Shouldn't happen. Just for safety
+        # Group the faces of each cube face into one contiguous slice, in their
+        # original order. The reductions below then run on the same values in
+        # the same order as a boolean mask selection, so the rotation does not
+        # change with the summation order
+        order = torch.argsort(index_mod, stable=True)
+        counts = torch.bincount(index_mod, minlength=6).tolist()
+        actual_tangents = tangents[triangle_idxs[order]].split(counts)
+        expected_tangents = expected_tangents[triangle_idxs[order]].split(counts)
+        uv_slices = uv[order].split(counts)
+
+        rotated = []
+        for actual, expected, uv_cur in zip(
+            actual_tangents, expected_tangents, uv_slices
+        ):
+            if uv_cur.shape[0] == 0:
+                rotated.append(uv_cur)
                 continue
 
-            actual_mean_tangent = actual_tangents[mask].mean(dim=(0, 1))
-            expected_mean_tangent = expected_tangents[mask].mean(dim=(0, 1))
+            actual_mean_tangent = actual.mean(dim=(0, 1))
+            expected_mean_tangent = expected.mean(dim=(0, 1))
 
             dot_product = torch.dot(actual_mean_tangent, expected_mean_tangent)
             cross_product = (
@@ -341,15 +330,16 @@ class Unwrapper(nn.Module):
                 - actual_mean_tangent[1] * expected_mean_tangent[0]
             )
             angle = torch.atan2(cross_product, dot_product)
+            c, s = torch.cos(angle), torch.sin(angle)
+            rot_matrix = torch.stack([torch.stack([c, -s]), torch.stack([s, c])])
 
-            rot_matrix = rotation_matrix_2d(angle).to(mask.device)
-            # Center the uv coordinate to be in the range of -1 to 1 and 0 centered
-            uv_cur = uv[mask] * 2 - 1  # Center it first
-            # Rotate it
-            uv[mask] = torch.einsum("ij,nfj->nfi", rot_matrix, uv_cur)
+            # Center the uv coordinate to be in the range of -1 to 1 and 0
+            # centered and rotate it
+            uv_cur = torch.einsum("ij,nfj->nfi", rot_matrix, uv_cur * 2 - 1)
+            # Rescale the cube face to be within the 0-1 range
+            rotated.append((uv_cur - uv_cur.min()) / (uv_cur.max() - uv_cur.min()))
 
-            # Rescale uv[mask] to be within the 0-1 range
-            uv[mask] = (uv[mask] - uv[mask].min()) / (uv[mask].max() - uv[mask].min())
+        uv = torch.empty_like(uv).index_copy_(0, order, torch.cat(rotated))
 
         return uv
 
@@ -376,19 +366,27 @@ class Unwrapper(nn.Module):
         uc, vc = uv.unbind(-1)
 
         # Get the second slice (The first overlap)
-        index_filter = [index == i for i in range(6, max_index)]
+        slice_filter = (index >= 6) & (index < max_index)
+        # The other faces are gathered in slice 0 and left as they are
+        slice_index = torch.where(slice_filter, index, 0).long()
 
         # Normalize them to always fully fill the atlas patch
-        for i, fi in enumerate(index_filter):
-            if fi.sum() > 0:
-                # Scale the slice but only up to a factor of 2
-                # This keeps the texture resolution with the first slice in line (Half space in UV)
-                uc[fi] = (uc[fi] - uc[fi].min()) / (uc[fi].max() - uc[fi].min()).clip(
-                    0.5
-                )
-                vc[fi] = (vc[fi] - vc[fi].min()) / (vc[fi].max() - vc[fi].min()).clip(
-                    0.5
-                )
+        def normalize_slices(values):
+            slice_min = values.new_full((max_index,), math.inf).scatter_reduce(
+                0, slice_index, values.amin(1), "amin"
+            )
+            slice_max = values.new_full((max_index,), -math.inf).scatter_reduce(
+                0, slice_index, values.amax(1), "amax"
+            )
+            # Scale the slice but only up to a factor of 2
+            # This keeps the texture resolution with the first slice in line (Half space in UV)
+            normalized = (values - slice_min[slice_index, None]) / (
+                slice_max - slice_min
+            ).clip(0.5)[slice_index, None]
+            return torch.where(slice_filter[:, None], normalized, values)
+
+        uc = normalize_slices(uc)
+        vc = normalize_slices(vc)
 
         uc_padded = (uc * (1 - 2 * island_padding) + island_padding).clip(0, 1)
         vc_padded = (vc * (1 - 2 * island_padding) + island_padding).clip(0, 1)